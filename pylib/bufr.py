@@ -22,12 +22,12 @@ OBSNML=os.environ.get('OBSNML',PKGHOME+"/nml")
 sys.path.append(OBSNML)
 import bufrdic
 import obstore
+import obslib
 import obsmod
 import obsdic
 
 def bufr_element_frame(idx,bufr_pos,obs_index,nmlfile):
-    with open(nmlfile, "r") as nml:
-        Element= pandas.read_table(nml, skiprows=None, header=0).query("eleindex == @obs_index").elename.reset_index(drop=True)[0]
+    Element= obslib.nml_lookup(nmlfile,"eleindex",obs_index,"elename")
     eframe=pandas.DataFrame([[bufr_pos,obs_index,Element]],index=[idx],columns=["bufr_ele_pos","obs_index","Element"])
     return(eframe)
 
@@ -51,57 +51,68 @@ def record_count(TEXT_FILE,HEADER_OFFSET,RECORD_LENGTH):
     return(int((num_lines-HEADER_OFFSET)/RECORD_LENGTH))
 
 def read_bufr_dump(INFILE_LIST,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list):
+    return(list(bufr_dump_batches(INFILE_LIST,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list)))
+
+#############202610####
+DUMP_BLOCK=int(os.environ.get('DUMP_BLOCK',1<<26))
+try:
+    PUNCT_TABLE=str.maketrans("","",string.punctuation)
+except AttributeError:
+    PUNCT_TABLE=None
+
+def dump_words(line):
+    if PUNCT_TABLE is None: return(line.translate(None,string.punctuation).split())
+    return(line.translate(PUNCT_TABLE).split())
+
+def dump_block_tokens(lines,bufr_ele_list,selected):
+    ### Line kind: 0 record separator, 1 selected element, -1 other element; value field of selected lines
+    kind=numpy.zeros(len(lines),dtype=numpy.int8)
+    strvals=[]
+    for i,line in enumerate(lines):
+        word=dump_words(line)
+        if len(word) >= 3 and word[0].isdigit():
+            ele_count=int(word[0])
+            if ele_count == 0: continue
+            if ele_count <= len(bufr_ele_list) and bufr_ele_list[ele_count-1] in selected:
+                kind[i]=1
+                strvals.append(line[40:65])
+            else:
+                kind[i]=-1
+    return(kind,strvals)
+
+def bufr_dump_frame(TEXT_FILE,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list,bufr_elist):
+    selected=set(bufr_elist.obs_index.values)
+    nelem=len(bufr_elist)
+    kindlist=[]
+    strvals=[]
+    numlines=0
+    with open(TEXT_FILE, "r") as fileptr:
+        while True:
+            lines=fileptr.readlines(DUMP_BLOCK)
+            if len(lines) == 0: break
+            if numlines+len(lines) > HEADER_OFFSET:
+                (kind,vals)=dump_block_tokens(lines[max(0,HEADER_OFFSET-numlines):],bufr_ele_list,selected)
+                kindlist.append(kind)
+                strvals+=vals
+            numlines+=len(lines)
+    rec_on_batch=int((numlines-HEADER_OFFSET)/RECORD_LENGTH)
+    print(TEXT_FILE,rec_on_batch)
+    kind=numpy.concatenate(kindlist) if len(kindlist) > 0 else numpy.zeros(0,dtype=numpy.int8)
+    separator=(kind == 0)
+    recid=numpy.cumsum(separator)-separator+1
+    closed=recid[separator & (recid <= rec_on_batch)]
+    valrec=recid[kind == 1]
+    counts=numpy.bincount(valrec,minlength=rec_on_batch+2)
+    keep=closed[counts[closed] == nelem]
+    values=pandas.to_numeric(pandas.Series(strvals,dtype=object).str.strip(),errors="coerce").values
+    values=numpy.reshape(values[numpy.in1d(valrec,keep)].astype(numpy.float64),[len(keep),nelem])
+    return(pandas.DataFrame(values,index=keep,columns=bufr_elist.Element.values))
+
+def bufr_dump_batches(INFILE_LIST,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list):
     nmlfile=obsmod.obs_nml
     bufr_elist=bufr_create_element_table(nmlfile,bufr_ele_list)
-    data=pandas.DataFrame(columns=bufr_elist.Element.values)
-    batch_count=len(INFILE_LIST)
-    datagroup=[None]*batch_count
-    batch_id = 1
     for TEXT_FILE in INFILE_LIST:
-        print(TEXT_FILE)
-        rec_on_batch=record_count(TEXT_FILE,HEADER_OFFSET,RECORD_LENGTH)
-        print(rec_on_batch)
-        rec_count=0
-        ele_count=-1
-        value=""
-        batch_offset=HEADER_OFFSET
-        batch_size=RECORD_LENGTH*rec_on_batch
-        with open(TEXT_FILE, "r") as fileptr:
-            for i, line in enumerate(fileptr):
-                if rec_count > rec_on_batch:
-                    print(rec_count, rec_on_batch, rec_on_batch*RECORD_LENGTH)
-                    print(batch_offset, i, rec_count, ele_count)
-                    if data is not None:
-                     	datagroup[batch_id-1]=data
-                    batch_id+=1
-                    batch_offset=i
-                if batch_id > batch_count:
-                    break
-                if i == batch_offset:
-                    rec_count=1
-                    data=pandas.DataFrame(columns=bufr_elist.Element.values)
-                    val_list=[]
-                if rec_count >= 1 and rec_count <= rec_on_batch:
-                    word=re.sub('['+string.punctuation+']','',line).split()
-                    if len(word) >= 3 and word[0].isdigit():
-                        ele_count=int(word[0])
-                        strval=line[40:65]
-                        try:
-                            value=float(strval)
-                        except ValueError:
-                            value=numpy.nan
-                    else:
-                        ele_count = 0
-                    if ele_count == 0:
-                        if len(val_list) == len(bufr_elist.obs_index.values):
-                            data.loc[rec_count]=val_list
-                        val_list=[]
-                        rec_count+=1
-                    if ele_count > 0:
-                        index=bufr_ele_list[int(ele_count)-1]
-                        if index in bufr_elist.obs_index.values:
-                            val_list.append(value)
-    return(datagroup)
+        yield bufr_dump_frame(TEXT_FILE,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list,bufr_elist)
 
 def write_to_obstore(INFILE_LIST,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list,outpath,nmlpath,DT,obstype,maxindx=608):
     batch_count=len(INFILE_LIST)
@@ -116,11 +127,14 @@ def write_to_obstore(INFILE_LIST,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list,outpa
     obs_index=obstypedic[str(subtype)]
     elistgroup=[obstore.obstore_create_element_table(nmlfile,obs_index)]*batch_count
     print(elistgroup)
-    datagroup=read_bufr_dump(INFILE_LIST,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list)
-    print(datagroup)
     print(DT)
-    with open(output_file, "wb+") as outfile:
-        (datapos,datalen,dataend)=obstore.create_obstore(DT,outfile,nmlfile,obsgroup,subtypegroup,elistgroup,datagroup,batchcount=batch_count,header_offset=339,maxindx=maxindx,lut_ncols=LUTSIZE)
+    datagroup=[]
+    with obstore.ObstoreStreamWriter(DT,output_file,nmlfile,obsgroup,batchcount=batch_count,maxindx=maxindx) as writer:
+        for idx,data in enumerate(bufr_dump_batches(INFILE_LIST,HEADER_OFFSET,RECORD_LENGTH,bufr_ele_list)):
+            if len(data) == 0: data=None
+            writer.write_batch(subtypegroup[idx],elistgroup[idx],data)
+            datagroup.append(data)
+    (datapos,datalen,dataend)=writer.close()
     print("Writting to "+output_file+ " is completed. Data position:"+str(datapos)+" Data length:"+str(datalen)+" Data end:"+str(dataend))
     obsmod.obs_frame(datagroup,subtypegroup,outpath,filename=obstype,option=1)
     return(datagroup)
@@ -1009,19 +1009,19 @@ def mpl_scatterplot(plotpath,odbnmlfile,data,cylcdatestr,obstype,varname,long_na
     pyplot.savefig(plotfile,bbox_inches='tight',dpi=200)
     return(fig)
 
-def mpl_gridplot(plotpath,odbnmlfile,data,cylcdatestr,obstype,varname,long_name,fieldname="Obsvalue",gridopt="mean",cpallet="jet",fill=False,extend="max"):
+def mpl_gridplot(plotpath,odbnmlfile,data,cylcdatestr,obstype,varname,long_name,fieldname="Obsvalue",gridopt="mean",cpallet="jet",fill=False,extend="max",gridres=1.0,bbox=None):
+    if gridopt not in obslib.GRID_STATS: raise ValueError("Unknown gridopt "+str(gridopt)+"; valid options are "+", ".join(obslib.GRID_STATS))
     data=obslib.odb_renamefield(data,odbnmlfile)
     clevs=obslib.clevgen(long_name,fieldname)
     units=obslib.dataunit(long_name)
-    plot_title=obstype.replace("_"," ")+"\n"+long_name.replace("_"," ")+" ("+units+") "+fieldname+"\n"+" (1x1 gridded "+gridopt+") "+"\n"+cylcdatestr
+    plot_title=obstype.replace("_"," ")+"\n"+long_name.replace("_"," ")+" ("+units+") "+fieldname+"\n"+" ("+str(gridres)+" deg gridded "+gridopt+") "+"\n"+cylcdatestr
     plotfile=plotpath+"/"+obstype+"_"+str(varname)+"_"+fieldname+"_"+cylcdatestr+".png"
-    if gridopt is "count" : gridded_data=obslib.gridded_count_1x1deg(data,varname)
-    elif gridopt is "sum" : gridded_data=obslib.gridded_sum_1x1deg(data,varname,fieldname)
-    elif gridopt is "mean" : gridded_data=obslib.gridded_mean_1x1deg(data,varname,fieldname)
+    if gridopt == "count" : gridded_data=obslib.gridded_field(data,None,None,gridopt,gridres,bbox)
+    else : gridded_data=obslib.gridded_field(data,varname,fieldname,gridopt,gridres,bbox)
     if fill:
-        mpl_plot_shaded(plotfile,gridded_data,plot_title,clevs,cpallet,extend)
+        fig=mpl_plot_shaded(plotfile,gridded_data,plot_title,clevs,cpallet,extend)
     else:
-        mpl_plot_button(plotfile,gridded_data,plot_title,clevs,cpallet,extend)
+        fig=mpl_plot_button(plotfile,gridded_data,plot_title,clevs,cpallet,extend)
     return(fig)
 
 def mpl_plot_density(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name,fill=False,extend="max"):
@@ -1030,11 +1030,11 @@ def mpl_plot_density(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name
     cpallet=mpl_truncate_colormap("gist_ncar_r", 0.05, 0.4)
     mpl_gridplot(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name,fieldname,gridopt,cpallet,fill,extend)
 
-def mpl_plot_gridmean(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name,fill=False,extend="both"):
+def mpl_plot_gridmean(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name,fill=False,extend="both",gridres=1.0,bbox=None):
     fieldname="Obsvalue"
     gridopt="mean"
     cpallet=mpl_truncate_colormap("gist_ncar", 0.1, 0.8)
-    mpl_gridplot(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name,fieldname,gridopt,cpallet,fill,extend)
+    mpl_gridplot(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name,fieldname,gridopt,cpallet,fill,extend,gridres,bbox)
 
 def mpl_plot_depart_firstguess(plotpath,nmlfile,data,cylcdatestr,obstype,element,long_name,fill=False,extend="both"):
     fieldname="FGDep"
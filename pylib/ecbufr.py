@@ -12,10 +12,13 @@ Created on Wed Oct 12 15:45:39 2021
 from __future__ import print_function
 import traceback
 import sys,os
-#from eccodes import *
 import pandas
 import numpy
 import collections
+import mmap
+import struct
+import multiprocessing
+import multiprocessing.pool
 CURR_PATH=os.path.dirname(os.path.abspath(__file__))
 PKGHOME=os.path.dirname(CURR_PATH)
 OBSLIB=os.environ.get('OBSLIB',PKGHOME+"/pylib")
@@ -27,6 +30,17 @@ sys.path.append(OBSNML)
 ECBUFRNML=OBSNML+"/ecbufr_fieldname.nml"
 AAPP_NML=OBSNML+"/aapp_fieldname.nml"
 import obslib
+BUFR_CHUNK=int(os.environ.get('BUFR_CHUNK',64))
+
+HAS_ECCODES = False
+try:
+    from eccodes import *
+    HAS_ECCODES = True
+except ImportError:
+    pass
+
+def check_eccodes():
+    if not HAS_ECCODES: raise ImportError("eccodes is required for ecCodes BUFR decoding")
 
 def read_elist(ibufr):
     iterid = codes_keys_iterator_new(ibufr)
@@ -46,7 +60,7 @@ def read_elist(ibufr):
 def get_dtype(elename,eleindxmaptbl=ECBUFRNML):
 	elename=elename.split('#')[-1]
 	#print(elename)
-	dtype=pandas.read_table(eleindxmaptbl).query("fieldname == @elename").datatype.values[0]
+	dtype=obslib.nml_lookup(eleindxmaptbl,"fieldname",elename,"datatype")
 	#print(dtype)
 	return(dtype)
 
@@ -65,6 +79,9 @@ def get_ecbufr_fieldlist(elemlist=None,nmlfile=None,eleindxmaptbl=ECBUFRNML,subt
 	#print(elemlist)
 	elist=pandas.DataFrame(collections.Counter(elemlist).items(),columns=["elem","elcnt"])
 	elist=elist.sort_values(by=['elem'])
+	fieldmap=obslib.nml_map(eleindxmaptbl,"indx","fieldname")
+	namemap=obslib.nml_map(eleindxmaptbl,"indx","elename")
+	cntmap=dict(zip(elist.elem.values,elist.elcnt.values))
 	obs_fieldlist=[]
 	ecb_fieldlist=[]
 	obsindxlist=[]
@@ -72,9 +89,9 @@ def get_ecbufr_fieldlist(elemlist=None,nmlfile=None,eleindxmaptbl=ECBUFRNML,subt
         #print(elist)
 	for elem in elist.elem:
 		#print(elem)
-		fieldname=pandas.read_table(eleindxmaptbl).query("indx == @elem").fieldname.values[0]
-		elename=pandas.read_table(eleindxmaptbl).query("indx == @elem").elename.values[0]
-		count=elist.query("elem == @elem").elcnt.values[0]
+		fieldname=fieldmap[elem]
+		elename=namemap[elem]
+		count=cntmap[elem]
 		#print(count)
 		if count == 1 :
 		    if fieldname is not numpy.nan:
@@ -134,39 +151,176 @@ def message_read(ibufr,fieldlist=None,eleindxmaptbl=ECBUFRNML):
 	data=read_element(ibufr,field,count,data,eleindxmaptbl=eleindxmaptbl)
     return(data)
 
-def bufr_decode(input_file,nmlfile,eleindxmaptbl=ECBUFRNML,elemlist=None,subtype=None):
+def bufr_decode(input_file,nmlfile,eleindxmaptbl=ECBUFRNML,elemlist=None,subtype=None,nproc=1):
+    check_eccodes()
     fieldlist=get_ecbufr_fieldlist(nmlfile=nmlfile,eleindxmaptbl=eleindxmaptbl,elemlist=elemlist,subtyp=subtype)
-    f = open(input_file, 'rb')
-    data=pandas.DataFrame()
-    while 1 :
-    	ibufr = codes_bufr_new_from_file(f)
-    	#print(ibufr)
-    	if ibufr is None: break
-    	codes_set(ibufr, 'unpack', 1)
-    	#print ('Decoding message number '+str(ibufr))
-        data1=message_read(ibufr,fieldlist,eleindxmaptbl=eleindxmaptbl)
-    	data=data.append(data1, ignore_index=True)
-	data=obslib.reset_index(data)
-    	codes_release(ibufr)
+    fieldplan=bufr_field_plan(fieldlist,eleindxmaptbl)
+    data=bufr_parallel_decode([input_file],fieldplan,nproc=nproc)
+    data=obslib.reset_index(data)
     if subtype is None: subtype=obslib.get_key_info(nmlfile,"obsubtyp")
     data=data.assign(subtype=[int(subtype)]*len(data))
-    f.close()
     return(data)
 
-def bufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl=None,elemlist=None,subtype=None,keyfieldlst=[],minval=-99999.99,maxval=99999.99):
+def bufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl=None,elemlist=None,subtype=None,keyfieldlst=[],minval=-99999.99,maxval=99999.99,nproc=None,chunk=BUFR_CHUNK):
+	check_eccodes()
 	if eleindxmaptbl is None : eleindxmaptbl=ECBUFRNML
 	searchstring=inpath+"/"+slctstr
 	infiles=obslib.globlist(searchstring)
 	if len(infiles) == 0: print("File not found: "+searchstring)
 	print("Received "+str(len(infiles))+" bufr files")
-	data=obslib.DataFrame()
-	for infile in infiles[:] :
-		print(infile)
-		data1=bufr_decode(infile,nmlfile,eleindxmaptbl=eleindxmaptbl,elemlist=elemlist,subtype=subtype)
-		for field in keyfieldlst:
-			data1=obslib.frame_window_filter(data1,item=field,minval=minval,maxval=maxval)
-		print(data1)
-		data=data.append(data1.copy())
+	fieldlist=get_ecbufr_fieldlist(nmlfile=nmlfile,eleindxmaptbl=eleindxmaptbl,elemlist=elemlist,subtyp=subtype)
+	fieldplan=bufr_field_plan(fieldlist,eleindxmaptbl)
+	data=bufr_parallel_decode(infiles,fieldplan,nproc=nproc,chunk=chunk)
+	if subtype is None: subtype=obslib.get_key_info(nmlfile,"obsubtyp")
+	data=data.assign(subtype=[int(subtype)]*len(data))
+	for field in keyfieldlst:
+		data=obslib.frame_window_filter(data,item=field,minval=minval,maxval=maxval)
 	data=obslib.reset_index(data)
 	#print(data)
 	return(data)
+
+#############202610####
+def bufr_message_offsets(input_file):
+    offsets=[]
+    with open(input_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0: return(offsets)
+        buf=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        try:
+            pos=buf.find(b"BUFR")
+            while pos >= 0 and pos+8 <= len(buf):
+                msglen=struct.unpack(">I",b"\x00"+buf[pos+4:pos+7])[0]
+                offsets.append((pos,msglen))
+                pos=buf.find(b"BUFR",pos+max(msglen,4))
+        finally:
+            buf.close()
+    return(offsets)
+
+def bufr_field_plan(fieldlist,eleindxmaptbl=ECBUFRNML):
+    ### Fields sharing one ecCodes key ("#<rank>#<key>") are grouped so that each key is fetched once
+    plan=collections.OrderedDict()
+    for indx,field in fieldlist.iterrows():
+        fieldname=field.fieldname
+        dtype=get_dtype(fieldname,eleindxmaptbl)
+        if dtype in [ "iVal", "rVal" ] :
+            (mode,keyname,rank)=("scalar",fieldname,0)
+        elif fieldname.startswith("#") :
+            (mode,keyname,rank)=("rank",fieldname.split('#')[-1],int(fieldname.split('#')[1]))
+        else :
+            (mode,keyname,rank)=("array",fieldname,0)
+        plan.setdefault((mode,keyname),[]).append((field.elename,rank))
+    return([(mode,keyname,items) for ((mode,keyname),items) in plan.items()])
+
+def plan_names(fieldplan):
+    return([elename for (mode,keyname,items) in fieldplan for (elename,rank) in items])
+
+def subset_array(values,count):
+    values=numpy.asarray(values)
+    if len(values) == 1: values=numpy.repeat(values,count)
+    return(values)
+
+def rank_blocks(ibufr,keyname,nrank,count,compressed):
+    ### The full key array splits into nrank equal blocks only if every occurrence holds one value per
+    ### subset; compressed occurrences that are constant over the subsets come back as a single value.
+    if not compressed: return(count == 1)
+    return(all(codes_get_size(ibufr,"#"+str(rank)+"#"+keyname) == count for rank in range(1,nrank+1,1)))
+
+def rank_columns(ibufr,keyname,items,count,compressed):
+    values=numpy.asarray(codes_get_array(ibufr,keyname))
+    nrank=len(values)//count
+    if nrank*count == len(values) and max([rank for (elename,rank) in items]) <= nrank and rank_blocks(ibufr,keyname,nrank,count,compressed):
+        if compressed :
+            values=numpy.reshape(values,[nrank,count]).T
+        else :
+            values=numpy.reshape(values,[count,nrank])
+        return(dict((elename,values[:,rank-1]) for (elename,rank) in items))
+    ### Occurrence sizes differ or replication differs between subsets, fall back to one get per rank
+    return(dict((elename,subset_array(codes_get_array(ibufr,"#"+str(rank)+"#"+keyname),count)) for (elename,rank) in items))
+
+def message_columns(ibufr,fieldplan):
+    codes_set(ibufr, 'unpack', 1)
+    count=codes_get(ibufr, 'numberOfSubsets')
+    compressed=codes_get(ibufr, 'compressedData')
+    columns={}
+    for (mode,keyname,items) in fieldplan:
+        if mode == "scalar" :
+            values=subset_array([codes_get(ibufr,keyname)],count)
+            columns.update((elename,values) for (elename,rank) in items)
+        elif mode == "array" :
+            values=subset_array(codes_get_array(ibufr,keyname),count)
+            columns.update((elename,values) for (elename,rank) in items)
+        else :
+            columns.update(rank_columns(ibufr,keyname,items,count,compressed))
+    return(columns)
+
+def concat_columns(collist,fieldplan):
+    names=plan_names(fieldplan)
+    collist=[columns for columns in collist if len(columns) > 0]
+    if len(collist) == 0: return(collections.OrderedDict((name,numpy.array([])) for name in names))
+    return(collections.OrderedDict((name,numpy.concatenate([columns[name] for columns in collist])) for name in names))
+
+def bufr_decode_chunk(chunktask):
+    (input_file,msglist,fieldplan)=chunktask
+    collist=[]
+    with open(input_file, "rb") as f:
+        for (offset,msglen) in msglist:
+            f.seek(offset,0)
+            ibufr=codes_new_from_message(f.read(msglen))
+            try:
+                collist.append(message_columns(ibufr,fieldplan))
+            finally:
+                codes_release(ibufr)
+    return(concat_columns(collist,fieldplan))
+
+def bufr_decode_tasks(infiles,fieldplan,chunk=BUFR_CHUNK):
+    tasklist=[]
+    for infile in infiles:
+        offsets=bufr_message_offsets(infile)
+        print(infile+" : "+str(len(offsets))+" messages")
+        for strt in range(0,len(offsets),int(chunk)):
+            tasklist.append((infile,offsets[strt:strt+int(chunk)],fieldplan))
+    return(tasklist)
+
+def bufr_parallel_decode(infiles,fieldplan,nproc=None,threadflag=False,chunk=BUFR_CHUNK):
+    check_eccodes()
+    tasklist=bufr_decode_tasks(infiles,fieldplan,chunk)
+    names=plan_names(fieldplan)
+    if len(tasklist) == 0: return(pandas.DataFrame(columns=names))
+    if nproc is None: nproc=multiprocessing.cpu_count()
+    nproc=max(1,min(int(nproc),len(tasklist)))
+    if nproc == 1:
+        collist=[bufr_decode_chunk(chunktask) for chunktask in tasklist]
+    else:
+        if threadflag:
+            pool=multiprocessing.pool.ThreadPool(nproc)
+        else:
+            pool=multiprocessing.Pool(nproc)
+        try:
+            collist=pool.map(bufr_decode_chunk,tasklist)
+        finally:
+            pool.close()
+            pool.join()
+    return(pandas.DataFrame(concat_columns(collist,fieldplan),columns=names))
+
+def bufr_decode_chunks(tasklist,nproc=1,keyfieldlst=[],minval=-99999.99,maxval=99999.99):
+    ### Yields (data,messagecount) per task in file order, only the chunks in flight are held in memory
+    check_eccodes()
+    if len(tasklist) == 0: return
+    names=plan_names(tasklist[0][2])
+    if nproc is None: nproc=multiprocessing.cpu_count()
+    nproc=max(1,min(int(nproc),len(tasklist)))
+    pool=None
+    if nproc == 1:
+        results=(bufr_decode_chunk(chunktask) for chunktask in tasklist)
+    else:
+        pool=multiprocessing.Pool(nproc)
+        results=obslib.bounded_imap(pool,bufr_decode_chunk,tasklist,2*nproc)
+    try:
+        for indx,columns in enumerate(results):
+            data=pandas.DataFrame(columns,columns=names)
+            for field in keyfieldlst:
+                data=obslib.frame_window_filter(data,item=field,minval=minval,maxval=maxval)
+            yield (data,len(tasklist[indx][1]))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -26,6 +26,8 @@ import xarray
 import pandas
 import iris
 import iris.analysis
+import scipy.spatial
+import hashlib
 from typing import Optional, List, Union
 
 # Specialised Plotting & Mesh Imports
@@ -84,9 +86,69 @@ def dset_latlon_assign(datset, lon, lat, datval):
     return datset
 
 def dset_latlon_extract(datset, lon, lat):
-    indx = pairwise_distances_argmin(X=[[lon, lat]], Y=numpy.c_[datset['lon'].values.ravel(), datset['lat'].values.ravel()])
+    (dist, indx) = colocate_points(datset['lat'].values, datset['lon'].values, lat, lon)
     i0, j0 = numpy.unravel_index(indx, (datset['lon'].shape))
-    return datset.isel(x=j0, y=i0).squeeze()
+    if numpy.ndim(lon) == 0: return datset.isel(x=j0, y=i0).squeeze()
+    return datset.isel(x=xarray.DataArray(j0, dims="points"), y=xarray.DataArray(i0, dims="points"))
+
+#############################################################################################################################
+### KD-tree colocation: grid points are mapped to unit vectors on the sphere and indexed once per grid
+### definition; chord distances from the tree are converted to great-circle distances in km.
+#############################################################################################################################
+
+EARTH_RADIUS=6371.0
+COLOC_TREES={}
+
+def latlon_xyz(lat, lon):
+    lat = numpy.radians(numpy.asarray(lat, dtype=numpy.float64))
+    lon = numpy.radians(numpy.asarray(lon, dtype=numpy.float64))
+    return numpy.column_stack((numpy.cos(lat)*numpy.cos(lon), numpy.cos(lat)*numpy.sin(lon), numpy.sin(lat)))
+
+def grid_latlon(glat, glon, axes=True):
+    ### 1-D inputs are grid axes and are always meshgridded; axes=False takes them as paired point lists
+    ### (e.g. an unstructured mesh). 2-D (curvilinear) grids are used as they are.
+    glat = numpy.asarray(glat, dtype=numpy.float64)
+    glon = numpy.asarray(glon, dtype=numpy.float64)
+    if glat.ndim == 1 and glon.ndim == 1 and (axes or glat.shape != glon.shape):
+        glon, glat = numpy.meshgrid(glon, glat)
+    return glat, glon
+
+def grid_tree(glat, glon, axes=True):
+    glat, glon = grid_latlon(glat, glon, axes)
+    key = (glat.shape, hashlib.sha1(glat.tobytes() + glon.tobytes()).hexdigest())
+    if key not in COLOC_TREES:
+        COLOC_TREES[key] = scipy.spatial.cKDTree(latlon_xyz(glat.ravel(), glon.ravel()))
+    return COLOC_TREES[key], glat.shape
+
+def colocate_points(glat, glon, lat, lon, k=1, maxdist=None, axes=True):
+    tree, shape = grid_tree(glat, glon, axes)
+    points = latlon_xyz(numpy.ravel(lat), numpy.ravel(lon))
+    if maxdist is None:
+        chord, indx = tree.query(points, k=k)
+    else:
+        chord, indx = tree.query(points, k=k, distance_upper_bound=2.0*numpy.sin(maxdist/(2.0*EARTH_RADIUS)))
+    dist = 2.0*EARTH_RADIUS*numpy.arcsin(numpy.clip(numpy.asarray(chord)/2.0, 0.0, 1.0))
+    if numpy.ndim(lon) == 0 and k == 1: return dist[0], indx[0]
+    return dist, indx
+
+def idw_weights(dist, power=2.0):
+    dist = numpy.atleast_2d(dist)
+    exact = dist <= 0.0
+    weights = numpy.where(exact, 1.0, 1.0/numpy.power(numpy.where(exact, 1.0, dist), power))
+    weights = numpy.where(exact.any(axis=1)[:, None], exact.astype(numpy.float64), weights)
+    weights[~numpy.isfinite(dist)] = 0.0
+    return weights/numpy.maximum(weights.sum(axis=1)[:, None], numpy.finfo(numpy.float64).tiny)
+
+def colocate_idw(glat, glon, gridval, lat, lon, k=4, power=2.0, maxdist=None, axes=True):
+    dist, indx = colocate_points(glat, glon, lat, lon, k=k, maxdist=maxdist, axes=axes)
+    dist = numpy.asarray(dist).reshape(len(numpy.ravel(lon)), -1)
+    indx = numpy.asarray(indx).reshape(dist.shape)
+    gridval = numpy.append(numpy.asarray(gridval, dtype=numpy.float64).ravel(), numpy.nan)
+    weights = idw_weights(dist, power)
+    values = numpy.where(weights > 0.0, gridval[numpy.minimum(indx, len(gridval)-1)], 0.0)
+    result = (weights*values).sum(axis=1)
+    result[(weights > 0.0).sum(axis=1) == 0] = numpy.nan
+    return result
 
 def datfr_extract(datset,datfr,distcol,varlst):
 	indx=dat
@@ -112,44 +174,31 @@ def plot_mesh_3d(cube: iris.cube.Cube, cmap='balance', show_edges=True):
 	
 def datfr_colocate(datset,datframe,gridsize,lon,lat,lev=None,time=None,datfrlat="Latitude",datfrlon="Longitude",varlst=None):
 	hlfwdth=gridsize/2
-	datframe=datframe.assign(colocdist=None)
-	#### initialisation of variables ####
+	lon=numpy.atleast_1d(lon)
+	lat=numpy.atleast_1d(lat)
+	#### Nearest grid point of every observation, then the closest observation inside each grid box ####
+	obslat=datframe[datfrlat].values.astype(numpy.float64)
+	obslon=datframe[datfrlon].values.astype(numpy.float64)
+	dist,cell=colocate_points(lat,lon,obslat,obslon,axes=True)
+	ilat,ilon=numpy.unravel_index(cell,(len(lat),len(lon)))
+	dlon=numpy.abs((obslon-lon[ilon]+180.0)%360.0-180.0)
+	inbox=(numpy.abs(obslat-lat[ilat]) < hlfwdth) & (dlon < hlfwdth)
+	if not inbox.all(): errprint("datfr_colocate: "+str(int((~inbox).sum()))+" of "+str(len(inbox))+" observations dropped, nearest grid point outside its box")
+	order=numpy.lexsort((dist[inbox],cell[inbox]))
+	rows=numpy.where(inbox)[0][order]
+	rows=rows[numpy.unique(cell[rows],return_index=True)[1]]
 	for varnam in varlst:
-		   datset[varnam]=numpy.nan
-	#####################################
-	for latval in lat:
-	   for lonval in lon:
-	      lonmin=lonval-hlfwdth
-	      lonmax=lonval+hlfwdth
-	      latmin=latval-hlfwdth
-	      latmax=latval+hlfwdth
-	      qrystr=str(datfrlat)+" > "+str(latmin)+" and "+datfrlat+" < "+str(latmax)+" and "+datfrlon+" > "+str(lonmin)+" and "+datfrlon+" < "+str(lonmax)
-	      if datfrlat in datframe:
-	         if datfrlon in datframe:
-	            datfr=datframe.query(qrystr)
-	      print(datfr)
-	      if len(datfr.index) > 0:
-		for indx in datfr.index:
-	            datfr["colocdist"].loc[indx]=math.sqrt((datfr[datfrlat].loc[indx]-latval)**2+(datfr[datfrlon].loc[indx]-lonval)**2)
-	        indx=datfr_min_indx(datfr,"colocdist")
-	        #indx=datfr["colocdist"].idxmin()
-		#print(datfr)
-		print(indx)
-		print(datfr.loc[indx])
-	      else:
-	        indx=None
-	      print(indx)
-	      for varnam in varlst:
-		if indx is not None:
-		   if varnam is "datfrindx":
-	      		datset["datfrindx"].loc[{"lat":latval,"lon":lonval}]=indx
-		   else:
-			datval=datfr[varnam].loc[indx]
-			print(datval)
-			print(datset[varnam])
-			datset[varnam].loc[{"lat":latval,"lon":lonval}]=datval
-		#else:
-		#   datset[varnam].loc[{"lat":latval,"lon":lonval}]=numpy.nan
+		if varnam == "datfrindx":
+			values=datframe.index.values[rows]
+		else:
+			values=datframe[varnam].values[rows]
+		gridval=numpy.full((len(lat),len(lon)),numpy.nan)
+		gridval[ilat[rows],ilon[rows]]=values
+		datset[varnam]=numpy.nan
+		slct={"lat":lat,"lon":lon}
+		dsval=datset[varnam].loc[slct]
+		gridval=xarray.DataArray(gridval,coords=slct,dims=("lat","lon")).broadcast_like(dsval).transpose(*dsval.dims)
+		datset[varnam].loc[slct]=gridval.values
 	return(datset)
 
 def datset_colocate(datset,gridsize,lon,lat):
@@ -21,6 +21,7 @@ import numpy
 import pandas
 import shutil
 import glob
+import collections
    
 stnlst_path=os.environ.get('StnLstDir',CYLCPATH+"/share/data/etc/stationlists/atmos")
 varnml=os.environ.get('VarNml',OBSNML+"/varobs_nml")
@@ -126,8 +127,11 @@ def proactive_stnlist(fsoi_info_string,outpath,workdir,yyyymmdd,hh,freq_cutoff=N
     with open(checklist,"w") as cklst:
         cklst.write("obstype\tfilelist\n")
     clmnhdr=["lat", "lon", "plev", "varno", "subtype", "time", "obstype", "callsign"]
-    for infile in infile_list:
-        (obstype,wrkfile_list)=get_stn_list(infile,workdir,yyyymmdd,hh,freq_cutoff,stnlst_path,varnml,checklist,clmnhdr=clmnhdr) 
+    obsdata=fsoi_stn_frames(infile_list,yyyymmdd,hh,clmnhdr)
+    for obstype in obsdata.keys():
+        wrkfile_list=workdir+"/"+str(obstype)+"/file_list"
+        if os.path.exists(wrkfile_list) : os.remove(wrkfile_list)
+        wrkfile_list=fsoi_stnlist_write(obsdata[obstype],workdir+"/"+str(obstype),hh,varnml,freq_cutoff,wrkfile_list)
         with open(checklist,"a") as cklst:
              cklst.write(obstype + "\t" + wrkfile_list + "\n")
     ckdb=pandas.read_table(checklist, skiprows=None, header=0)
@@ -140,16 +144,11 @@ def proactive_stnlist(fsoi_info_string,outpath,workdir,yyyymmdd,hh,freq_cutoff=N
 
 
 def get_stn_list(infile,workpath,cylcdate,cylchour,freq_cutoff=None,stnlst_path=stnlst_path,varnml=varnml,checklist=None,clmnhdr=None):
-    outfile=None
-    if clmnhdr is None : clmnhdr=["num", "obval", "xinov", "sens1", "lat", "lon", "obpres", "group_type", "instype", "idt_ob", "obserr", "bkgerr", "obstype", "callsign", "chnlno"]
+    obstype=None
+    wrkfile_list=None
     if checklist is None : checklist=workpath+"/checklist"
-    infldr=infile.rsplit("/",1)[0]
-    fname=infile.rsplit("/",1)[1]
-    num_vals=obslib.get_numerics(fname)
-    ftime=num_vals[0]
-    ftstr=str(ftime)
-    if ftstr == cylcdate+cylchour :
-      file_data=pandas.read_fwf(infile, skiprows=None, header=None, names=clmnhdr, converters={"callsign":str})
+    file_data=fsoi_stn_read(infile,cylcdate,cylchour,clmnhdr)
+    if file_data is not None :
       obstype=get_obstype(file_data.obstype.values[0])
       workdir=workpath+"/"+str(obstype)
       wrkfile_list=workdir+"/file_list"
@@ -157,8 +156,7 @@ def get_stn_list(infile,workpath,cylcdate,cylchour,freq_cutoff=None,stnlst_path=
       if obstype not in ckdb.obstype.values and os.path.exists(wrkfile_list) : 
          print(wrkfile_list + " is to be removed")
          os.remove(wrkfile_list)
-      wrkfile_list=subtype_filter(file_data,workdir,cylchour,obstype,varnml,freq_cutoff,wrkfile_list)
-    else: errprint("Error: Timestamp of the input file name missmatch : "+ ftstr + " != " + yyyymmdd+hh)
+      wrkfile_list=fsoi_stnlist_write(file_data,workdir,cylchour,varnml,freq_cutoff,wrkfile_list)
     return(obstype,wrkfile_list)
 
 def get_obstype(OBSTYPE):
@@ -220,7 +218,7 @@ def var_filter(data,workpath,ctlbk,varnml,freq_cutoff,file_list):
     var_list=data.varno.unique()
     for varno in var_list:
         ctldic=ctlbk.copy()
-        varname=pandas.read_table(varnml, skiprows=None, header=0).query("eleindex == @varno").elename.values[0]
+        varname=obslib.nml_lookup(varnml,"eleindex",varno,"elename")
         workdir=workpath+"/"+str(varname)
         ctldic=get_ctlblk_header("var_ctlstr",get_ctlstr(varno),ctldic)
         ctldic=get_ctlblk_header("comment"," of "+str(varname)+" ",ctldic)
@@ -247,29 +245,28 @@ def ops_station_namelist_segment(workdir,ctlbk,stn_lst):
     filedir=outfile.rsplit("/",1)[0]
     obslib.mkdir(filedir)
     with open(outfile,"w") as op:
-        stn_lst_str_arr=stnlist_array_to_string(stn_lst)
-        for indx,stn_lst_str in enumerate(stn_lst_str_arr): 
-            ctldic=ctlbk.copy()
-            if len(stn_lst_str_arr) > 1 : ctldic=get_ctlblk_header("comment"," Batch "+str(indx+1)+"\n\n",ctldic)
-            else : ctldic=get_ctlblk_header("comment","\n\n",ctldic)
-            if "comment" in ctldic.keys() : op.write(ctldic["comment"])
-            if "header_string" in ctldic.keys() : op.write(ctldic["header_string"])
-            if "time_ctlstr" in ctldic.keys() : op.write(ctldic["time_ctlstr"])
-            if "lev_ctlstr" in ctldic.keys() : op.write(ctldic["lev_ctlstr"])
-            if "var_ctlstr" in ctldic.keys() : op.write(ctldic["var_ctlstr"])
-            if len(stn_lst_str) == 7: op.write("Id= "+stn_lst_str+" /\n")
-            else: op.write("Ids= "+stn_lst_str+" /\n")
-            op.write("\n")
+        op.write(station_namelist_text(ctlbk,stn_lst))
     return(outfile)
 
-def stnlist_array_to_string(stn_lst):
-    stn_lst_str_arr=[]
-    if len(stn_lst) < 1000:
-       stn_lst_str_arr=stn_lst_str_arr+[numpy.array2string(stn_lst, separator=',', threshold=100000)[1:-1]]
-    else :
-       stn_lst_str_arr=stn_lst_str_arr+[numpy.array2string(stn_lst[0:999], separator=',', threshold=100000)[1:-1]]
-       stn_lst=stn_lst[1000:]
-       stn_lst_str_arr=stn_lst_str_arr+stnlist_array_to_string(stn_lst)
+def station_namelist_text(ctlbk,stn_lst):
+    textlst=[]
+    stn_lst_str_arr=stnlist_array_to_string(stn_lst)
+    for indx,stn_lst_str in enumerate(stn_lst_str_arr): 
+        ctldic=ctlbk.copy()
+        if len(stn_lst_str_arr) > 1 : ctldic=get_ctlblk_header("comment"," Batch "+str(indx+1)+"\n\n",ctldic)
+        else : ctldic=get_ctlblk_header("comment","\n\n",ctldic)
+        for handle in ["comment","header_string","time_ctlstr","lev_ctlstr","var_ctlstr"]:
+            if handle in ctldic.keys() : textlst+=[ctldic[handle]]
+        if len(stn_lst_str) == 7: textlst+=["Id= "+stn_lst_str+" /\n"]
+        else: textlst+=["Ids= "+stn_lst_str+" /\n"]
+        textlst+=["\n"]
+    return("".join(textlst))
+
+def stnlist_array_to_string(stn_lst,batch=None):
+    if batch is None : batch=STNLST_BATCH
+    stn_lst=numpy.asarray(stn_lst)
+    if len(stn_lst) == 0 : return([""])
+    stn_lst_str_arr=[numpy.array2string(stn_lst[indx:indx+batch], separator=',', threshold=100000)[1:-1] for indx in range(0,len(stn_lst),batch)]
     return(stn_lst_str_arr)
 
 def get_ctlblk_header(handle,string,ctlblk=None):
@@ -322,3 +319,98 @@ def generate_stnlst_nl(file_list,outpath,workdir,obstype,stnlst_path):
                 stnlst.write("\n")
     return(outfile)
 
+#############202610####
+STNLST_BATCH=999
+STNLST_KEYS=["subtype","time","lev","varno"]
+STNLST_FILE="station_id_detrimental.txt"
+LEV_FACTOR=100
+LEV_MISSING=-9999.9999
+FSO_CLMNHDR=["num", "obval", "xinov", "sens1", "lat", "lon", "obpres", "group_type", "instype", "idt_ob", "obserr", "bkgerr", "obstype", "callsign", "chnlno"]
+
+def fsoi_stn_read(infile,cylcdate,cylchour,clmnhdr=None):
+    if clmnhdr is None : clmnhdr=FSO_CLMNHDR
+    ftstr=str(obslib.get_numerics(os.path.basename(infile))[0])
+    if ftstr != str(cylcdate)+str(cylchour) :
+        errprint("Error: Timestamp of the input file name missmatch : "+ ftstr + " != " + str(cylcdate)+str(cylchour))
+        return(None)
+    return(pandas.read_fwf(infile, skiprows=None, header=None, names=clmnhdr, converters={"callsign":str}))
+
+def fsoi_stn_frames(infile_list,cylcdate,cylchour,clmnhdr=None):
+    # one table per obstype, so every station list is built from all of its files at once
+    framelst=collections.OrderedDict()
+    for infile in infile_list:
+        file_data=fsoi_stn_read(infile,cylcdate,cylchour,clmnhdr)
+        if file_data is None or len(file_data.index) == 0 : continue
+        obstype=get_obstype(file_data.obstype.values[0])
+        framelst[obstype]=framelst.get(obstype,[])+[file_data]
+    return(collections.OrderedDict([(obstype,pandas.concat(framelst[obstype],ignore_index=True)) for obstype in framelst.keys()]))
+
+def fsoi_level_band(plev,mfactor=LEV_FACTOR,missing=LEV_MISSING):
+    plev=numpy.asarray(plev,dtype=numpy.float64)
+    valid=(plev == plev) & (plev != missing)
+    plev=numpy.where(valid,plev,0.0)
+    lev=(plev/mfactor+0.5).astype(numpy.int64)*mfactor
+    half=int(mfactor)//2
+    inband=valid & (plev > lev-half) & (plev < lev+half)
+    return(lev,inband)
+
+def fsoi_level_order(data):
+    # rank of each level within its subtype, in the order lev_filter took from obslib.unique_int
+    levorder=[]
+    for subtype,plev in data.groupby("subtype",sort=False).plev:
+        levlist=obslib.unique_int(plev.values,LEV_FACTOR,missing=LEV_MISSING)
+        levorder.append(pandas.Series(numpy.arange(len(levlist)),index=pandas.MultiIndex.from_product([[subtype],levlist],names=["subtype","lev"])))
+    return(pandas.concat(levorder))
+
+def fsoi_station_freq(data,freq_cutoff=None):
+    # station counts span the whole subtype, as lev_filter did on the subtype data for every time window;
+    # each time of the subtype then carries the same lev/var/station table
+    (lev,inband)=fsoi_level_band(data.plev.values)
+    rows=pandas.DataFrame({"subtype":data.subtype.values,"time":data.time.values,"lev":lev,"varno":data.varno.values,
+        "StnID":data.callsign.values,"pos":numpy.arange(len(data.index))})
+    stats=rows[inband].groupby(["subtype","lev","varno","StnID"],sort=False).pos.agg(["size","min"]).reset_index()
+    stats.columns=["subtype","lev","varno","StnID","Detri_freq","pos"]
+    # nest the groups in order of first appearance, as the subtype/time/lev/var loops did
+    suborder=rows.groupby("subtype",sort=False).pos.min().rename("order1")
+    levorder=fsoi_level_order(data).rename("order3")
+    timeorder=rows.groupby(["subtype","time"],sort=False).pos.min().rename("order2").reset_index()
+    stats=stats.join(suborder,on="subtype").join(levorder,on=["subtype","lev"])
+    stats["order4"]=stats.groupby(["subtype","lev","varno"],sort=False).pos.transform("min")
+    stats=stats.merge(timeorder,on="subtype")
+    stats=stats.sort_values(["order"+str(nkey) for nkey in range(1,5)]+["pos"])
+    if freq_cutoff is not None : stats=stats[stats.Detri_freq.values >= freq_cutoff]
+    return(stats[STNLST_KEYS+["StnID","Detri_freq"]].reset_index(drop=True))
+
+def fsoi_stnlist_segments(stats,workpath,cylchour,varnml=varnml):
+    segments=collections.OrderedDict()
+    varnames={}
+    half=LEV_FACTOR//2
+    for (subtype,obstime,obslev,varno),stn_data in stats.groupby(STNLST_KEYS,sort=False):
+        if varno not in varnames : varnames[varno]=obslib.nml_lookup(varnml,"eleindex",varno,"elename")
+        varname=varnames[varno]
+        (lev_btm,lev_top)=(int(obslev+half),int(obslev-half))
+        ctldic=get_ctlblk_header("header_string","&Station ObsType= '"+str(subtype)+"',\n",None)
+        ctldic=get_ctlblk_header("comment","\n ! FSOI based rejection for "+str(subtype),ctldic)
+        ctldic=get_ctlblk_header("time_ctlstr",get_time_ctlstr(obstime,cylchour),ctldic)
+        ctldic=get_ctlblk_header("comment"," Time "+str(obstime)+" ",ctldic)
+        ctldic=get_ctlblk_header("lev_ctlstr",get_lev_ctlstr(lev_btm,lev_top),ctldic)
+        ctldic=get_ctlblk_header("comment"," Lev "+str(obslev)+" ",ctldic)
+        ctldic=get_ctlblk_header("var_ctlstr",get_ctlstr(varno),ctldic)
+        ctldic=get_ctlblk_header("comment"," of "+str(varname)+" ",ctldic)
+        workdir="/".join([workpath,str(subtype),str(obslib.obs_clock_hour(obstime,cylchour)),str(obslev),str(varname)])
+        outfile=workdir+"/"+STNLST_FILE
+        segments[outfile]=segments.get(outfile,[])+[station_namelist_text(ctldic,stn_data.StnID.values)]
+    return(segments)
+
+def fsoi_stnlist_write(data,workpath,cylchour,varnml=varnml,freq_cutoff=None,file_list=None):
+    stats=fsoi_station_freq(data,freq_cutoff)
+    segments=fsoi_stnlist_segments(stats,workpath,cylchour,varnml)
+    for outfile in segments.keys():
+        obslib.mkdir(os.path.dirname(outfile))
+        with open(outfile,"w") as op:
+            op.write("".join(segments[outfile]))
+    if file_list is not None :
+        obslib.mkdir(os.path.dirname(file_list))
+        with open(file_list,"a") as lst:
+            lst.write("".join([outfile+"\n" for outfile in segments.keys()]))
+    return(file_list)
@@ -76,9 +76,8 @@ def hdf_get_data(filename,fpath):
     return(data1)
 
 def hdf_var_dims(filename,varname):
-	loc=hdf_locate(varname,filename)
-	data=hdf_get_data(filename,loc)
-	dims=data.shape
+	with HdfIndex(filename) as hidx:
+		dims=hidx.var_dims(varname)
 	return(dims)
 
 def get_grp_lst(filename):
@@ -142,34 +141,10 @@ def shape_data(data1,shape1=None):
 	return(data)
 
 def get_var_data(filename,grpnam,varnam,dims=None,prefix=''):
-    fpath=hdf_locate(varnam,filename,prefix,grpnam)
-    print(fpath)
-    with h5py.File(filename, "r") as f:
-        dataptr = f.get(fpath)
-        data1 = numpy.array(dataptr)
-        if str(data1.dtype) == "int16": 
-		data1 = obslib.mask_array(data1)	#, 32767)
-	else: 
-		print(data1.dtype)
-        if str(data1.dtype) == "uint16": 
-		data1 = obslib.mask_array(data1)	#, 65535)
-	else: 
-		print(data1.dtype)
-	scale=get_grp_attrs_val(filename,grpnam,varnam+" Scale")
-	formula=get_grp_attrs_val(filename,grpnam,"Formula to derive value of a Parameter")
-	data1=scale_data(data1,scale,formula)
-	data=shape_data(data1,dims)
-	shpdata=data.shape
-	if len(shpdata) == 3 and dims[0] == shpdata[0] and dims[1] == shpdata[1]:
-	   data=data.reshape((shpdata[0]*shpdata[1],shpdata[2]))
-	else:
-		if len(shpdata) == 2 and dims[0] == shpdata[0] and dims[1] == shpdata[1]: 
-			data=data.flatten()
-		else:
-			print("Shape missmatch",dims,shpdata)
-			print("Warnning: "+str(shpdata))
-	print(data.shape)
-	return(data)
+    with HdfIndex(filename) as hidx:
+        data=hidx.var_data(grpnam,varnam,dims)
+    print(data.shape)
+    return(data)
 
 def frame_const_data(const,elenam,dims,data=None,fillval=numpy.nan):
 	if data is None: data=pandas.DataFrame()
@@ -198,30 +173,131 @@ def frame_var_data(filename,grpnam,varnam,elenam,dims,data=None,const={},fillval
 
 def frame_data(filename,varnml,elist=None,dtfmt='%Y-%jT%H:%M:%S.%f',const={},dims=None,refvar="Latitude",fillval=numpy.nan):
 	filename=obslib.globlist(filename)[0]
-	if dims is None: dims=hdf_var_dims(filename,refvar)
-	varlstinfo=pandas.read_table(varnml)
-	if elist is None: elist=varlstinfo.indx.values
-	print(varlstinfo)
-	data=pandas.DataFrame()
-	for indx in elist:
-		grpnam=varlstinfo.query("indx == @indx").grpname.values[0]
-		varnam=varlstinfo.query("indx == @indx").varname.values[0]
-		elenam=varlstinfo.query("indx == @indx").elename.values[0]
-		print(filename,grpnam,varnam,elenam)
-		data=frame_var_data(filename,grpnam,varnam,elenam,dims,data,const,fillval)
+	with HdfIndex(filename) as hidx:
+		data=hidx.frame(varnml,elist,const=const,dims=dims,refvar=refvar,fillval=fillval)
 	data=obslib.pandas_dtfmt(data,dtfmt)
 	return(data)
 
 def datetime(filename,varnml,dtfmt='%Y-%jT%H:%M:%S.%f',indx=0):
 	filename=obslib.globlist(filename)[0]
-	varlstinfo=pandas.read_table(varnml)
-	elist=[3,4,5,6,7,8]
-	data=pandas.DataFrame()
-	grpnam=varlstinfo.query("indx == @elist[0]").grpname.values[0]
-	varnam=varlstinfo.query("indx == @elist[0]").varname.values[0]
-	fpath=hdf_locate(varnam,filename)
-    	with h5py.File(filename, "r") as f:
-        	dataptr = f.get(fpath)
-        	data1 = numpy.array(dataptr).flatten()[indx]
+	varnam=obslib.nml_lookup(varnml,"indx",3,"varname")
+	with HdfIndex(filename) as hidx:
+		data1=hidx.read(hidx.locate(varnam)).flatten()[indx]
 	datetime=obslib.datetimeframe(data1,dtfmt)
 	return(datetime)
+
+#############202610####
+HDF_CHUNK=int(os.environ.get('HDF_CHUNK',4096))
+
+def attr_value(attrs,key):
+	for key in [key,key.replace("_"," "),key.replace("_"," ").title()]:
+		if key in attrs: return(attrs[key])
+	return(None)
+
+def scale_factors(scale,offset,formula):
+	if scale is None: return(None,None)
+	if formula is None: formula=""
+	if "Scale * Value" not in formula:
+		print("Warnning: Formula not handled")
+		print("Formula: "+formula)
+		return(None,None)
+	if "Offset" not in formula: offset=None
+	if offset is not None: offset=float(offset)
+	return(float(scale),offset)
+
+def scale_block(block,scale=None,offset=None):
+	if str(block.dtype) in ["int16","uint16"]: block=obslib.mask_array(block)
+	if scale is not None: block=numpy.multiply(block,scale)
+	if offset is not None: block=numpy.add(block,offset)
+	return(block)
+
+def flat_data(data1,dims):
+	data=shape_data(data1,dims)
+	shpdata=data.shape
+	if len(shpdata) == 3 and dims[0] == shpdata[0] and dims[1] == shpdata[1]:
+		data=data.reshape((shpdata[0]*shpdata[1],shpdata[2]))
+	elif len(shpdata) == 2 and dims[0] == shpdata[0] and dims[1] == shpdata[1]:
+		data=data.flatten()
+	else:
+		print("Shape missmatch",dims,shpdata)
+	return(data)
+
+def hdf_var_plan(varnml,elist=None):
+	varlstinfo=obslib.nml_table(varnml)
+	if elist is None: elist=varlstinfo.indx.values
+	return([tuple(obslib.nml_lookup(varnml,"indx",indx,col) for col in ["grpname","varname","elename"]) for indx in elist])
+
+class HdfIndex(object):
+    ### One open handle per file, every group, dataset and attribute set is indexed in a single visititems pass
+    def __init__(self,filename):
+        self.filename=filename
+        self.file=h5py.File(filename, "r")
+        self.order={'':-1}
+        self.attrs={'':dict(self.file.attrs.items())}
+        self.datasets={}
+        self.basenames={}
+        self.file.visititems(self.visit)
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self,exc_type,exc_value,tb):
+        self.close()
+        return(False)
+
+    def close(self):
+        self.file.close()
+
+    def visit(self,name,obj):
+        self.order[name]=len(self.order)
+        self.attrs[name]=dict(obj.attrs.items())
+        if isinstance(obj,h5py.Dataset): self.datasets[name]=obj
+        self.basenames.setdefault(name.rsplit('/',1)[-1],[]).append(name)
+        return(None)
+
+    def groups(self):
+        return(list(self.file.keys()))
+
+    def locate(self,Name,grpnam=None):
+        ### Same match as hdf_locate: the hit whose parent group comes first in depth-first order
+        if grpnam is not None and grpnam not in self.groups(): return(None)
+        hits=self.basenames.get(Name,[])
+        if grpnam is not None: hits=[name for name in hits if name.startswith(grpnam+'/')]
+        if len(hits) == 0: return(None)
+        parent=lambda name: name.rsplit('/',1)[0] if '/' in name else ''
+        return('/'+min(hits,key=lambda name: self.order[parent(name)]))
+
+    def var_dims(self,varnam):
+        return(self.file[self.locate(varnam)].shape)
+
+    def read(self,fpath,scale=None,offset=None,chunk=HDF_CHUNK):
+        dset=self.file[fpath]
+        if len(dset.shape) == 0: return(scale_block(numpy.array(dset[()]),scale,offset))
+        data=None
+        for strt in range(0,dset.shape[0],int(chunk)):
+            block=scale_block(dset[strt:strt+int(chunk)],scale,offset)
+            if data is None: data=numpy.empty(dset.shape,dtype=block.dtype)
+            data[strt:strt+int(chunk)]=block
+        if data is None: data=scale_block(dset[()],scale,offset)
+        return(data)
+
+    def var_data(self,grpnam,varnam,dims,chunk=HDF_CHUNK):
+        fpath=self.locate(varnam,grpnam)
+        attrs=self.attrs.get(grpnam,{})
+        (scale,offset)=scale_factors(attr_value(attrs,varnam+" Scale"),attr_value(attrs,varnam+" Offset"),attr_value(attrs,"Formula to derive value of a Parameter"))
+        return(flat_data(self.read(fpath,scale,offset,chunk),dims))
+
+    def frame(self,varnml,elist=None,const={},dims=None,refvar="Latitude",fillval=numpy.nan):
+        if dims is None: dims=self.var_dims(refvar)
+        count=dims[0]*dims[1]
+        grplst=self.groups()
+        columns=OrderedDict()
+        for (grpnam,varnam,elenam) in hdf_var_plan(varnml,elist):
+            if grpnam not in grplst:
+                columns[elenam]=[const.get(elenam,fillval)]*count
+                continue
+            data1=self.var_data(grpnam,varnam,dims)
+            if len(data1.shape) == 1: columns[elenam]=data1
+            if len(data1.shape) == 2:
+                for indx in range(1,(data1.shape[1]+1),1): columns[elenam+"_"+str(indx)]=data1[:,(indx-1)]
+        return(pandas.DataFrame(columns))
@@ -76,11 +76,11 @@ def DataFrame():
 def reset_index(data):
 	return(obslib.reset_index(data))
 
-def ecbufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl=None,elemlist=None,subtype=None,keyfieldlst=[]):
-	return(ecbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl,elemlist=elemlist,subtype=subtype,keyfieldlst=keyfieldlst))
+def ecbufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl=None,elemlist=None,subtype=None,keyfieldlst=[],nproc=None):
+	return(ecbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl,elemlist=elemlist,subtype=subtype,keyfieldlst=keyfieldlst,nproc=nproc))
 
-def ncbufr_decode_files(inpath,Tnode,slctstr,nmlfile):
-	return(ncbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile))
+def ncbufr_decode_files(inpath,Tnode,slctstr,nmlfile,nproc=None):
+	return(ncbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile,nproc=nproc))
 
 def ncbufr_test_read(slctstr,txtfile=None,field=None):
 	return(ncbufr.test_read(slctstr,txtfile,field))
@@ -411,15 +411,15 @@ def obs_frame(datagroup=None,subtypegroup=None,outpath=None,filename="output",op
            print(textfile)
            if data is not None: obslib.obs_frame_ascii(data,textfile,option)
     
-def symobs_main(Tnode,outpath,inpath,nmlpath,obstypelist=[],maxindx=MAXINDX,subtypelist=None):
+def symobs_main(Tnode,outpath,inpath,nmlpath,obstypelist=[],maxindx=MAXINDX,subtypelist=None,nproc=None,method=None):
     if len(obstypelist) == 0:
         obstypelist=obsdic.obstypelist
     for obstype in obstypelist:
-        datagroup=symobs.symulate_obstore(outpath,inpath,nmlpath,Tnode,obstype,maxindx=maxindx,subtypelist=subtypelist)
+        datagroup=symobs.symulate_obstore(outpath,inpath,nmlpath,Tnode,obstype,maxindx=maxindx,subtypelist=subtypelist,nproc=nproc,method=method)
         ######################
         
-def obstore_write(data,keynmlfile,outpath,btchcnt=None,cntmax=None,DT=None,diagflag=0,missing_value=-1073741824.00000):
-	outfile=obstore.obstore_write(data,keynmlfile,outpath,btchcnt=btchcnt,cntmax=cntmax,DT=DT,diagflag=diagflag,missing_value=missing_value)
+def obstore_write(data,keynmlfile,outpath,btchcnt=None,cntmax=None,DT=None,diagflag=0,missing_value=-1073741824.00000,bufferflag=False):
+	outfile=obstore.obstore_write(data,keynmlfile,outpath,btchcnt=btchcnt,cntmax=cntmax,DT=DT,diagflag=diagflag,missing_value=missing_value,bufferflag=bufferflag)
 	return(outfile)
 
 #def obstore_read_file(inpath,obstype,nmlpath=OBSNML,filevar=None,maxindx=MAXINDX):
@@ -21,23 +21,36 @@ nmlfile="%s/%s" % (OBSNML,obs_index_nml)
 import obslib
 import obsdic
 import netCDF4
+import numpy
+import collections
+import atexit
+import tempfile
 import ngfsradic as datadic
 #import ncepradic as datadic
 #import imdaadic as datadic
 
 
-def getdata(var="time",element=None,year=None,month=None,day=None):
+def getdata(var="time",element=None,year=None,month=None,day=None,tslice=None):
     if element is None: element=var
     print(var,element)
-    with netCDF4.Dataset(datadic.filename(element,year,month,day), 'r',  format='NETCDF4_CLASSIC') as fileptr : 
-        data = fileptr.variables[datadic.datavar[var]][:]
+    filename=datadic.filename(element,year,month,day)
+    key=(filename,datadic.datavar[var],slice_key(tslice))
+    data=FIELD_CACHE.get(key)
+    if data is None:
+        with netCDF4.Dataset(filename, 'r',  format='NETCDF4_CLASSIC') as fileptr : 
+            if tslice is None : data = fileptr.variables[datadic.datavar[var]][:]
+            else : data = fileptr.variables[datadic.datavar[var]][tslice]
+        data=FIELD_CACHE.put(key,data)
     return(data)
     
 def getunits(var="time",element=None,year=None,month=None,day=None):
     if element is None: element=var
-    with netCDF4.Dataset(datadic.filename(element,year,month,day), 'r',  format='NETCDF4_CLASSIC') as fileptr : 
-        units = fileptr.variables[datadic.datavar[var]].units
-    return(units)
+    filename=datadic.filename(element,year,month,day)
+    key=(filename,datadic.datavar[var])
+    if key not in UNITS_CACHE:
+        with netCDF4.Dataset(filename, 'r',  format='NETCDF4_CLASSIC') as fileptr : 
+            UNITS_CACHE[key] = fileptr.variables[datadic.datavar[var]].units
+    return(UNITS_CACHE[key])
 
 def getfiledim(Tnow,element=None):
     if element is None: element="tmp"
@@ -71,3 +84,125 @@ def getfiledim(Tnow,element=None):
 #    if element is None: element=var
 #    units=ngfsradic.getunits(Year,var,element)
 #    return(units)
+
+#############202610####
+CACHE_MB=float(os.environ.get('NATURE_CACHE_MB',4096))
+SPILL_DIR=os.environ.get('NATURE_SPILL_DIR',None)
+
+def slice_key(tslice):
+    if tslice is None : return(None)
+    if isinstance(tslice,slice) : return(("slice",tslice.start,tslice.stop,tslice.step))
+    return(tuple(numpy.atleast_1d(tslice).tolist()))
+
+def field_nbytes(data):
+    size=numpy.ma.getdata(data).nbytes
+    mask=numpy.ma.getmask(data)
+    if mask is not numpy.ma.nomask : size+=mask.nbytes
+    return(size)
+
+def field_freeze(data):
+    # cached fields are shared between callers, so nobody may write into them
+    for array in [numpy.ma.getdata(data),numpy.ma.getmask(data)]:
+        if isinstance(array,numpy.ndarray) : array.flags.writeable=False
+    return(data)
+
+class FieldCache(object):
+    ### LRU cache keyed on (file,variable,time slice); entries over budget are dropped, or memory-mapped from spilldir
+    def __init__(self,budget_mb=CACHE_MB,spilldir=SPILL_DIR):
+        self.budget=int(float(budget_mb)*1024*1024)
+        self.spilldir=spilldir
+        self.entries=collections.OrderedDict()
+        self.spilled={}
+        self.tmpdirs=[]
+        self.nbytes=0
+
+    def get(self,key):
+        if key in self.entries:
+            data=self.entries.pop(key)
+            self.entries[key]=data
+            return(data)
+        if key in self.spilled : return(self.spill_load(key))
+        return(None)
+
+    def put(self,key,data):
+        data=field_freeze(data)
+        size=field_nbytes(data)
+        if size > self.budget :
+            if self.spilldir is None : return(data)
+            self.spill(key,data)
+            return(self.spill_load(key))
+        self.entries[key]=data
+        self.nbytes+=size
+        self.trim()
+        return(data)
+
+    def trim(self):
+        while self.nbytes > self.budget and len(self.entries) > 0 :
+            (oldkey,olddata)=self.entries.popitem(last=False)
+            self.nbytes-=field_nbytes(olddata)
+            if self.spilldir is not None : self.spill(oldkey,olddata)
+
+    def spill(self,key,data):
+        obslib.mkdir(self.spilldir)
+        prefix="%s/nature_%d_%d" % (self.spilldir,os.getpid(),len(self.spilled))
+        values=numpy.lib.format.open_memmap(prefix+".npy",mode="w+",dtype=data.dtype,shape=data.shape)
+        values[...]=numpy.ma.getdata(data)
+        values.flush()
+        maskpath=None
+        if numpy.ma.getmask(data) is not numpy.ma.nomask :
+            maskpath=prefix+"_mask.npy"
+            numpy.save(maskpath,numpy.ma.getmask(data))
+        self.spilled[key]=(prefix+".npy",maskpath,isinstance(data,numpy.ma.MaskedArray))
+        del values
+
+    def spill_load(self,key):
+        (datapath,maskpath,masked)=self.spilled[key]
+        values=numpy.load(datapath,mmap_mode="r")
+        if not masked : return(values)
+        if maskpath is None : return(numpy.ma.MaskedArray(values,copy=False))
+        return(numpy.ma.MaskedArray(values,mask=numpy.load(maskpath,mmap_mode="r"),copy=False))
+
+    def clear(self):
+        for paths in self.spilled.values():
+            for path in paths[0:2]:
+                if path is not None and os.path.exists(path) : os.remove(path)
+        self.entries.clear()
+        self.spilled.clear()
+        self.nbytes=0
+        for tmpdir in self.tmpdirs:
+            if os.path.isdir(tmpdir) and len(os.listdir(tmpdir)) == 0 : os.rmdir(tmpdir)
+
+FIELD_CACHE=FieldCache()
+UNITS_CACHE={}
+atexit.register(FIELD_CACHE.clear)
+
+def cache_config(budget_mb=None,spilldir=None):
+    if budget_mb is not None : FIELD_CACHE.budget=int(float(budget_mb)*1024*1024)
+    if spilldir is not None : FIELD_CACHE.spilldir=spilldir
+    FIELD_CACHE.trim()
+    return(FIELD_CACHE)
+
+def cache_clear():
+    FIELD_CACHE.clear()
+    UNITS_CACHE.clear()
+
+def cache_fork_dir(basedir=None):
+    ### Private spill directory for a worker pool: fields over the budget are memory-mapped from here, so
+    ### forked workers share them through the page cache instead of each reading its own copy
+    if FIELD_CACHE.spilldir is not None :
+        obslib.mkdir(FIELD_CACHE.spilldir)
+        basedir=FIELD_CACHE.spilldir
+    rundir=tempfile.mkdtemp(prefix="nature_",dir=basedir)
+    FIELD_CACHE.tmpdirs.append(rundir)
+    spilldir=FIELD_CACHE.spilldir
+    FIELD_CACHE.spilldir=rundir
+    return(rundir,spilldir)
+
+def cache_fork_release(rundir,spilldir=None):
+    ### atexit does not run in pool workers: remove the spill files they left, keep the ones this process maps
+    ownfiles=set([path for paths in FIELD_CACHE.spilled.values() for path in paths[0:2] if path is not None])
+    if os.path.isdir(rundir) :
+        for filename in os.listdir(rundir):
+            path="%s/%s" % (rundir,filename)
+            if path not in ownfiles : os.remove(path)
+    FIELD_CACHE.spilldir=spilldir
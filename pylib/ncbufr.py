@@ -22,6 +22,10 @@ import ncepbufr
 import pandas
 import numpy
 import collections
+import itertools
+import multiprocessing
+import multiprocessing.pool
+NCBUFR_CHUNK=int(os.environ.get('NCBUFR_CHUNK',256))
 
 #################################################################################
 ### Common Methords used are as follows.
@@ -65,8 +69,8 @@ def get_ncbufr_fieldlist(elemlist=None,nmlfile=None,ncbufrnml=NCBUFRNML):
 	levlist=[]
 	for elem in elist.elem:
 		#print(elem)
-		fieldname=pandas.read_table(ncbufrnml).query("indx == @elem").fieldname.values[0]
-		elename=pandas.read_table(ncbufrnml).query("indx == @elem").elename.values[0]
+		fieldname=obslib.nml_table(ncbufrnml).query("indx == @elem").fieldname.values[0]
+		elename=obslib.nml_table(ncbufrnml).query("indx == @elem").elename.values[0]
 		count=elist.query("elem == @elem").elcnt.values[0]
 		#print(count)
 		if count == 1 :
@@ -114,28 +118,122 @@ def message_read(bufr,nmlfile,fieldlist=None):
 	return(data)
 		
 
-def bufr_decode(infile,nmlfile,fieldlist=None):
-	data=pandas.DataFrame()
-	bufr = ncepbufr.open(infile)
-	while bufr.advance() == 0:
-		data1=message_read(bufr,nmlfile,fieldlist=fieldlist)
-    		data=data.append(data1, ignore_index=True)
-		data=obslib.reset_index(data)
-	bufr.close()
+def bufr_decode(infile,nmlfile,fieldlist=None,nproc=1):
+	if fieldlist is None: fieldlist=get_ncbufr_fieldlist(nmlfile=nmlfile)
+	data=bufr_parallel_decode([infile],ncbufr_field_plan(fieldlist),nproc=nproc)
+	data=obslib.reset_index(data)
 	subtype=obslib.get_key_info(nmlfile,"obsubtyp")
 	data=data.assign(subtype=[int(subtype)]*len(data))
 	return(data)
 
-def bufr_decode_files(inpath,Tnode,slctstr,nmlfile,):
+def bufr_decode_files(inpath,Tnode,slctstr,nmlfile,nproc=None,chunk=NCBUFR_CHUNK):
 	searchstring=inpath+"/"+slctstr
 	infiles=obslib.globlist(searchstring)
 	if len(infiles) == 0: print("File not found: "+searchstring)
 	print("Received "+str(len(infiles))+" bufr files")
-	data=obslib.DataFrame()
-	for infile in infiles[:] :
-		print(infile)
-		data1=bufr_decode(infile,nmlfile)
-		data=data.append(data1)
+	fieldlist=get_ncbufr_fieldlist(nmlfile=nmlfile)
+	data=bufr_parallel_decode(infiles,ncbufr_field_plan(fieldlist),nproc=nproc,chunk=chunk)
 	data=obslib.reset_index(data)
+	subtype=obslib.get_key_info(nmlfile,"obsubtyp")
+	data=data.assign(subtype=[int(subtype)]*len(data))
 	#print(data)
 	return(data)
+
+#############202610####
+def ncbufr_field_plan(fieldlist):
+    ### (elename,mnemonic,rank): "#<rank>#<mnemonic>" picks one replication of the mnemonic
+    plan=[]
+    for indx,field in fieldlist.iterrows():
+        fieldname=field.fieldname
+        if fieldname.startswith("#"):
+            plan.append((field.elename,fieldname.split('#')[-1],int(fieldname.split('#')[1])))
+        else:
+            plan.append((field.elename,fieldname,1))
+    return(plan)
+
+def subset_count(bufr):
+    if hasattr(bufr,"subsets"): return(int(bufr.subsets))
+    count=0
+    while bufr.load_subset() == 0: count+=1
+    return(count)
+
+def message_subset_counts(infile):
+    bufr = ncepbufr.open(infile)
+    counts=[]
+    while bufr.advance() == 0: counts.append(subset_count(bufr))
+    bufr.close()
+    return(counts)
+
+def bufr_decode_task(task):
+    (infile,msgstrt,msgcnts,plan)=task
+    nrow=sum(msgcnts)
+    columns=dict((elename,numpy.full(nrow,numpy.nan)) for (elename,mnemonic,rank) in plan)
+    mnemonics=sorted(set([mnemonic for (elename,mnemonic,rank) in plan]))
+    bufr = ncepbufr.open(infile)
+    msgid=0
+    row=0
+    while msgid < msgstrt+len(msgcnts) and bufr.advance() == 0:
+        msgid+=1
+        if msgid <= msgstrt: continue
+        while row < nrow and bufr.load_subset() == 0:
+            values=dict((mnemonic,numpy.ma.filled(numpy.ma.asarray(bufr.read_subset(mnemonic),dtype=numpy.float64),numpy.nan).ravel()) for mnemonic in mnemonics)
+            for (elename,mnemonic,rank) in plan:
+                if rank <= len(values[mnemonic]): columns[elename][row]=values[mnemonic][rank-1]
+            row+=1
+    bufr.close()
+    return(columns)
+
+def bufr_decode_tasks(infiles,plan,nproc=1,chunk=NCBUFR_CHUNK):
+    ### First pass: subset count of every message, used to split files and size the output arrays
+    pool=bufr_pool(nproc,len(infiles))
+    if pool is None:
+        countlist=[message_subset_counts(infile) for infile in infiles]
+    else:
+        try:
+            countlist=pool.map(message_subset_counts,infiles)
+        finally:
+            pool.close()
+            pool.join()
+    tasklist=[]
+    for infile,counts in zip(infiles,countlist):
+        print(infile+" : "+str(len(counts))+" messages "+str(sum(counts))+" subsets")
+        for strt in range(0,len(counts),int(chunk)):
+            tasklist.append((infile,strt,counts[strt:strt+int(chunk)],plan))
+    return(tasklist)
+
+def bufr_pool(nproc,ntask):
+    if nproc is None: nproc=multiprocessing.cpu_count()
+    nproc=max(1,min(int(nproc),ntask))
+    if nproc == 1: return(None)
+    return(multiprocessing.Pool(nproc))
+
+def bufr_task_results(tasklist,nproc=1):
+    pool=bufr_pool(nproc,len(tasklist))
+    if pool is None:
+        for task in tasklist: yield bufr_decode_task(task)
+        return
+    if nproc is None: nproc=multiprocessing.cpu_count()
+    try:
+        for columns in obslib.bounded_imap(pool,bufr_decode_task,tasklist,2*int(nproc)): yield columns
+    finally:
+        pool.terminate()
+        pool.join()
+
+def bufr_parallel_decode(infiles,plan,nproc=None,chunk=NCBUFR_CHUNK):
+    names=[elename for (elename,mnemonic,rank) in plan]
+    tasklist=bufr_decode_tasks(infiles,plan,nproc,chunk)
+    total=sum([sum(task[2]) for task in tasklist])
+    columns=collections.OrderedDict((name,numpy.full(total,numpy.nan)) for name in names)
+    row=0
+    for task,result in itertools.izip(tasklist,bufr_task_results(tasklist,nproc)):
+        nrow=sum(task[2])
+        for name in names: columns[name][row:row+nrow]=result[name]
+        row+=nrow
+    return(pandas.DataFrame(columns,columns=names))
+
+def bufr_decode_chunks(tasklist,nproc=1):
+    ### Yields (data,messagecount) per task in file order
+    if len(tasklist) == 0: return
+    names=[elename for (elename,mnemonic,rank) in tasklist[0][3]]
+    for task,columns in itertools.izip(tasklist,bufr_task_results(tasklist,nproc)):
+        yield (pandas.DataFrame(columns,columns=names),len(task[2]))
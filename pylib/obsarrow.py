@@ -0,0 +1,230 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 10:12:40 2026
+
+@author: gibies
+"""
+from __future__ import print_function
+import sys
+import os
+CURR_PATH=os.path.dirname(os.path.abspath(__file__))
+PKGHOME=os.path.dirname(CURR_PATH)
+OBSLIB=os.environ.get('OBSLIB',PKGHOME+"/pylib")
+sys.path.append(OBSLIB)
+OBSDIC=os.environ.get('OBSDIC',PKGHOME+"/pydic")
+sys.path.append(OBSDIC)
+OBSNML=os.environ.get('OBSNML',PKGHOME+"/nml")
+sys.path.append(OBSNML)
+import obslib
+import obstore
+import pandas
+import numpy
+import collections
+
+diaglev=int(os.environ.get('GEN_MODE',0))
+MAXINDX=int(os.environ.get('MAXINDX',obstore.MAXINDX))
+NML_OBS_INDX=obstore.NML_OBS_INDX
+MISSING=[obstore.NAN_VAL,-1073741824.0]
+PARTITION=["subtype","cycle"]
+TIMEKEYS=["Year","Month","Day","Hour","Minute","Second"]
+def errprint(*args, **kwargs):
+    if diaglev > 0: print(*args, file=sys.stderr, **kwargs)
+
+HAS_PYARROW = False
+try:
+    import pyarrow
+    import pyarrow.parquet
+    import pyarrow.feather
+    HAS_PYARROW = True
+except ImportError:
+    errprint("Warning: pyarrow not found. Parquet/Arrow export disabled.")
+
+def check_pyarrow():
+    if not HAS_PYARROW: raise ImportError("pyarrow is required for obstore Parquet/Arrow datasets")
+
+DATASET_FORMAT={
+    'parquet': "parquet",
+    'arrow': "feather",
+    'ipc': "feather",
+    'feather': "feather",
+}
+
+def dataset_format(fmt):
+    if fmt not in DATASET_FORMAT: raise ValueError("Unknown dataset format "+str(fmt)+"; valid options are "+", ".join(sorted(DATASET_FORMAT)))
+    return(DATASET_FORMAT[fmt])
+
+def obstore_read_cycle(obsfile):
+    (year,month,day,hour,minute)=[int(obstore.obstore_read_header(obsfile,pos,1)) for pos in [21,22,23,24,25]]
+    return("%04d%02d%02dT%02d%02dZ" % (year,month,day,hour,minute))
+
+def batch_element_names(elist,nmlfile=NML_OBS_INDX,keyinfofile=None,subtype=None,elemlist=None):
+    elenams=list(elist.Element.values)
+    if elemlist is None and keyinfofile is not None:
+        elemlist=obslib.get_key_list_info(keyinfofile,"elemlist_"+str(int(subtype)))
+    if elemlist is None: return(elenams)
+    slctnams=list(obstore.obstore_create_element_table(nmlfile,list(elemlist)).Element.values)
+    return([element for element in elenams if element in slctnams])
+
+def frame_obstime(data):
+    if not all(key in data for key in TIMEKEYS): return(data)
+    timeframe=data[TIMEKEYS].astype(numpy.float64).replace(MISSING,numpy.nan)
+    timeframe.columns=[key.lower() for key in TIMEKEYS]
+    data=data.assign(obstime=pandas.to_datetime(timeframe,errors="coerce"))
+    return(data)
+
+def obstore_batch_frame(input_file,indx,nmlfile=NML_OBS_INDX,keyinfofile=None,elemlist=None,cycle=None,maxindx=MAXINDX):
+    with open(input_file, "rb") as infile:
+        subtype=int(obstore.obstore_read_index_subtype(infile,indx))
+        if cycle is None: cycle=obstore_read_cycle(infile)
+        elist=obstore.obstore_read_batch_elements(infile,indx,nmlfile,maxindx)
+    elenams=batch_element_names(elist,nmlfile,keyinfofile,subtype,elemlist)
+    data=obstore.frame_data_batch(input_file,nmlfile,indx,elenams,maxindx=maxindx,mmapflag=True)
+    numcols=[col for col in data.columns if data[col].dtype.kind == "f"]
+    data[numcols]=data[numcols].replace(MISSING,numpy.nan)
+    data=frame_obstime(data)
+    data=data.assign(batch=int(indx),subtype=subtype,cycle=cycle)
+    return(data.reset_index(drop=True))
+
+### Only the pyarrow calls available since 0.x (the last py2 release) are used: pyarrow.parquet
+### write_table/ParquetFile for Parquet and pyarrow.feather for Arrow, one file per batch named
+### from the obstore so that a re-export replaces it. Subtype/cycle are pruned on the hive
+### directory keys; Parquet row groups are pruned on their Latitude/Longitude/obstime min/max
+### statistics, so each batch is sorted on SORTKEYS before writing to keep those ranges narrow.
+### dataset_filter stays the exact final cut.
+
+SORTKEYS=["obstime","Latitude"]
+STATKEYS=["Latitude","Longitude","obstime"]
+
+def partition_path(outpath,data):
+    return(os.path.join(outpath,*[key+"="+str(data[key].iloc[0]) for key in PARTITION]))
+
+def dataset_write_batch(data,outpath,dsfmt,basename,rowgroup=65536):
+    sortkeys=[key for key in SORTKEYS if key in data]
+    if len(sortkeys) > 0: data=data.sort_values(sortkeys,kind="mergesort")
+    partpath=partition_path(outpath,data)
+    if not os.path.isdir(partpath): os.makedirs(partpath)
+    data=data.drop(columns=PARTITION).reset_index(drop=True)
+    if dsfmt == "parquet":
+        outfile=os.path.join(partpath,basename+".parquet")
+        table=pyarrow.Table.from_pandas(data,preserve_index=False)
+        pyarrow.parquet.write_table(table,outfile,row_group_size=int(rowgroup))
+        return(outfile)
+    outfile=os.path.join(partpath,basename+".feather")
+    pyarrow.feather.write_feather(data,outfile)
+    return(outfile)
+
+def obstore_to_dataset(filelist,outpath,fmt="parquet",nmlfile=NML_OBS_INDX,keyinfofile=None,elemlist=None,subtyplst=None,cycle=None,rowgroup=65536,maxindx=MAXINDX):
+    dsfmt=dataset_format(fmt)
+    check_pyarrow()
+    if isinstance(filelist,str): filelist=obslib.globlist(filelist)
+    for input_file in filelist:
+        basename=os.path.basename(input_file).replace(".obstore","")
+        tasklist=obstore.obstore_batch_tasks(input_file,nmlfile,subtyplst,maxindx)
+        for batchtask in tasklist:
+            indx=batchtask[2]
+            data=obstore_batch_frame(input_file,indx,nmlfile,keyinfofile,elemlist,cycle,maxindx)
+            if len(data) == 0: continue
+            dataset_write_batch(data,outpath,dsfmt,basename+"_b"+str(indx),rowgroup)
+            errprint(input_file,indx,len(data))
+    return(outpath)
+
+def partition_match(partkeys,subtype=None,cycle=None):
+    if subtype is not None and partkeys.get("subtype") not in [str(int(i)) for i in numpy.atleast_1d(subtype)]: return(False)
+    if cycle is not None and partkeys.get("cycle") not in [str(i) for i in numpy.atleast_1d(cycle)]: return(False)
+    return(True)
+
+def lon_mask(lon,lonlim):
+    (lon0,lon1)=[float(i) for i in lonlim]
+    if lon0 <= lon1: return((lon >= lon0) & (lon <= lon1))
+    ### box crossing the dateline, e.g. (170,-170): split into [lon0,180] and [-180,lon1]
+    return((lon >= lon0) | (lon <= lon1))
+
+def stat_overlap(minval,maxval,lim,key):
+    if minval is None or maxval is None: return(True)
+    if key == "obstime":
+        (minval,maxval,lo,hi)=[pandas.Timestamp(i) for i in [minval,maxval]+list(lim)]
+        return(maxval >= lo and minval <= hi)
+    (minval,maxval,lo,hi)=[float(i) for i in [minval,maxval]+list(lim)]
+    if numpy.isnan(minval) or numpy.isnan(maxval): return(True)
+    if key == "Longitude" and lo > hi: return(maxval >= lo or minval <= hi)
+    return(maxval >= lo and minval <= hi)
+
+def rowgroup_select(metadata,latlim=None,lonlim=None,timelim=None):
+    limdict=dict([(key,lim) for (key,lim) in zip(STATKEYS,[latlim,lonlim,timelim]) if lim is not None])
+    colindx=dict([(metadata.schema.column(j).name,j) for j in range(metadata.num_columns)])
+    rowgroups=[]
+    for i in range(metadata.num_row_groups):
+        rowgroup=metadata.row_group(i)
+        keep=True
+        for key in limdict:
+            if key not in colindx: continue
+            stats=rowgroup.column(colindx[key]).statistics
+            if stats is None or not stats.has_min_max: continue
+            if not stat_overlap(stats.min,stats.max,limdict[key],key): keep=False; break
+        if keep: rowgroups.append(i)
+    return(rowgroups)
+
+def dataset_filter(data,latlim=None,lonlim=None,timelim=None,userfilter=None):
+    if len(data) == 0: return(data)
+    mask=numpy.ones(len(data),dtype=bool)
+    if latlim is not None: mask&=((data["Latitude"] >= float(latlim[0])) & (data["Latitude"] <= float(latlim[1]))).values
+    if lonlim is not None: mask&=lon_mask(data["Longitude"],lonlim).values
+    if timelim is not None: mask&=((data["obstime"] >= pandas.Timestamp(timelim[0])) & (data["obstime"] <= pandas.Timestamp(timelim[1]))).values
+    if userfilter is not None:
+        if callable(userfilter): mask&=numpy.asarray(userfilter(data),dtype=bool)
+        else: mask&=data.eval(userfilter).values
+    return(data[mask])
+
+def partition_dirs(inpath,subtype=None,cycle=None):
+    partlist=[]
+    for (dirpath,dirnames,filenames) in sorted(os.walk(inpath)):
+        partkeys=dict([item.split("=",1) for item in os.path.relpath(dirpath,inpath).split(os.sep) if "=" in item])
+        if not all(key in partkeys for key in PARTITION): continue
+        if partition_match(partkeys,subtype,cycle): partlist.append((dirpath,partkeys,sorted(filenames)))
+    return(partlist)
+
+def read_parquet_dataset(inpath,columns=None,subtype=None,cycle=None,latlim=None,lonlim=None,timelim=None):
+    datalist=[]
+    for (dirpath,partkeys,filenames) in partition_dirs(inpath,subtype,cycle):
+        for filename in filenames:
+            if not filename.endswith(".parquet"): continue
+            pqfile=pyarrow.parquet.ParquetFile(os.path.join(dirpath,filename))
+            rowgroups=rowgroup_select(pqfile.metadata,latlim,lonlim,timelim)
+            errprint(filename,len(rowgroups),"of",pqfile.metadata.num_row_groups,"row groups")
+            if len(rowgroups) == 0: continue
+            filecols=None
+            if columns is not None: filecols=[col for col in columns if col in pqfile.schema.names]
+            table=pyarrow.concat_tables([pqfile.read_row_group(i,columns=filecols) for i in rowgroups])
+            datalist.append(table.to_pandas().assign(**partkeys))
+    if len(datalist) == 0: return(pandas.DataFrame(columns=list(columns or [])+PARTITION))
+    return(pandas.concat(datalist,ignore_index=True,sort=False))
+
+def read_feather_dataset(inpath,columns=None,subtype=None,cycle=None):
+    datalist=[]
+    for (dirpath,partkeys,filenames) in partition_dirs(inpath,subtype,cycle):
+        for filename in filenames:
+            if not filename.endswith(".feather"): continue
+            data=pyarrow.feather.read_feather(os.path.join(dirpath,filename),columns=columns)
+            datalist.append(data.assign(**partkeys))
+    if len(datalist) == 0: return(pandas.DataFrame(columns=list(columns or [])+PARTITION))
+    return(pandas.concat(datalist,ignore_index=True,sort=False))
+
+def query_dataset(inpath,fmt="parquet",selectlist=None,latlim=None,lonlim=None,timelim=None,subtype=None,cycle=None,userfilter=None):
+    dsfmt=dataset_format(fmt)
+    check_pyarrow()
+    columns=None
+    if selectlist is not None and userfilter is None:
+        filtcols=[col for (col,lim) in [("Latitude",latlim),("Longitude",lonlim),("obstime",timelim)] if lim is not None]
+        columns=[col for col in list(selectlist)+filtcols if col not in PARTITION]
+        columns=list(collections.OrderedDict.fromkeys(columns))
+    if dsfmt == "parquet":
+        data=read_parquet_dataset(inpath,columns,subtype,cycle,latlim,lonlim,timelim)
+    else:
+        data=read_feather_dataset(inpath,columns,subtype,cycle)
+    for key in PARTITION:
+        if key in data: data[key]=data[key].astype(str)
+    if "subtype" in data: data["subtype"]=data["subtype"].astype(int)
+    data=dataset_filter(data,latlim,lonlim,timelim,userfilter).reset_index(drop=True)
+    if selectlist is not None: data=data[list(selectlist)]
+    return(data)
@@ -50,6 +50,7 @@ def getalphaheader(alphalen,callsignflag=False):
     return(alpha)
 
 def readalphaheader(input_file,alphalen):
+    if alphalen == 256: return(numpy.array(obstore.obstore_header_file(input_file).alpha,dtype=numpy.int64))
     alphapos=1
     with open(input_file, "rb") as infile:
         alpha=obstore.obstore_read_header(infile,alphapos,alphalen)
@@ -112,6 +113,7 @@ def getbeetaheader(alphalen):
 #    
     
 def readbeetaheader(input_file,alphalen):
+    if alphalen == 256: return(numpy.array(obstore.obstore_header_file(input_file).beeta,dtype=numpy.int64))
     alpha=readalphaheader(input_file,alphalen)
     beetapos=int(alpha[100-1])
     beetalen=int(alpha[101-1])
@@ -182,6 +184,7 @@ def getgamaheader(alphalen):
 #
 
 def readgamaheader(input_file,alphalen):
+    if alphalen == 256: return(numpy.array(obstore.obstore_header_file(input_file).gamma,dtype=numpy.float64))
     alpha=readalphaheader(input_file,alphalen)
     gamapos=int(alpha[105-1])
     gamalen=int(alpha[106-1])
@@ -23,6 +23,7 @@ import numpy
 import struct
 import datetime
 import glob
+import collections
 from itertools import chain
 NAN_VAL_INT=-32768
 NAN_VAL=-1.07374182e+09
@@ -786,28 +787,41 @@ def obs_frame_ascii(data,outfile=None,option=0):
              op.write(data)
     return(outfile)
 
+def obs_chunks_ascii(chunks,outfile):
+    ### passes (data,weight) chunks through, appending each to one text dump with a running index
+    mkdir(outfile.rsplit("/",1)[0])
+    count=0
+    with open(outfile,"w") as op:
+        for (data,weight) in chunks:
+            if len(data) > 0:
+                dump=reset_index(data,pandas.Series(range(count+1,count+len(data)+1,1)))
+                if count > 0: op.write("\n")
+                dump.to_string(op,header=(count == 0))
+                count+=len(data)
+            yield (data,weight)
+
 def getopsname(nmlfile,odbname):
-    with open(nmlfile, "r") as nml:
-        try:opsname = str(pandas.read_table(nml, skiprows=None, header=0).query("odbname == @odbname").opsname.values[0])
-        except:opsname=str(odbname)
+    nml=nml_table(nmlfile)
+    try:opsname = str(nml.query("odbname == @odbname").opsname.values[0])
+    except:opsname=str(odbname)
     return(opsname)
 
 def getodbname(nmlfile,opsname):
-    with open(nmlfile, "r") as nml:
-        try:odbname = str(pandas.read_table(nml, skiprows=None, header=0).query("opsname == @opsname").odbname.values[0])
-        except:odbname=str(opsname)
+    nml=nml_table(nmlfile)
+    try:odbname = str(nml.query("opsname == @opsname").odbname.values[0])
+    except:odbname=str(opsname)
     return(odbname)
 
 def get_subtype_name(nmlfile,subtype):
-    with open(nmlfile, "r") as nml:
-        try:name = str(pandas.read_table(nml, skiprows=None, header=0).query("subtype == @subtype").obstypnam.values[0])
-        except:name=str(subtype)
+    nml=nml_table(nmlfile)
+    try:name = str(nml.query("subtype == @subtype").obstypnam.values[0])
+    except:name=str(subtype)
     return(name)
 
 def get_subtype_code(nmlfile,obstypnam):
-    with open(nmlfile, "r") as nml:
-        try:stypcode = int(pandas.read_table(nml, skiprows=None, header=0).query("obstypnam == @obstypnam").subtype.values[0])
-        except:stypcode=int(0)
+    nml=nml_table(nmlfile)
+    try:stypcode = int(nml.query("obstypnam == @obstypnam").subtype.values[0])
+    except:stypcode=int(0)
     return(stypcode)
 
 def dfheader(data):
@@ -850,15 +864,17 @@ def dataunit(long_name):
     return(dataunit)
 
 def getvarno(varno_nmlfile,varnam):
-    with open(varno_nmlfile, "r") as nml:
-        varno = str(pandas.read_table(nml, skiprows=None, header=0).query("varnam == @varnam").varno.values[0])
-        #if varname in ["--","-",""]: varname="varno_"+str(varno)
+    nml=nml_table(varno_nmlfile)
+    varno = str(nml.query("varnam == @varnam").varno.values[0])
+    #if varname in ["--","-",""]: varname="varno_"+str(varno)
     return(varno)
 
 def getvarname(varno_nmlfile,varno):
-    with open(varno_nmlfile, "r") as nml:
-        varname = str(pandas.read_table(nml, skiprows=None, header=0).query("varno == @varno").varnam.values[0])
-        if varname in ["--","-",""]: varname="varno_"+str(varno)
+    nml=nml_table(varno_nmlfile)
+    varnam=nml.query("varno == @varno").varnam.values
+    if len(varnam) == 0: return("varno_"+str(varno))
+    varname = str(varnam[0])
+    if varname in ["--","-",""]: varname="varno_"+str(varno)
     return(varname)
 
 def listvarname(varno_nmlfile,varnolist):
@@ -868,98 +884,108 @@ def listvarno(varno_nmlfile,varnamlist):
     return([getvarno(varno_nmlfile,varnam) for varnam in varnamlist])
 
 def getlongname(varno_nmlfile,varno):
-    with open(varno_nmlfile, "r") as nml:
-        long_name = str(pandas.read_table(nml, skiprows=None, header=0).query("varno == @varno").longnam.values[0])
-        if long_name in ["--","-",""]: long_name="varno_"+str(varno)
+    nml=nml_table(varno_nmlfile)
+    long_name = str(nml.query("varno == @varno").longnam.values[0])
+    if long_name in ["--","-",""]: long_name="varno_"+str(varno)
     return(long_name)
 
 def get_subtype_name(subtype_nmlfile,subtype):
-    with open(subtype_nmlfile, "r") as nml:
-        subtype_name = str(pandas.read_table(nml, skiprows=None, header=0).query("subtype == @subtype").stname.values[0])
-        if subtype_name in ["--","-",""]: subtype_name="subtype_"+str(subtype)
+    nml=nml_table(subtype_nmlfile)
+    subtype_name = str(nml.query("subtype == @subtype").stname.values[0])
+    if subtype_name in ["--","-",""]: subtype_name="subtype_"+str(subtype)
     return(subtype_name)
 
-def gridded_count_1x1deg(obsframe,varname=None):
-    nrows=len(obsframe)
-    latmin=int(-90)
-    latmax=int(90)
-    lonmin=int(-180)
-    lonmax=int(180)
-    glat=range(latmin,latmax,1)
-    glon=range(lonmin,lonmax,1)
-    gridded_count = numpy.zeros((len(glat),len(glon)), dtype=numpy.int)
-    for row in obsframe.index:
-        gridded_count[int(obsframe.Latitude[row])-latmin-1,int(obsframe.Longitude[row])-lonmin-1] += 1
-    gridded_count[gridded_count==0]=-99999
-    datacount=pandas.DataFrame(gridded_count,columns=glon,index=glat)
-    return(datacount)
-    
-def gridded_sum_1x1deg(obsframe,varname,fieldname="Obsvalue"):
-    nrows=len(obsframe)
-    latmin=int(-90)
-    latmax=int(90)
-    lonmin=int(-180)
-    lonmax=int(180)
-    glat=range(latmin,latmax,1)
-    glon=range(lonmin,lonmax,1)
-    gridded_sum = numpy.zeros((len(glat),len(glon)), dtype=numpy.int)
-    try: data=obsframe[str(fieldname)]
-    except: data=obsframe[str(varname)]
-    for row in obsframe.index:
-        gridded_sum[int(obsframe.Latitude[row])-latmin-1,int(obsframe.Longitude[row])-lonmin-1] += data[row]
-    gridded_sum[gridded_sum==0]=numpy.nan
-    data=pandas.DataFrame(gridded_sum,columns=glon,index=glat)
+#### Gridding engine: observations are binned by flat cell index and reduced with bincount (count,
+#### sum, sum of squares) and sorted reduceat (min, max). Input may be a frame or an iterator of frames,
+#### in which case only the running accumulators are kept between chunks.
+
+GRID_BBOX=(-90.,90.,-180.,180.)
+GRID_STATS=["count","sum","mean","rms","min","max"]
+
+def grid_axes(gridres=1.0,bbox=None):
+    if bbox is None: bbox=GRID_BBOX
+    (latmin,latmax,lonmin,lonmax)=[float(val) for val in bbox]
+    if numpy.ndim(gridres) == 0: gridres=(gridres,gridres)
+    (dlat,dlon)=[float(val) for val in gridres]
+    nlat=int(numpy.ceil(round((latmax-latmin)/dlat,6)))
+    nlon=int(numpy.ceil(round((lonmax-lonmin)/dlon,6)))
+    glat=latmin+dlat*numpy.arange(nlat)
+    glon=lonmin+dlon*numpy.arange(nlon)
+    return(glat,glon,(latmin,latmax,lonmin,lonmax),(dlat,dlon))
+
+def grid_cell_index(lat,lon,glat,glon,bbox,gridres):
+    (latmin,latmax,lonmin,lonmax)=bbox
+    (dlat,dlon)=gridres
+    valid=numpy.isfinite(lat) & numpy.isfinite(lon) & (lat >= latmin) & (lat <= latmax) & (lon >= lonmin) & (lon <= lonmax)
+    ilat=numpy.minimum(numpy.floor((lat[valid]-latmin)/dlat).astype(numpy.int64),len(glat)-1)
+    ilon=numpy.minimum(numpy.floor((lon[valid]-lonmin)/dlon).astype(numpy.int64),len(glon)-1)
+    return(ilat*len(glon)+ilon,valid)
+
+def grid_accumulate(obsframe,gridinfo,acc,varname=None,fieldname="Obsvalue",extremes=True):
+    (glat,glon,bbox,gridres)=gridinfo
+    ncell=len(glat)*len(glon)
+    lat=numpy.asarray(obsframe["Latitude"],dtype=numpy.float64)
+    lon=numpy.asarray(obsframe["Longitude"],dtype=numpy.float64)
+    if varname is None and (fieldname is None or fieldname not in obsframe):
+        data=numpy.zeros(len(lat),dtype=numpy.float64)
+    else:
+        try: data=numpy.asarray(obsframe[str(fieldname)],dtype=numpy.float64)
+        except: data=numpy.asarray(obsframe[str(varname)],dtype=numpy.float64)
+    (cell,valid)=grid_cell_index(lat,lon,glat,glon,bbox,gridres)
+    data=data[valid]
+    finite=numpy.isfinite(data)
+    if diaglev > 0 and (len(lat)-len(data)) > 0: errprint("Skipped rows outside grid : "+str(len(lat)-len(data)))
+    (cell,data)=(cell[finite],data[finite])
+    acc["count"]+=numpy.bincount(cell,minlength=ncell)
+    acc["sum"]+=numpy.bincount(cell,weights=data,minlength=ncell)
+    acc["sqrsum"]+=numpy.bincount(cell,weights=data*data,minlength=ncell)
+    if extremes and len(cell) > 0:
+        order=numpy.argsort(cell,kind="mergesort")
+        (cells,starts)=numpy.unique(cell[order],return_index=True)
+        acc["min"][cells]=numpy.fmin(acc["min"][cells],numpy.minimum.reduceat(data[order],starts))
+        acc["max"][cells]=numpy.fmax(acc["max"][cells],numpy.maximum.reduceat(data[order],starts))
+    return(acc)
+
+def gridded_stats(obsframe,varname=None,fieldname="Obsvalue",gridres=1.0,bbox=None,statlist=GRID_STATS):
+    gridinfo=grid_axes(gridres,bbox)
+    (glat,glon,bbox,gridres)=gridinfo
+    ncell=len(glat)*len(glon)
+    acc={"count":numpy.zeros(ncell,dtype=numpy.int64),"sum":numpy.zeros(ncell),"sqrsum":numpy.zeros(ncell),
+         "min":numpy.full(ncell,numpy.nan),"max":numpy.full(ncell,numpy.nan)}
+    if isinstance(obsframe, pandas.DataFrame): obsframe=[obsframe]
+    for chunk in obsframe:
+        acc=grid_accumulate(chunk,gridinfo,acc,varname,fieldname,extremes=("min" in statlist or "max" in statlist))
+    count=acc["count"].astype(numpy.float64)
+    count[count == 0]=numpy.nan
+    fields={
+        "count": acc["count"],
+        "sum": numpy.where(numpy.isnan(count),numpy.nan,acc["sum"]),
+        "mean": acc["sum"]/count,
+        "rms": numpy.sqrt(acc["sqrsum"]/count),
+        "min": acc["min"],
+        "max": acc["max"],
+    }
+    gridded={}
+    for stat in statlist:
+        gridded[stat]=pandas.DataFrame(fields[stat].reshape(len(glat),len(glon)),columns=glon,index=glat)
+    return(gridded)
+
+def gridded_field(obsframe,varname=None,fieldname="Obsvalue",gridopt="mean",gridres=1.0,bbox=None):
+    data=gridded_stats(obsframe,varname,fieldname,gridres,bbox,statlist=[gridopt])[gridopt]
+    if gridopt == "count": data=data.where(data > 0,-99999)
     return(data)
 
-def gridded_mean_1x1deg(obsframe,varname,fieldname="Obsvalue"):
-    nrows=len(obsframe)
-    latmin=int(-90)
-    latmax=int(90)
-    lonmin=int(-180)
-    lonmax=int(180)
-    glat=range(latmin,latmax,1)
-    glon=range(lonmin,lonmax,1)
-    gridded_count = numpy.zeros((len(glat),len(glon)), dtype=numpy.float64)
-    gridded_sum = numpy.zeros((len(glat),len(glon)), dtype=numpy.float64)
-    try: data=obsframe[str(fieldname)]
-    except: data=obsframe[str(varname)]
-    for row in obsframe.index:
-        try:
-            gridded_count[int(obsframe.loc[row,"Latitude"])-latmin-1,int(obsframe.loc[row,"Longitude"])-lonmin-1] += 1
-            gridded_sum[int(obsframe.loc[row,"Latitude"])-latmin-1,int(obsframe.loc[row,"Longitude"])-lonmin-1] += data[row]
-        except:
-           message="Skipped row :"+str(row) +" ("+str(obsframe.loc[row,"Latitude"])+","+str(obsframe.loc[row,"Longitude"])+")"
-           print(message)
-    gridded_sum[gridded_count==0]=numpy.nan
-    gridded_count[gridded_count==0]=numpy.nan
-    gridded_mean=numpy.divide(gridded_sum,gridded_count)
-    data=pandas.DataFrame(gridded_mean,columns=glon,index=glat)
-    return(data)
+def gridded_count_1x1deg(obsframe,varname=None,gridres=1.0,bbox=None):
+    return(gridded_field(obsframe,None,None,"count",gridres,bbox))
+    
+def gridded_sum_1x1deg(obsframe,varname,fieldname="Obsvalue",gridres=1.0,bbox=None):
+    return(gridded_field(obsframe,varname,fieldname,"sum",gridres,bbox))
 
-def gridded_rms_1x1deg(obsframe,varname,fieldname="Obsvalue"):
-    nrows=len(obsframe)
-    latmin=int(-90)
-    latmax=int(90)
-    lonmin=int(-180)
-    lonmax=int(180)
-    glat=range(latmin,latmax,1)
-    glon=range(lonmin,lonmax,1)
-    gridded_count = numpy.zeros((len(glat),len(glon)), dtype=numpy.float64)
-    gridded_sqrsum = numpy.zeros((len(glat),len(glon)), dtype=numpy.float64)
-    try: data=obsframe[str(fieldname)]
-    except: data=obsframe[str(varname)]
-    for row in obsframe.index:
-        try:
-            gridded_count[int(obsframe.loc[row,"Latitude"])-latmin-1,int(obsframe.loc[row,"Longitude"])-lonmin-1] += 1
-            gridded_sqrsum[int(obsframe.loc[row,"Latitude"])-latmin-1,int(obsframe.loc[row,"Longitude"])-lonmin-1] += (data[row]*data[row])
-        except:
-           message="Skipped row :"+str(row) +" ("+str(obsframe.loc[row,"Latitude"])+","+str(obsframe.loc[row,"Longitude"])+")"
-           print(message)
-    gridded_sqrsum[gridded_count==0]=numpy.nan
-    gridded_count[gridded_count==0]=numpy.nan
-    gridded_rms=numpy.sqrt(numpy.divide(gridded_sqrsum,gridded_count))
-    data=pandas.DataFrame(gridded_rms,columns=glon,index=glat)
-    return(data)
+def gridded_mean_1x1deg(obsframe,varname,fieldname="Obsvalue",gridres=1.0,bbox=None):
+    return(gridded_field(obsframe,varname,fieldname,"mean",gridres,bbox))
+
+def gridded_rms_1x1deg(obsframe,varname,fieldname="Obsvalue",gridres=1.0,bbox=None):
+    return(gridded_field(obsframe,varname,fieldname,"rms",gridres,bbox))
 
 #def gridded_mean_1x1deg(obsframe):
 #    nrows=len(obsframe)
@@ -1013,22 +1039,55 @@ def panda_strip(x):
         r.append(y)
     return(pandas.Series(r))
 
-def get_key_info(nmlfile,key="obsgroup"):
-    #print(nmlfile)
+#### Namelist registry: every namelist table is parsed once per process and served from memory.
+#### Entries are keyed on the real path and reloaded when the file modification time or size changes.
+
+NML_REGISTRY={}
+
+def nml_register(nmlfile,tag,loader):
+    key=(os.path.realpath(nmlfile),tag)
+    filestat=os.stat(nmlfile)
+    stamp=(filestat.st_mtime,filestat.st_size)
+    if key not in NML_REGISTRY or NML_REGISTRY[key][0] != stamp:
+        NML_REGISTRY[key]=(stamp,loader(nmlfile))
+    return(NML_REGISTRY[key][1])
+
+def nml_table_load(nmlfile):
+    with open(nmlfile, "r") as nml:
+        table=pandas.read_table(nml, skiprows=None, header=0)
+    return(table)
+
+def nml_keys_load(nmlfile):
     nmlinfo=pandas.read_csv(nmlfile, delimiter=':',engine='python')
     nmlinfo=nmlinfo.apply(panda_strip)
-    #print(nmlinfo)
-    if key in nmlinfo["keys"].values:
-	dicselect=nmlinfo.query("keys == @key")
-	#print(dicselect)
-    	keyinfo=dicselect.iloc[:, 1]
-    	#keyinfo=dicselect["information"]
-  	#keyinfo=getattr(dicselect,"information")
-	#print(keyinfo)
-	keyinfo=keyinfo.values[0]
+    keydic={}
+    for key,info in zip(nmlinfo["keys"].values,nmlinfo.iloc[:, 1].values):
+        if key not in keydic: keydic[key]=info
+    return(keydic)
+
+def nml_table(nmlfile):
+    return(nml_register(nmlfile,"table",nml_table_load))
+
+def nml_keys(nmlfile):
+    return(nml_register(nmlfile,"keys",nml_keys_load))
+
+def nml_map(nmlfile,keycol,valcol):
+    table=nml_table(nmlfile)
+    ### Reversed so that the first matching row wins, as with query(...).values[0]
+    return(nml_register(nmlfile,"map:"+keycol+":"+valcol,lambda nml: dict(zip(table[keycol].values[::-1],table[valcol].values[::-1]))))
+
+def nml_lookup(nmlfile,keycol,key,valcol):
+    return(nml_map(nmlfile,keycol,valcol)[key])
+
+def get_key_info(nmlfile,key="obsgroup"):
+    #print(nmlfile)
+    keydic=nml_keys(nmlfile)
+    if key in keydic:
+        keyinfo=keydic[key]
     else:
-    	print("Key '"+str(key)+"' not found")
-    	print(nmlinfo["keys"].values)
+        print("Key '"+str(key)+"' not found")
+        print(list(keydic.keys()))
+        keyinfo=None
     return(keyinfo)
 
 def get_key_list_info(nmlfile,key):
@@ -1052,7 +1111,7 @@ def get_key_dic(keyinfofile,keylist,infodic=None):
 
 def get_elist(obstypnam,obstypnml,keynml):
 	subtype=get_subtype_code(obstypnml,obstypnam)
-	elist=get_key_list_info(keynml,["elemlist_"+str(subtype)])
+	elist=get_key_list_info(keynml,"elemlist_"+str(subtype))
 	elist=list(elist)
 	return(elist)
 
@@ -1081,3 +1140,12 @@ def data_thinning(data,cntmax=500000,callsign=None,fillval=NAN_VAL):
 		data=reset_index(data_new,index=None)
 	return(data)
 
+#############202610####
+def bounded_imap(pool,func,tasklist,window):
+    ### Ordered like pool.imap, but at most window tasks are in flight: the next task is only submitted
+    ### once the oldest result is taken, so results never pile up faster than the caller consumes them
+    pending=collections.deque()
+    for task in tasklist:
+        if len(pending) >= max(1,int(window)): yield pending.popleft().get()
+        pending.append(pool.apply_async(func,(task,)))
+    while len(pending) > 0: yield pending.popleft().get()
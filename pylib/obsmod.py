@@ -35,6 +35,7 @@ import symobs
 import daview
 import essio
 import sqlobs
+import obsarrow
 #import sqlodb
 #import obsgui
 import matplotlib
@@ -76,15 +77,39 @@ def DataFrame():
 def reset_index(data):
 	return(obslib.reset_index(data))
 
-def ecbufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl=None,elemlist=None,subtype=None,keyfieldlst=[]):
-	return(ecbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl,elemlist=elemlist,subtype=subtype,keyfieldlst=keyfieldlst))
+def ecbufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl=None,elemlist=None,subtype=None,keyfieldlst=[],nproc=None):
+	return(ecbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile,eleindxmaptbl,elemlist=elemlist,subtype=subtype,keyfieldlst=keyfieldlst,nproc=nproc))
 
-def ncbufr_decode_files(inpath,Tnode,slctstr,nmlfile):
-	return(ncbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile))
+def ncbufr_decode_files(inpath,Tnode,slctstr,nmlfile,nproc=None):
+	return(ncbufr.bufr_decode_files(inpath,Tnode,slctstr,nmlfile,nproc=nproc))
 
 def ncbufr_test_read(slctstr,txtfile=None,field=None):
 	return(ncbufr.test_read(slctstr,txtfile,field))
 
+def bufr_to_obstore(inpath,Tnode,slctstr,nmlfile,outpath,source="ecbufr",cntmax=None,nproc=None,chunk=None,chunkobs=obstore.OBS_CHUNK,eleindxmaptbl=None,elemlist=None,subtype=None,keyfieldlst=[],btchcnt=None,dumpfile=None):
+	infiles=obslib.globlist(inpath+"/"+slctstr)
+	print("Received "+str(len(infiles))+" bufr files")
+	if source == "ncbufr":
+		import ncbufr
+		if chunk is None : chunk=ncbufr.NCBUFR_CHUNK
+		fieldlist=ncbufr.get_ncbufr_fieldlist(elemlist=elemlist,nmlfile=nmlfile)
+		tasklist=ncbufr.bufr_decode_tasks(infiles,ncbufr.ncbufr_field_plan(fieldlist),nproc,chunk)
+		chunks=ncbufr.bufr_decode_chunks(tasklist,nproc)
+		totalweight=sum([len(task[2]) for task in tasklist])
+	else:
+		if eleindxmaptbl is None : eleindxmaptbl=ecbufr.ECBUFRNML
+		if chunk is None : chunk=ecbufr.BUFR_CHUNK
+		fieldlist=ecbufr.get_ecbufr_fieldlist(nmlfile=nmlfile,eleindxmaptbl=eleindxmaptbl,elemlist=elemlist,subtyp=subtype)
+		tasklist=ecbufr.bufr_decode_tasks(infiles,ecbufr.bufr_field_plan(fieldlist,eleindxmaptbl),chunk)
+		chunks=ecbufr.bufr_decode_chunks(tasklist,nproc,keyfieldlst)
+		totalweight=sum([len(task[1]) for task in tasklist])
+	if subtype is not None: chunks=((data.assign(subtype=[int(subtype)]*len(data)),weight) for (data,weight) in chunks)
+	if dumpfile is not None:
+		### decoded rows before thinning, as the full-data text dump of the in-memory path
+		chunks=((data if "subtype" in data else obstore.assign_subtype(data,nmlfile),weight) for (data,weight) in chunks)
+		chunks=obslib.obs_chunks_ascii(chunks,dumpfile)
+	return(obstore.obstore_write_chunks(chunks,nmlfile,outpath,cntmax=cntmax,totalweight=totalweight,chunkobs=chunkobs,DT=Tnode,btchcnt=btchcnt))
+
 def get_nml(nltype):
     return{
     "obstore"	: obs_index_nml,
@@ -235,6 +260,12 @@ def obstore_read_subtype_index(obsfile,subtype):
 def query_obstore(obsfile,nmlfile=obs_nml,subtype=None,indx=None,selectlist=[],userquery=[]):
     return(sqlobs.query(obsfile,nmlfile,subtype ,indx,selectlist,userquery))
 
+def obstore_to_dataset(filelist,outpath,fmt="parquet",nmlfile=obs_nml,keyinfofile=None,elemlist=None,subtyplst=None,cycle=None):
+    return(obsarrow.obstore_to_dataset(filelist,outpath,fmt=fmt,nmlfile=nmlfile,keyinfofile=keyinfofile,elemlist=elemlist,subtyplst=subtyplst,cycle=cycle))
+
+def query_obsdataset(inpath,fmt="parquet",selectlist=None,latlim=None,lonlim=None,timelim=None,subtype=None,cycle=None):
+    return(obsarrow.query_dataset(inpath,fmt=fmt,selectlist=selectlist,latlim=latlim,lonlim=lonlim,timelim=timelim,subtype=subtype,cycle=cycle))
+
 def odb_list_varno(odbfile):
     return(sqlodb.odb_list_varno(odbfile))
 
@@ -262,6 +293,9 @@ def query_odb(odbfile,nmlfile=odb_nml,subtype=None,selectlist=[],varnolist=[],us
     data=sqlodb.query(odbfile,nmlfile,subtype,selectlist,varnolist,userquery)
     return(odb_renamefield(data))
 
+def odb_bulk_query(odbfile,varnolist=[],columns=["obsvalue"],keycols=["seqno","lat","lon"],levelcol="vertco_reference_1",subtype=None,userquery=[],nmlfile=odb_nml,varno_nmlfile=varno_nml):
+    return(sqlodb.odb_bulk_query(odbfile,nmlfile,varno_nmlfile,varnolist,columns,keycols,levelcol,subtype,userquery))
+
 def odb_list_subtype(odbfile):
     return(sqlodb.odb_list_subtype(odbfile))
     
@@ -348,7 +382,7 @@ def obstore_read_latlon(obs_file,fltrkey="subtype",nmlfile=obs_nml,option=diagle
         for idx,subtype in enumerate(subtypelist[0:],start=1):
             print(idx,subtype)
             #print(obstore.obstore_read_batch_elements(obsfile,idx,nmlfile))
-            data=sqlobs.query(obsfile,nmlfile,int(subtype),idx,selectlist=selectlist,maxindx=maxindx)
+            data=obstore.frame_data_batch_range(obsfile,nmlfile,idx,selectlist,maxindx=maxindx)
             data["subtype"]=pandas.Series([subtype for x in range(len(data.index)+1)]) 
             data_list=data_list+[data]
         latlon_data=obslib.obs_merge_batch(data_list)
@@ -411,15 +445,15 @@ def obs_frame(datagroup=None,subtypegroup=None,outpath=None,filename="output",op
            print(textfile)
            if data is not None: obslib.obs_frame_ascii(data,textfile,option)
     
-def symobs_main(Tnode,outpath,inpath,nmlpath,obstypelist=[],maxindx=MAXINDX,subtypelist=None):
+def symobs_main(Tnode,outpath,inpath,nmlpath,obstypelist=[],maxindx=MAXINDX,subtypelist=None,nproc=None,method=None):
     if len(obstypelist) == 0:
         obstypelist=obsdic.obstypelist
     for obstype in obstypelist:
-        datagroup=symobs.symulate_obstore(outpath,inpath,nmlpath,Tnode,obstype,maxindx=maxindx,subtypelist=subtypelist)
+        datagroup=symobs.symulate_obstore(outpath,inpath,nmlpath,Tnode,obstype,maxindx=maxindx,subtypelist=subtypelist,nproc=nproc,method=method)
         ######################
         
-def obstore_write(data,keynmlfile,outpath,btchcnt=None,cntmax=None,DT=None,diagflag=0,missing_value=-1073741824.00000):
-	outfile=obstore.obstore_write(data,keynmlfile,outpath,btchcnt=btchcnt,cntmax=cntmax,DT=DT,diagflag=diagflag,missing_value=missing_value)
+def obstore_write(data,keynmlfile,outpath,btchcnt=None,cntmax=None,DT=None,diagflag=0,missing_value=-1073741824.00000,bufferflag=False):
+	outfile=obstore.obstore_write(data,keynmlfile,outpath,btchcnt=btchcnt,cntmax=cntmax,DT=DT,diagflag=diagflag,missing_value=missing_value,bufferflag=bufferflag)
 	return(outfile)
 
     
@@ -25,8 +25,14 @@ import pandas
 import struct
 import datetime
 import itertools
+import collections
+import io
+import tempfile
+import multiprocessing
+import multiprocessing.pool
 diaglev=int(os.environ.get('GEN_MODE',0))
 MAXINDX=int(os.environ.get('MAXINDX',fixheader.MAXINDX))
+OBS_CHUNK=int(os.environ.get('OBS_CHUNK',200000))
 HDRSIZE=int(os.environ.get('HDRSIZE',fixheader.HDRSIZE))
 LUTSIZE=int(os.environ.get('LUTSIZE',fixheader.LUTSIZE))
 HBpos=int(os.environ.get('HBpos',fixheader.HBpos))
@@ -88,6 +94,8 @@ def binfill(sec_nam,size,fillval=None,fillvalint=None):
     }.get(sec_nam, [fillval]*size)
 
 def binpos(obsfile,sec_nam):
+    obshdr=obstore_header(obsfile)
+    if obshdr is not None and sec_nam not in ["hdrbet","hdrgam"]: return(obshdr.binpos(sec_nam))
     return {
 	'hdr': (1,340,1),
         'fix1': (1,305,1),
@@ -622,6 +630,8 @@ def obstore_check_data_length(obsfile,seekpos):
     return(obstore_read_header(obsfile,161,1))
 
 def obstore_read_subtype(obsfile):
+    obshdr=obstore_header(obsfile)
+    if obshdr is not None: return(obshdr.subtype_list())
     (pos_lut,tcol_lut,nrow_lut)=obstore_get_pos(obsfile,150,151,152)
     subtypelist=obstore_read_subhead(obsfile,pos_lut,nrow_lut,tcol_lut,68)
     subtypelist=obslib.binsort(subtypelist,missing=-32768).flatten()
@@ -697,6 +707,8 @@ def obstore_write_subtype_lut64(obsfile,irow,val=NAN_VAL_INT):
     obstore_write_subhead_segment(obsfile,"lut",irow,64,1,val)
     
 def obstore_read_batchinfo(obsfile,indx):
+    obshdr=obstore_header(obsfile)
+    if obshdr is not None: return(obshdr.batchinfo(indx))
     pos_data = obstore_read_header(obsfile,160,1)
     data_header=obstore_read_data_header(obsfile)
     #print(indx, pos_data, data_header[0,14], pos_data+data_header[0,14])
@@ -782,9 +794,13 @@ def obstore_write_batch_header(obsfile,nmlfile,batchinfo,irow,maxindx=MAXINDX):
     return(obstore_read_batch_elements(obsfile,irow,nmlfile,maxindx))
     
 def obstore_read_index_subtype(obsfile,indx):
+    obshdr=obstore_header(obsfile)
+    if obshdr is not None: return(obshdr.index_subtype(indx))
     return(obstore_read_subhead_segment(obsfile,"lut",int(indx),68,1))
 
 def obstore_read_subtype_index(obsfile,subtype):
+    obshdr=obstore_header(obsfile)
+    if obshdr is not None: return(obshdr.subtype_index(subtype))
     indx=numpy.where(obstore_read_subtype(obsfile) == int(subtype))[0][0] + 1
     return(indx)
 
@@ -801,6 +817,7 @@ def obstore_write_subtype_index(obsfile,nmlfile,irow,subtype,obs_count,elist,max
     return(obstore_read_batch_elements(obsfile,irow,nmlfile,maxindx))
 
 def obstore_read_station_record_position(obsfile,subtype,StnNo,nmlfile):
+    indx=obstore_read_subtype_index(obsfile,subtype)
     WMOStnNo = obstore_read_data_element(obsfile,nmlfile,indx,"WMOStnNo")
     return(WMOStnNo.index[WMOStnNo['WMOStnNo'] == StnNo].tolist())
     
@@ -841,8 +858,7 @@ def frame_batch_elist(hdrinfodic,nmlfile=NML_OBS_INDX,maxindx=MAXINDX):
         RDC=int(rdc[obs_index-1])
         CDC=int(cdc[obs_index-1])
 	if obs_index > maxindx : print("Index not handled :"+obs_index)
-        with open(nmlfile, "r") as nml:
-            Element= pandas.read_table(nml, skiprows=None, header=0).query("eleindex == @obs_index").elename.reset_index(drop=True)[0]
+        Element= obslib.nml_lookup(nmlfile,"eleindex",obs_index,"elename")
         if i == cdc_sortlist[0]: 
             elist=pandas.DataFrame([[CDC,RDC,LDC,obs_index,Element]],index=[i],columns=["CDC","RDC","LDC","obs_index","Element"])
         else:
@@ -851,6 +867,8 @@ def frame_batch_elist(hdrinfodic,nmlfile=NML_OBS_INDX,maxindx=MAXINDX):
     return(elist)
 
 def obstore_read_batch_elements(obsfile,obsidx,nmlfile=NML_OBS_INDX,maxindx=MAXINDX):
+    obshdr=obstore_header(obsfile)
+    if obshdr is not None: return(obshdr.batch_elements(obsidx,nmlfile))
     (pos_ldc,tcol_ldc,nrow_ldc)=obstore_get_pos(obsfile,110,111,112)
     (pos_rdc,tcol_rdc,nrow_rdc)=obstore_get_pos(obsfile,115,116,117)
     (pos_cdc,tcol_cdc,nrow_cdc)=obstore_get_pos(obsfile,120,121,122)
@@ -866,11 +884,7 @@ def obstore_read_batch_elements(obsfile,obsidx,nmlfile=NML_OBS_INDX,maxindx=MAXI
     missing=[numpy.nan,-4481081629233643520,4607182418800017408,-1073741820.0,-1073741824.0,-1.07374182e+09,-3.2768e+04,-32768.0,-32768,0.]
     cdc_sortlist=obslib.binsort(cdc_sortlist,binmin=1.0,missing=missing)
     print(obsidx)
-    subtyps=obstore_read_subtype(obsfile)
-    if len(subtyps) > 1: 
-	subtype=subtyps[obsidx-1]
-    else:
-	subtype=subtyps[0]
+    subtype=obstore_read_index_subtype(obsfile,obsidx)
     print(subtype)
     #print(cdc_sortlist)
     for i in cdc_sortlist:
@@ -883,8 +897,7 @@ def obstore_read_batch_elements(obsfile,obsidx,nmlfile=NML_OBS_INDX,maxindx=MAXI
         RDC=int(rdc[obs_index-1])
         CDC=int(cdc[obs_index-1])
 	if obs_index > maxindx : print("Index not handled :"+obs_index)
-        with open(nmlfile, "r") as nml:
-            Element= pandas.read_table(nml, skiprows=None, header=0).query("eleindex == @obs_index").elename.reset_index(drop=True)[0]
+        Element= obslib.nml_lookup(nmlfile,"eleindex",obs_index,"elename")
 	#print(i,Element,CDC,RDC,LDC,obs_index)
         if i == cdc_sortlist[0]: 
             elist=pandas.DataFrame([[CDC,RDC,LDC,obs_index,Element]],index=[i],columns=["CDC","RDC","LDC","obs_index","Element"])
@@ -895,8 +908,7 @@ def obstore_read_batch_elements(obsfile,obsidx,nmlfile=NML_OBS_INDX,maxindx=MAXI
     
 def element_frame(idx,CDC,RDC,LDC,obs_index,nmlfile):
     #print(idx,CDC,RDC,LDC,obs_index)
-    with open(nmlfile, "r") as nml:
-        Element= pandas.read_table(nml, skiprows=None, header=0).query("eleindex == @obs_index").elename.reset_index(drop=True)[0]
+    Element= obslib.nml_lookup(nmlfile,"eleindex",obs_index,"elename")
     eframe=pandas.DataFrame([[CDC,RDC,LDC,obs_index,Element]],index=[idx],columns=["CDC","RDC","LDC","obs_index","Element"])
     return(eframe)
 
@@ -925,7 +937,7 @@ def obstore_create_element_table(nmlfile,obsidxlist):
     return(elist)
 
 def obstore_read_subtype_elements(obsfile,subtype,nmlfile,maxindx=MAXINDX):
-    obsidx = numpy.where(obstore_read_subtype(obsfile) == int(subtype))[0][0]
+    obsidx = obstore_read_subtype_index(obsfile,subtype)
     return(obstore_read_batch_elements(obsfile,obsidx,nmlfile,maxindx))
     
 def obstore_write_elist(obsfile,nmlfile,irow,subtype,elist,maxindx=MAXINDX):
@@ -1002,18 +1014,9 @@ def obstore_read_element(obsfile,elist,element,pos_data,record_pos,tcols,nmlfile
      
 
 def obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (rdc,cdc,ldc) = elist.query("Element == @element")[["RDC","CDC","LDC"]].reset_index(drop=True).values[0]
-    ele_pos_offset=int(cdc)-1
-    ncols=int(ldc)
-    data_element=pandas.DataFrame(index=record_pos,columns=[element])
-    for a,i in enumerate(record_pos):
-                lev_idx=lev_pos[a]-1
-                seekpos=pos_data+((i-1)*obs_nele)+int(cdc-1)+((lev_pos[a])*rdc)
-                obsfile.seek((seekpos-1)*8,0)
-                data = obsfile.read(1*8)
-                data_element.xs(i)[a] = numpy.asarray(struct.unpack(">"+str(1)+"d", data))[0]
-    return(data_element) 
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    lev_pos=numpy.asarray(lev_pos,dtype=numpy.int64).reshape(-1,1)
+    return(obstore_read_element_range(obsfile,elist,element,pos_data,record_pos,obs_nele,lev_pos=lev_pos))
 
 def obstore_write_element_level(obsfile,nmlfile,subtype,elist,element,pos_data,record_pos,lev_pos,data,maxindx=MAXINDX):
     tcols=sum(elist.CDC.values)
@@ -1094,31 +1097,31 @@ def obstore_write_data_record(obsfile,subtype,irow,icol,ilen,data):
         obsfile.write(fmtstr.pack(*data))
 
 def obstore_read_data_record_element(obsfile,subtype,record_pos,element,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
-    return(obstore_read_element(obsfile,elist,element,pos_data,record_pos,obs_nele,nmlfile))
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
+    return(obstore_read_element_range(obsfile,elist,element,pos_data,record_pos,tcols))
 
 def obstore_read_data_station(obsfile,subtype,StnNo,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
-    data_len=obs_nele #  since only one record is fetching at a time.
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
+    data_len=tcols #  since only one record is fetching at a time.
     record_pos = obstore_read_station_record_position(obsfile,subtype,StnNo,nmlfile)
     if data_len is 1:
         data_element=pandas.DataFrame(index=record_pos,columns=[element])
     else:
         data_element=pandas.DataFrame(index=record_pos,columns=range(1,data_len+1,1))
     for i in record_pos:
-        seekpos=pos_data+((i-1)*obs_nele)
+        seekpos=pos_data+((i-1)*tcols)
         obsfile.seek((seekpos-1)*8,0)
         data = obsfile.read(data_len*8)
         data_element.xs(i)[:] = numpy.asarray(struct.unpack(">"+str(data_len)+"d", data))
     return(data_element)
 
 def obstore_read_data_station_element(obsfile,subtype,StnNo,element,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
     record_pos = obstore_read_station_record_position(obsfile,subtype,StnNo,nmlfile)
-    return(obstore_read_element(obsfile,elist,element,pos_data,record_pos,obs_nele,nmlfile))
+    return(obstore_read_element_range(obsfile,elist,element,pos_data,record_pos,tcols))
     
 def obstore_read_level_position(obsfile,subtype,record,PLEV,nmlfile):
     try:
@@ -1127,68 +1130,57 @@ def obstore_read_level_position(obsfile,subtype,record,PLEV,nmlfile):
     except:errprint("level %s not listed in record %s"%(PLEV,record))
     
 def obstore_read_data_record_element_plevel(obsfile,subtype,record_pos,element,plev,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
     if element in elist.Element.values:
         lev_pos = numpy.zeros(len(record_pos), dtype=numpy.int)
         for i,recpos in enumerate(record_pos):
             lev_pos[i] = obstore_read_level_position(obsfile,subtype,recpos,plev,nmlfile)
-        return(obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile))
+        return(obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,tcols,lev_pos,nmlfile))
 
 def obstore_read_data_station_element_plevel(obsfile,subtype,StnNo,element,plev,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
     if element in elist.Element.values:
         record_pos=obstore_read_station_record_position(obsfile,subtype,StnNo,nmlfile)
         lev_pos = numpy.zeros(len(record_pos), dtype=numpy.int)
         for i,recpos in enumerate(record_pos):
             lev_pos[i] = obstore_read_level_position(obsfile,subtype,recpos,plev,nmlfile)
-        return(obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile))
+        return(obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,tcols,lev_pos,nmlfile))
 
 def obstore_read_data_element_plevel(obsfile,subtype,element,plev,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
     if element in elist.Element.values:
         record_pos=range(1,obs_count+1,1)
         lev_pos = numpy.zeros(len(record_pos), dtype=numpy.int)
         for i,recpos in enumerate(record_pos):
             try:lev_pos[i] = obstore_read_level_position(obsfile,subtype,recpos,plev,nmlfile)
             except:errprint(obstore_read_data_record_element(obsfile,subtype,[recpos],"PlevelsA",nmlfile).values)
-        return(obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile))
+        return(obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,tcols,lev_pos,nmlfile))
 
 def obstore_read_element_lvl(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (rdc,cdc,ldc) = elist.query("Element == @element")[["RDC","CDC","LDC"]].reset_index(drop=True).values[0]
-    ele_pos_offset=int(cdc)-1
-    ncols=int(ldc)
-    data_element=pandas.DataFrame(index=record_pos,columns=[element])
-    for a,i in enumerate(record_pos):
-                lev_idx=lev_pos-1
-                seekpos=pos_data+((i-1)*obs_nele)+int(cdc-1)+((lev_pos)*rdc)
-                obsfile.seek((seekpos-1)*8,0)
-                data = obsfile.read(1*8)
-                data_element.xs(i)[0] = numpy.asarray(struct.unpack(">"+str(1)+"d", data))[0]
-    return(data_element) 
+    return(obstore_read_element_level(obsfile,subtype,element,pos_data,record_pos,obs_nele,[lev_pos]*len(record_pos),nmlfile))
         
 def obstore_read_data_record_element_lvl(obsfile,subtype,record_pos,element,lev_pos,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
     if element in elist.Element.values:
-        return(obstore_read_element_lvl(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile))
+        return(obstore_read_element_lvl(obsfile,subtype,element,pos_data,record_pos,tcols,lev_pos,nmlfile))
 
 def obstore_read_data_station_element_lvl(obsfile,subtype,StnNo,element,lev_pos,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
     if element in elist.Element.values:
         record_pos=obstore_read_station_record_position(obsfile,subtype,StnNo,nmlfile)
-        return(obstore_read_element_lvl(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile))
+        return(obstore_read_element_lvl(obsfile,subtype,element,pos_data,record_pos,tcols,lev_pos,nmlfile))
 
 def obstore_read_data_element_lvl(obsfile,subtype,element,lev_pos,nmlfile):
-    elist = obstore_read_elements(obsfile,int(subtype),nmlfile)
-    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    elist = obstore_read_subtype_elements(obsfile,int(subtype),nmlfile)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,obstore_read_subtype_index(obsfile,subtype))
     if element in elist.Element.values:
         record_pos=range(1,obs_count+1,1)
-        return(obstore_read_element_lvl(obsfile,subtype,element,pos_data,record_pos,obs_nele,lev_pos,nmlfile))
+        return(obstore_read_element_lvl(obsfile,subtype,element,pos_data,record_pos,tcols,lev_pos,nmlfile))
 
 def obstore_copy_data_element(outfile,nmlfile,indx,element,infile,maxindx=MAXINDX):
     if element in obstore_read_batch_elements(infile,indx,nmlfile,maxindx).Element.values:
@@ -1235,9 +1227,10 @@ def getldc(elenam,elist=pandas.DataFrame(),obsfile=None,indx=None,nmlfile=None,m
             print(element,ldc[i])
             return(ldc[i])
 
-def frame_data_batch(obsfile,nmlfile,indx,elenams,maxindx=MAXINDX):
+def frame_data_batch(obsfile,nmlfile,indx,elenams,maxindx=MAXINDX,mmapflag=False):
     print("inside frame_data_batch function of obstore")
     print(elenams)
+    if mmapflag: return(mmap_frame_data_batch(obstore_mmap(obsfile),nmlfile,indx,elenams))
     dataframelist=[None]*len(elenams)
     for i,element in enumerate(elenams):
         if diaglev > 0 : errprint(element)
@@ -1362,7 +1355,7 @@ def obs_location(inpath,nmlpath,obstype,filevar=None,maxindx=MAXINDX):
     dataset={"obsgroup":obsgroup, "subtype":subtypegroup, "data":datagroup }
     return(dataset)
 
-def obstore_read_file(inpath,obstype,subtyplst=None,nmlpath=OBSNML,filevar=None,maxindx=MAXINDX):
+def obstore_read_file(inpath,obstype,subtyplst=None,nmlpath=OBSNML,filevar=None,maxindx=MAXINDX,mmapflag=False,nproc=None):
     keyinfofile=OBSNML+"/keys_"+obstype+".nml"
     infokeylist=["OBSTORE", "obsgroup","maxindx","hdrsize","lutsize"]
     obstypedic=obslib.get_key_dic(keyinfofile,infokeylist,infodic={})
@@ -1372,6 +1365,13 @@ def obstore_read_file(inpath,obstype,subtyplst=None,nmlpath=OBSNML,filevar=None,
     obs_index_nml="obs_index_nml"
     nmlfile="%s/%s" % (nmlpath,obs_index_nml)
     obsgroup=obstypedic["obsgroup"]
+    if mmapflag and nproc is None: return(obstore_mmap_read_file(input_file,nmlfile,subtyplst))
+    if nproc is not None:
+        with open(input_file, "rb") as infile:
+            obsgroup=obstore_read_header(infile,287,1)
+            subtypegroup=obstore_read_subtype(infile)
+        filedata=obstore_parallel_read(input_file,nmlfile,subtyplst,nproc=nproc,maxindx=maxindx,mmapflag=mmapflag)
+        return({"obsgroup":obsgroup, "subtype":subtypegroup, "data":filedata })
     with open(input_file, "rb") as infile:
             obsgroup=obstore_read_header(infile,287,1)
             subtypegroup=obstore_read_subtype(infile)
@@ -1747,7 +1747,7 @@ def totobs(obstore_info):
 	obstore_info["datlen"]=datlen
 	return(obstore_info)
     
-def obstore_create_file(obstore_info,diagflg=0,callsignflag=False,filedata=None,):
+def obstore_create_file(obstore_info,diagflg=0,callsignflag=False,filedata=None,bufferflag=False):
     obstore_info=obstore_info_fix(obstore_info)
     obstype = obstore_info["obstype"]
     obsgroup = int(obstore_info["obsgroup"])
@@ -1798,6 +1798,11 @@ def obstore_create_file(obstore_info,diagflg=0,callsignflag=False,filedata=None,
     obslib.mkdir(output_file.rsplit("/",1)[0])
     obstore_info=totobs(obstore_info)
     datlen=obstore_info["datlen"]
+    if bufferflag:
+        with open(output_file, "wb+") as obsfile:
+            obstore_buffer_write(DT,obsfile,nmlfile,obsgroup,subtypegroup,elistgroup,datagroup,batchcount=batchcount,hdrsize=hdrsize,maxindx=maxindx,lutsize=lutsize,HlfTW=HlfTW,Tref=Tref,callsignflag=callsignflag)
+        print("Writting to "+output_file+ " is completed")
+        return(obstore_info)
     with open(output_file, "wb+") as obsfile:
 	hdrsize=obsheader.write_obsheader(obsfile,nmlfile,obsgroup,maxindx=maxindx,callsignflag=callsignflag)
 	datapos=obstore_set_batchpos(obsfile,batchcount,batch_data_offset=0,hdrsize=hdrsize,maxindx=maxindx,lutsize=lutsize) 
@@ -1809,7 +1814,7 @@ def obstore_create_file(obstore_info,diagflg=0,callsignflag=False,filedata=None,
     print("Writting to "+output_file+ " is completed")
     return(obstore_info)
 
-def obstore_write(data,keyinfofile,outpath,btchcnt=None,obstore_info=None,cntmax=None,DT=None,Tref=None,HlfTW=None,diagflag=0,callsignflag=False,missing_value=-1073741824.00000):
+def obstore_write(data,keyinfofile,outpath,btchcnt=None,obstore_info=None,cntmax=None,DT=None,Tref=None,HlfTW=None,diagflag=0,callsignflag=False,missing_value=-1073741824.00000,bufferflag=False):
 	data = data[data[["Latitude", "Longitude"]].notnull().all(1)]
 	data = data.replace(numpy.nan,missing_value)
 	print(data)
@@ -1868,7 +1873,7 @@ def obstore_write(data,keyinfofile,outpath,btchcnt=None,obstore_info=None,cntmax
 		obstore_info["timewindowhalf"] = HlfTW
 	else :
 		obstore_info["timewindowhalf"] = HLFTW
-	obstore_info=obstore_create_file(obstore_info,diagflag,callsignflag=callsignflag)
+	obstore_info=obstore_create_file(obstore_info,diagflag,callsignflag=callsignflag,bufferflag=bufferflag)
 	return(obstore_info)
 
 #############202307#####################################################################################
@@ -1904,3 +1909,601 @@ def read_binfile_strip(inputfile,pos=1,size=1,fmtkey="q"):
 	datastrip=obstore_read_header(obsfile,pos,size,fmtkey=fmtkey)
     return(datastrip)
 
+#############202610#####################################################################################
+#### Memory-mapped reader: batches and elements are numpy views over the big-endian data section.
+#### Positions follow binpos (alpha header words 100-162) and the LUT columns used by obstore_read_batchinfo.
+
+MMAP_SECPOS={
+    'beeta': (100,101,None),
+    'gamma': (105,106,None),
+    'ldc' : (110,111,112),
+    'rdc' : (115,116,117),
+    'cdc' : (120,121,122),
+    'lut' : (150,151,152),
+    'data': (160,161,None),
+}
+
+def obstore_mmap(obsfile):
+    return(numpy.memmap(obsfile,dtype=">f8",mode="r"))
+
+def mmap_read_words(obswords,pos,size=1,fmtkey="d"):
+    words=obswords[(pos-1):(pos-1+size)]
+    if fmtkey == "q": words=words.view(">i8")
+    if size == 1:
+        return(words[0])
+    else:
+        return(words)
+
+def mmap_get_pos(obswords,p1,p2,p3=None):
+    pos = int(mmap_read_words(obswords,p1,1,fmtkey="q"))
+    tcol = int(mmap_read_words(obswords,p2,1,fmtkey="q"))
+    if p3 is not None :
+        nrow = int(mmap_read_words(obswords,p3,1,fmtkey="q"))
+    else :
+        nrow = 1
+    return(pos,tcol,nrow)
+
+def mmap_binpos(obswords,sec_nam):
+    if sec_nam in ["alpha"]: return(1,256,1)
+    (p1,p2,p3)=MMAP_SECPOS[sec_nam]
+    return(mmap_get_pos(obswords,p1,p2,p3))
+
+def mmap_read_section(obswords,sec_nam):
+    (pos,tcol,nrow)=mmap_binpos(obswords,sec_nam)
+    fmtkey=binfmt(sec_nam,1)[-1]
+    section=mmap_read_words(obswords,pos,tcol*nrow,fmtkey=fmtkey)
+    if sec_nam in ["ldc","rdc","cdc","lut"]: section=section.reshape(nrow,tcol)
+    return(section)
+
+def mmap_read_batchinfo(obswords,indx,lut=None):
+    if lut is None: lut=mmap_read_section(obswords,"lut")
+    pos_data=int(mmap_read_words(obswords,160,1,fmtkey="q"))+int(numpy.sum(lut[:(indx-1),14]))
+    obs_count=int(lut[indx-1,18])
+    obs_nele=int(lut[indx-1,17])
+    data_len=int(lut[indx-1,14])
+    data_end=pos_data+data_len-1
+    return(indx,pos_data,obs_count,obs_nele,data_len,data_end)
+
+def mmap_read_batch(obswords,indx,lut=None):
+    (indx,pos_data,obs_count,obs_nele,data_len,data_end)=mmap_read_batchinfo(obswords,indx,lut=lut)
+    batch=mmap_read_words(obswords,pos_data,obs_count*obs_nele,fmtkey="d")
+    return(numpy.reshape(batch,(obs_count,obs_nele)))
+
+def mmap_batch_elements(obswords,indx,nmlfile=NML_OBS_INDX):
+    hdrinfodic={}
+    for sec_nam in ["ldc","rdc","cdc"]:
+        hdrinfodic[sec_nam]=mmap_read_section(obswords,sec_nam)[int(indx)-1]
+    maxindx=len(hdrinfodic["cdc"])
+    return(frame_batch_elist(hdrinfodic,nmlfile=nmlfile,maxindx=maxindx))
+
+def mmap_element_view(batch,elist,element):
+    (rdc,cdc,ldc) = elist.query("Element == @element")[["RDC","CDC","LDC"]].reset_index(drop=True).values[0]
+    ###rdc is -32768 for callsign ASCII element CharData, whose words are contiguous###
+    if rdc > 0 : step=int(rdc)
+    else : step=1
+    first=int(cdc)-1
+    last=first+(int(ldc)-1)*step+1
+    return(batch[:,first:last:step])
+
+def mmap_frame_element(batch,elist,element,record_pos=None):
+    if element not in elist.Element.values:
+        errprint("Element %s is not available "%(element))
+        return(None)
+    view=mmap_element_view(batch,elist,element)
+    if record_pos is None:
+        record_pos=range(1,len(view)+1,1)
+    else:
+        view=view[numpy.asarray(record_pos)-1]
+    ncols=view.shape[1]
+    ###pandas cannot operate on non-native byte order; astype is a no-op on big-endian hosts###
+    view=view.astype(numpy.float64,copy=False)
+    if element in ["CharData"]:
+        data_element=pandas.DataFrame([obslib.getstring(rec) for rec in view],index=record_pos,columns=[element])
+    elif ncols == 1:
+        data_element=pandas.DataFrame(view,index=record_pos,columns=[element],copy=False)
+    else:
+        data_element=pandas.DataFrame(view,index=record_pos,columns=[element+str(i) for i in range(1,ncols+1,1)],copy=False)
+    return(data_element)
+
+def mmap_frame_data_batch(obswords,nmlfile,indx,elenams,record_pos=None):
+    elist=mmap_batch_elements(obswords,indx,nmlfile)
+    batch=mmap_read_batch(obswords,indx)
+    dataframelist=[]
+    for element in elenams:
+        if diaglev > 0 : errprint(element)
+        data_element=mmap_frame_element(batch,elist,element,record_pos=record_pos)
+        if data_element is not None: dataframelist=dataframelist+[data_element]
+    data=obslib.obsdfcat(dataframelist)
+    return(data)
+
+def obstore_mmap_read_data_element(obsfile,nmlfile,indx,element,record_pos=None):
+    obswords=obstore_mmap(obsfile)
+    elist=mmap_batch_elements(obswords,indx,nmlfile)
+    batch=mmap_read_batch(obswords,indx)
+    return(mmap_frame_element(batch,elist,element,record_pos=record_pos))
+
+def obstore_mmap_read_file(input_file,nmlfile=NML_OBS_INDX,subtyplst=None):
+    with open(input_file, "rb") as infile:
+        obswords=obstore_mmap(infile)
+        subtypegroup=obstore_read_subtype(infile)
+    obsgroup=int(mmap_read_words(obswords,287,1,fmtkey="q"))
+    lut=mmap_read_section(obswords,"lut")
+    datalist=[]
+    ### LUT rows are the batches; unused rows carry the missing subtype and are skipped
+    for indx,subtype in enumerate(numpy.array(lut[:,67]),start=1):
+        if int(subtype) == NAN_VAL_INT: continue
+        if subtyplst is not None and subtype not in subtyplst: continue
+        elist=mmap_batch_elements(obswords,indx,nmlfile)
+        btchdata=mmap_frame_data_batch(obswords,nmlfile,indx,elist.Element.values)
+        btchdata.insert(0,"subtype",int(subtype))
+        btchdata.insert(0,"obsgroup",obsgroup)
+        datalist=datalist+[btchdata]
+    filedata=pandas.DataFrame()
+    if len(datalist) > 0: filedata=pandas.concat(datalist, ignore_index=True)
+    dataset={"obsgroup":obsgroup, "subtype":subtypegroup, "data":filedata }
+    return(dataset)
+
+#############202610#####################################################################################
+#### Buffered writer: fixed header, LDC/RDC/CDC and LUT are assembled in memory with the existing
+#### header routines, each batch is packed into one (obscount, tcols) big-endian array.
+
+def element_column_map(elist,columns):
+    elenams=list(elist.Element.values)
+    colmap={}
+    for col in columns:
+        if col in elenams:
+            colmap.setdefault(col,[]).append((col,None))
+        elif "_" in str(col) and str(col).rsplit("_",1)[1].isdigit():
+            (element,lev)=str(col).rsplit("_",1)
+            if element in elenams: colmap.setdefault(element,[]).append((col,int(lev)))
+    return(colmap)
+
+def obstore_batch_buffer(elist,data,fillval=NAN_VAL):
+    tcols=int(sum(elist.LDC.values))
+    obscount=len(data)
+    batch=numpy.full((obscount,tcols),fillval,dtype=numpy.float64)
+    colmap=element_column_map(elist,data.columns)
+    for (element,rdc,cdc,ldc) in elist[["Element","RDC","CDC","LDC"]].values:
+        if element not in colmap: continue
+        first=int(cdc)-1
+        ldc=int(ldc)
+        if rdc < 0 : rdc = 0
+        for (col,lev) in colmap[element]:
+            values=data[col].values
+            if values.dtype.kind in ["O","S","U"] and isinstance(values[0],str):
+                ###ASCII element like CharData: one character per word###
+                chars=[obslib.getascii(str(val).ljust(ldc)[0:ldc]) for val in values]
+                batch[:,first:(first+ldc)]=numpy.array(chars,dtype=numpy.float64)
+            elif lev is None and ldc > 1:
+                ###single column replicated over all levels, as dataselect does###
+                for j in range(0,ldc,1):
+                    batch[:,first+j*int(rdc)]=values.astype(numpy.float64)
+            else:
+                if lev is None: lev=1
+                batch[:,first+(lev-1)*int(rdc)]=values.astype(numpy.float64)
+    return(batch.astype(">f8",copy=False))
+
+def obstore_buffer_write(DT,obsfile,nmlfile,obsgroup,subtypegroup,elistgroup,datagroup,batchcount=1,hdrsize=HDRSIZE,maxindx=MAXINDX,lutsize=LUTSIZE,HlfTW=HLFTW,Tref=TREF,callsignflag=False,fillval=NAN_VAL):
+    writer=ObstoreStreamWriter(DT,obsfile,nmlfile,obsgroup,batchcount=batchcount,hdrsize=hdrsize,maxindx=maxindx,lutsize=lutsize,HlfTW=HlfTW,Tref=Tref,callsignflag=callsignflag,fillval=fillval)
+    for idx in range(0,batchcount,1):
+        writer.write_batch(subtypegroup[idx],elistgroup[idx],datagroup[idx])
+    return(writer.close())
+
+#############202610#####################################################################################
+#### Streaming writer: the batch layout is fixed by batchcount when the file is opened, every batch
+#### is packed and written to its final offset as soon as it arrives, and the header segments
+#### (kept in memory, they never hold data words) are flushed with the trailer on close. Empty
+#### batches take no slot; close trims the declared batch count to the batches actually written.
+
+class ObstoreStreamWriter(object):
+    def __init__(self,DT,obsfile,nmlfile,obsgroup,batchcount=1,hdrsize=HDRSIZE,maxindx=MAXINDX,lutsize=LUTSIZE,HlfTW=HLFTW,Tref=TREF,callsignflag=False,fillval=NAN_VAL):
+        if hasattr(obsfile,"write"):
+            self.obsfile=obsfile
+            self.ownfile=False
+        else:
+            self.obsfile=open(obsfile,"wb+")
+            self.ownfile=True
+        self.DT=DT
+        self.nmlfile=nmlfile
+        self.obsgroup=obsgroup
+        self.batchcount=int(batchcount)
+        self.maxindx=maxindx
+        self.lutsize=lutsize
+        self.HlfTW=HlfTW
+        self.Tref=Tref
+        self.fillval=fillval
+        self.hdrfile=io.BytesIO()
+        self.hdrsize=obsheader.write_obsheader(self.hdrfile,nmlfile,obsgroup,maxindx=maxindx,callsignflag=callsignflag)
+        self.datapos=obstore_set_batchpos(self.hdrfile,self.batchcount,batch_data_offset=0,hdrsize=self.hdrsize,maxindx=maxindx,lutsize=lutsize)
+        self.datalen=0
+        self.batchid=0
+        self.closed=False
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self,exc_type,exc_value,tb):
+        if exc_type is None:
+            self.close()
+        elif self.ownfile:
+            self.obsfile.close()
+        return(False)
+
+    def write_batch(self,subtype,elist,data):
+        if self.closed: raise ValueError("Obstore writer is already closed")
+        if data is None: return(self.datalen)
+        if self.batchid >= self.batchcount: raise ValueError("Obstore writer opened for %s batches" % self.batchcount)
+        self.batchid+=1
+        batch=obstore_batch_buffer(elist,data,fillval=self.fillval)
+        return(self.write_packed(subtype,elist,len(data),batch.tobytes()))
+
+    def write_packed(self,subtype,elist,obscount,batchbytes):
+        if self.batchid == 0 or self.batchid > self.batchcount: raise ValueError("Obstore writer opened for %s batches" % self.batchcount)
+        batch_data_offset=self.datalen
+        self.datalen=write_batchheader(self.DT,self.hdrfile,self.nmlfile,subtype,elist,batchid=self.batchid,batch_data_offset=batch_data_offset,obscount=obscount,batchcount=self.batchcount,hdrsize=self.hdrsize,maxindx=self.maxindx,lutsize=self.lutsize,HlfTW=self.HlfTW,Tref=self.Tref)
+        self.obsfile.seek((self.datapos-1+batch_data_offset)*8,0)
+        self.obsfile.write(batchbytes)
+        return(self.datalen)
+
+    def close(self):
+        if self.closed: return(self.datapos,self.datalen,self.datapos+self.datalen)
+        if self.batchid < self.batchcount:
+            obstore_write_batchcount(self.batchid,self.hdrfile)
+            self.batchcount=self.batchid
+        obstore_write_obsgroup(self.obsgroup,self.hdrfile)
+        hdrbytes=self.hdrfile.getvalue()
+        self.obsfile.seek(0,0)
+        self.obsfile.write(hdrbytes[0:(self.datapos-1)*8])
+        self.obsfile.seek((self.datapos+self.datalen)*8,0)
+        self.obsfile.write(struct.pack(">8q",*[0]*8))
+        self.obsfile.flush()
+        if self.ownfile: self.obsfile.close()
+        self.hdrfile.close()
+        self.closed=True
+        return(self.datapos,self.datalen,self.datapos+self.datalen)
+
+#############202610#####################################################################################
+#### Parsed header cache: alpha, beeta, gamma, LDC/RDC/CDC and LUT are read once per file and every
+#### positional query is answered from memory. Read-only handles share one object per file until its
+#### modification time or size changes; files open for writing always go to disk. The cache is an LRU
+#### bounded by OBSHDR_CACHE_MAX files so long runs over many cycles do not grow without limit.
+
+OBSHDR_CACHE=collections.OrderedDict()
+OBSHDR_CACHE_MAX=int(os.environ.get('OBSHDR_CACHE_MAX',64))
+
+class ObstoreHeader(object):
+    def __init__(self,obsfile,stamp=None):
+        self.stamp=stamp
+        self.alpha=self.read_words(obsfile,1,256,"q")
+        (hbpos,hblen,hcpos,hclen)=[int(self.alpha[i-1]) for i in [100,101,105,106]]
+        self.beeta=self.read_words(obsfile,hbpos,hblen,"q")
+        self.gamma=self.read_words(obsfile,hcpos,hclen,"d")
+        self.secpos={
+            'hdr': (1,340,1),
+            'fix1': (1,305,1),
+            'fix2': (hcpos,hclen,1),
+            'hdralp': (1,256,1),
+            'alpha': (1,256,1),
+            'beeta': (hbpos,hblen,1),
+            'gamma': (hcpos,hclen,1),
+        }
+        for (sec_nam,(p1,p2,p3)) in MMAP_SECPOS.items():
+            if sec_nam in ["beeta","gamma"]: continue
+            if p3 is None: p3=162
+            self.secpos[sec_nam]=tuple([int(self.alpha[i-1]) for i in [p1,p2,p3]])
+        for sec_nam in ["ldc","rdc","cdc","lut"]:
+            (pos,tcol,nrow)=self.secpos[sec_nam]
+            section=self.read_words(obsfile,pos,tcol*nrow,binfmt(sec_nam,1)[-1])
+            setattr(self,sec_nam,section.reshape(nrow,tcol))
+        self.obsgroup=int(self.read_words(obsfile,287,1,"q")[0])
+        self.maxindx=self.secpos["ldc"][1]
+        self.batchcount=self.secpos["lut"][2]
+        self.datapos=self.secpos["data"][0]
+        self.datalen=self.secpos["data"][1]
+        self.batch_data_len=self.lut[:,14]
+        self.batch_obs_count=self.lut[:,18]
+        self.batch_col_count=self.lut[:,17]
+        self.batch_subtype=self.lut[:,67]
+        self.batch_data_pos=self.datapos+numpy.concatenate(([0],numpy.cumsum(self.batch_data_len)[:-1]))
+        self.elistdic={}
+
+    def read_words(self,obsfile,pos,size,fmtkey):
+        obsfile.seek((pos-1)*8,0)
+        return(numpy.frombuffer(obsfile.read(size*8),dtype={"q":">i8","d":">f8"}[fmtkey]))
+
+    def binpos(self,sec_nam):
+        return(self.secpos.get(sec_nam,(1,340,1)))
+
+    def batchinfo(self,indx):
+        pos_data=int(self.batch_data_pos[indx-1])
+        data_len=int(self.batch_data_len[indx-1])
+        return(indx,pos_data,int(self.batch_obs_count[indx-1]),int(self.batch_col_count[indx-1]),data_len,pos_data+data_len-1)
+
+    def index_subtype(self,indx):
+        return(int(self.batch_subtype[int(indx)-1]))
+
+    def subtype_index(self,subtype):
+        return(numpy.where(self.subtype_list() == int(subtype))[0][0] + 1)
+
+    def subtype_list(self):
+        return(obslib.binsort(self.batch_subtype,missing=-32768).flatten())
+
+    def batch_elements(self,indx,nmlfile=NML_OBS_INDX):
+        key=(int(indx),nmlfile)
+        if key not in self.elistdic:
+            hdrinfodic={"ldc":self.ldc[int(indx)-1],"rdc":self.rdc[int(indx)-1],"cdc":self.cdc[int(indx)-1]}
+            self.elistdic[key]=frame_batch_elist(hdrinfodic,nmlfile=nmlfile,maxindx=self.maxindx)
+        return(self.elistdic[key].copy())
+
+def obstore_header(obsfile):
+    if getattr(obsfile,"mode",None) not in ["r","rb"]: return(None)
+    try:
+        filestat=os.fstat(obsfile.fileno())
+        key=os.path.realpath(obsfile.name)
+    except (AttributeError,TypeError,ValueError,IOError,OSError):
+        return(None)
+    stamp=(filestat.st_mtime,filestat.st_size)
+    obshdr=OBSHDR_CACHE.pop(key,None)
+    if obshdr is None or obshdr.stamp != stamp:
+        obshdr=ObstoreHeader(obsfile,stamp=stamp)
+    OBSHDR_CACHE[key]=obshdr
+    while len(OBSHDR_CACHE) > max(OBSHDR_CACHE_MAX,1): OBSHDR_CACHE.popitem(last=False)
+    return(obshdr)
+
+def obstore_header_file(input_file):
+    with open(input_file, "rb") as obsfile:
+        obshdr=obstore_header(obsfile)
+    return(obshdr)
+
+#############202610#####################################################################################
+#### Batch parallel decoding: every (file,batch) pair is an independent unit of work built on
+#### obstore_read_batch_elements and frame_data_batch, mapped over a process or thread pool.
+
+def obstore_decode_batch(batchtask):
+    (input_file,nmlfile,indx,maxindx,mmapflag)=batchtask
+    with open(input_file, "rb") as infile:
+        obsgroup=obstore_read_header(infile,287,1)
+        subtype=obstore_read_index_subtype(infile,indx)
+        elist=obstore_read_batch_elements(infile,indx,nmlfile,maxindx)
+        if mmapflag:
+            btchdata=frame_data_batch(input_file,nmlfile,indx,elist.Element.values,maxindx=maxindx,mmapflag=True)
+        else:
+            btchdata=frame_data_batch(infile,nmlfile,indx,elist.Element.values,maxindx=maxindx)
+    btchdata.insert(0,"batch",int(indx))
+    btchdata.insert(0,"subtype",int(subtype))
+    btchdata.insert(0,"obsgroup",int(obsgroup))
+    btchdata.insert(0,"obsfile",input_file)
+    return(btchdata)
+
+def obstore_batch_tasks(filelist,nmlfile=NML_OBS_INDX,subtyplst=None,maxindx=MAXINDX,mmapflag=False):
+    if isinstance(filelist,str): filelist=[filelist]
+    tasklist=[]
+    for input_file in filelist:
+        with open(input_file, "rb") as infile:
+            (pos_lut,tcol_lut,nrow_lut)=binpos(infile,"lut")
+            for indx in range(1,int(nrow_lut)+1):
+                subtype=obstore_read_index_subtype(infile,indx)
+                if int(subtype) == NAN_VAL_INT: continue
+                if subtyplst is not None and int(subtype) not in [int(i) for i in subtyplst]: continue
+                tasklist.append((input_file,nmlfile,indx,maxindx,mmapflag))
+    return(tasklist)
+
+def obstore_parallel_read(filelist,nmlfile=NML_OBS_INDX,subtyplst=None,nproc=None,threadflag=False,maxindx=MAXINDX,mmapflag=False):
+    tasklist=obstore_batch_tasks(filelist,nmlfile,subtyplst,maxindx,mmapflag)
+    if len(tasklist) == 0: return(pandas.DataFrame())
+    if nproc is None: nproc=multiprocessing.cpu_count()
+    nproc=max(1,min(int(nproc),len(tasklist)))
+    if nproc == 1:
+        framelist=[obstore_decode_batch(batchtask) for batchtask in tasklist]
+    else:
+        if threadflag:
+            pool=multiprocessing.pool.ThreadPool(nproc)
+        else:
+            pool=multiprocessing.Pool(nproc)
+        try:
+            framelist=pool.map(obstore_decode_batch,tasklist)
+        finally:
+            pool.close()
+            pool.join()
+    filedata=pandas.concat(framelist,ignore_index=True,sort=False)
+    return(filedata)
+
+#############202610#####################################################################################
+#### Byte-range element reads: word offsets of the selected records and levels are computed from the
+#### CDC/RDC/LDC entries of the batch element table, and only the runs of words covering them are read.
+#### Offsets closer than the gap limit are merged into one read. Merging saves a seek and a read call
+#### per run but reads up to gap wasted words; once the gap reaches the record width (tcols words) every
+#### record merges and the range read degenerates into a full batch read. The limit is therefore a
+#### fraction RANGE_GAPFRAC of tcols, so the levels of one record merge while separate records do not,
+#### capped at RANGE_GAPMAX words for very wide records.
+
+RANGE_GAPMAX=int(os.environ.get('RANGE_GAPMAX',512))
+RANGE_GAPFRAC=float(os.environ.get('RANGE_GAPFRAC',0.25))
+
+def range_gapmax(tcols,gapfrac=RANGE_GAPFRAC,gapmax=RANGE_GAPMAX):
+    return(max(0,min(int(gapmax),int(int(tcols)*gapfrac))))
+
+def element_word_offsets(elist,element,tcols,record_pos,lev_pos=None):
+    (rdc,cdc,ldc) = elist.query("Element == @element")[["RDC","CDC","LDC"]].reset_index(drop=True).values[0]
+    step=int(rdc) if rdc > 0 else 1
+    recoff=(numpy.asarray(record_pos,dtype=numpy.int64).reshape(-1,1)-1)*int(tcols)+int(cdc)-1
+    if lev_pos is None: lev_pos=range(1,int(ldc)+1,1)
+    lev_pos=numpy.asarray(lev_pos,dtype=numpy.int64)
+    if lev_pos.ndim < 2: lev_pos=lev_pos.reshape(1,-1)
+    valid=(lev_pos >= 1) & (lev_pos <= int(ldc))
+    offsets=recoff+(numpy.where(valid,lev_pos,1)-1)*step
+    return(offsets,numpy.broadcast_to(valid,offsets.shape))
+
+def obstore_read_word_ranges(obsfile,pos_data,offsets,gapmax=RANGE_GAPMAX):
+    offsets=numpy.asarray(offsets,dtype=numpy.int64)
+    gapmax=int(gapmax)
+    if offsets.size == 0: return(numpy.empty(offsets.shape,dtype=numpy.float64))
+    (uniq,inverse)=numpy.unique(offsets.ravel(),return_inverse=True)
+    values=numpy.empty(len(uniq),dtype=numpy.float64)
+    for run in numpy.split(numpy.arange(len(uniq)),numpy.where(numpy.diff(uniq) > gapmax)[0]+1):
+        first=int(uniq[run[0]])
+        last=int(uniq[run[-1]])
+        obsfile.seek((int(pos_data)-1+first)*8,0)
+        words=numpy.frombuffer(obsfile.read((last-first+1)*8),dtype=">f8")
+        values[run]=words[uniq[run]-first]
+    return(values[inverse].reshape(offsets.shape))
+
+def obstore_read_element_range(obsfile,elist,element,pos_data,record_pos,tcols,lev_pos=None,fillval=NAN_VAL):
+    if element not in elist.Element.values:
+        errprint("Element %s is not available "%(element))
+        return(None)
+    record_pos=list(record_pos)
+    ldc=int(elist.query("Element == @element").LDC.values[0])
+    (offsets,valid)=element_word_offsets(elist,element,tcols,record_pos,lev_pos)
+    values=obstore_read_word_ranges(obsfile,pos_data,offsets,gapmax=range_gapmax(tcols))
+    values[~valid]=fillval
+    if element in ["CharData"]:
+        data_element=pandas.DataFrame([obslib.getstring(rec) for rec in values],index=record_pos,columns=[element])
+    elif ldc == 1 or numpy.ndim(lev_pos) > 1:
+        data_element=pandas.DataFrame(values[:,0],index=record_pos,columns=[element])
+    else:
+        if lev_pos is None: lev_pos=range(1,ldc+1,1)
+        data_element=pandas.DataFrame(values,index=record_pos,columns=[element+str(i) for i in lev_pos])
+    return(data_element)
+
+def obstore_read_data_element_range(obsfile,nmlfile,indx,element,lev_pos=None,record_pos=None,maxindx=MAXINDX):
+    elist = obstore_read_batch_elements(obsfile,indx,nmlfile,maxindx)
+    (indx,pos_data,obs_count,tcols,data_len,data_end)=obstore_read_batchinfo(obsfile,indx)
+    if record_pos is None: record_pos=range(1,obs_count+1,1)
+    return(obstore_read_element_range(obsfile,elist,element,pos_data,record_pos,tcols,lev_pos=lev_pos))
+
+def frame_data_batch_range(obsfile,nmlfile,indx,elenams,levdic=None,record_pos=None,maxindx=MAXINDX):
+    if levdic is None: levdic={}
+    dataframelist=[obstore_read_data_element_range(obsfile,nmlfile,indx,element,levdic.get(element),record_pos,maxindx) for element in elenams]
+    dataframelist=[data for data in dataframelist if data is not None]
+    if len(dataframelist) == 0: return(pandas.DataFrame())
+    return(pandas.concat(dataframelist,axis=1))
+
+#############202610#####################################################################################
+#### Chunked writer: batches of unknown number are packed as they arrive and spooled to a temporary
+#### file, so only the current chunk is held in memory. The header is laid out for the final batch count
+#### on close and the spooled batches are copied behind it one at a time.
+
+class ObstoreChunkWriter(object):
+    def __init__(self,DT,obsfile,nmlfile,obsgroup,spooldir=None,btchcnt=None,**kwargs):
+        self.DT=DT
+        self.btchcnt=btchcnt
+        self.obsfile=obsfile
+        self.nmlfile=nmlfile
+        self.obsgroup=obsgroup
+        self.kwargs=kwargs
+        self.fillval=kwargs.get("fillval",NAN_VAL)
+        self.spool=tempfile.TemporaryFile(dir=spooldir)
+        self.batches=[]
+        self.batchcount=0
+        self.closed=False
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self,exc_type,exc_value,tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.spool.close()
+        return(False)
+
+    def write_batch(self,subtype,elist,data):
+        if self.closed: raise ValueError("Obstore writer is already closed")
+        if data is None or len(data) == 0: return(len(self.batches))
+        batch=obstore_batch_buffer(elist,data,fillval=self.fillval)
+        self.spool.seek(0,2)
+        self.batches.append((subtype,elist,len(data),self.spool.tell(),batch.nbytes))
+        self.spool.write(batch.tobytes())
+        return(len(self.batches))
+
+    def batch_layout(self):
+        ### Spooled batches are record-major, so the rows of one subtype can be regrouped by byte ranges.
+        ### As in obstore_write, btchcnt splits a single subtype uniformly; several subtypes get one batch each.
+        if self.btchcnt is None: return([(subtype,elist,obscount,[(offset,nbytes)]) for (subtype,elist,obscount,offset,nbytes) in self.batches])
+        subtypelist=list(collections.OrderedDict.fromkeys([batch[0] for batch in self.batches]))
+        nbatch=max(1,int(self.btchcnt)) if len(subtypelist) == 1 else 1
+        layout=[]
+        for subtype in subtypelist:
+            pieces=[batch for batch in self.batches if batch[0] == subtype]
+            elist=pieces[0][1]
+            total=sum([obscount for (subtype1,elist1,obscount,offset,nbytes) in pieces])
+            sizes=[total//nbatch+(1 if i < total%nbatch else 0) for i in range(0,nbatch,1)]
+            rows=[(offset,obscount,nbytes//obscount) for (subtype1,elist1,obscount,offset,nbytes) in pieces]
+            for size in [size for size in sizes if size > 0]:
+                segments=[]
+                need=size
+                while need > 0:
+                    (offset,obscount,rowbytes)=rows[0]
+                    take=min(need,obscount)
+                    segments.append((offset,take*rowbytes))
+                    if take == obscount: rows.pop(0)
+                    else: rows[0]=(offset+take*rowbytes,obscount-take,rowbytes)
+                    need-=take
+                layout.append((subtype,elist,size,segments))
+        return(layout)
+
+    def close(self):
+        if self.closed: return(None)
+        self.closed=True
+        if len(self.batches) == 0:
+            print("No observations to write to "+str(self.obsfile))
+            self.spool.close()
+            return(None)
+        layout=self.batch_layout()
+        self.batchcount=len(layout)
+        writer=ObstoreStreamWriter(self.DT,self.obsfile,self.nmlfile,self.obsgroup,batchcount=len(layout),**self.kwargs)
+        for (subtype,elist,obscount,segments) in layout:
+            writer.batchid+=1
+            batchbytes=[]
+            for (offset,nbytes) in segments:
+                self.spool.seek(offset,0)
+                batchbytes.append(self.spool.read(nbytes))
+            writer.write_packed(subtype,elist,obscount,b"".join(batchbytes))
+        self.spool.close()
+        return(writer.close())
+
+def obstore_chunk_prepare(data,keyinfofile,cntmax=None,missing_value=-1073741824.00000):
+    data = data[data[["Latitude", "Longitude"]].notnull().all(1)]
+    data = data.replace(numpy.nan,missing_value)
+    if "subtype" not in data: data=assign_subtype(data,keyinfofile)
+    if cntmax is not None : data=obslib.data_thinning(obslib.reset_index(data),cntmax=cntmax,callsign="SatID",fillval=NAN_VAL)
+    return(data)
+
+def obstore_write_chunks(chunks,keyinfofile,outpath,cntmax=None,totalweight=None,chunkobs=OBS_CHUNK,DT=None,Tref=None,HlfTW=None,callsignflag=False,missing_value=-1073741824.00000,nmlfile=NML_OBS_INDX,btchcnt=None):
+    ### chunks yields (data,weight); with cntmax the thinning target of a chunk is its weight share of cntmax,
+    ### taken from the cumulative share so that the targets of all chunks add up to cntmax
+    obsgroup=int(obslib.get_key_info(keyinfofile,"obsgroup"))
+    maxindx=int(obslib.get_key_info(keyinfofile,"maxindx"))
+    output_file="%s/%s" % (outpath,obslib.get_key_info(keyinfofile,"OBSTORE")+".obstore")
+    obslib.mkdir(outpath)
+    if Tref is None : Tref=TREF
+    if HlfTW is None : HlfTW=HLFTW
+    writer=ObstoreChunkWriter(DT,output_file,nmlfile,obsgroup,btchcnt=btchcnt,maxindx=maxindx,HlfTW=HlfTW,Tref=Tref,callsignflag=callsignflag)
+    elistdic={}
+    pending={}
+    def flush(subtype):
+        data=pandas.concat(pending.pop(subtype),ignore_index=True,sort=False)
+        if subtype not in elistdic:
+            elemlist=obslib.get_key_list_info(keyinfofile,"elemlist_"+str(subtype))
+            elistdic[subtype]=obstore_create_element_table(nmlfile,elemlist)
+        writer.write_batch(subtype,elistdic[subtype],data)
+    cumweight=0
+    allotted=0
+    with writer:
+        for (data,weight) in chunks:
+            chunkmax=None
+            if cntmax is not None and totalweight :
+                cumweight+=weight
+                chunkmax=min(int(cntmax),int(numpy.floor(float(cntmax)*cumweight/totalweight)))-allotted
+                if chunkmax <= 0: continue
+                allotted+=chunkmax
+            data=obstore_chunk_prepare(data,keyinfofile,chunkmax,missing_value)
+            if len(data) == 0: continue
+            if writer.DT is None: writer.DT=obslib.get_date_info(data)
+            for subtype,data1 in data.groupby("subtype",sort=False):
+                pending.setdefault(subtype,[]).append(data1)
+                if sum([len(item) for item in pending[subtype]]) >= chunkobs: flush(subtype)
+        for subtype in list(pending.keys()): flush(subtype)
+    print("Writting to "+output_file+ " is completed with "+str(writer.batchcount)+" batches")
+    return(output_file)
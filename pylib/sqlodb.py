@@ -36,13 +36,13 @@ def query(odbfile,nmlfile,subtype=None,elenams=[],varnolist=[],userquery=[]):
             odbname[i]=obslib.getodbname(nmlfile,opsname)
     if not odbname: selectstring = "*"
     else: selectstring = ','.join(odbname+["ops_subtype"])
-    if not subtype: subtypequery = ""
-    else: subtypequery = "where ops_subtype = "+str(subtype)
-    if not userquery: querystring= subtypequery
-    else: querystring=' and '.join( [subtypequery]+ userquery )
-    varnoquery=queryvarno(varnolist)
-    if not varnolist: print(querystring)
-    else: querystring= ' AND '.join( [querystring] + varnoquery  )
+    clauses=[]
+    if subtype: clauses+=["ops_subtype = "+str(subtype)]
+    if userquery: clauses+=list(userquery)
+    if varnolist: clauses+=queryvarno(varnolist)
+    if not clauses: querystring = ""
+    else: querystring = "where "+' AND '.join(clauses)
+    print(querystring)
     data=sqlodb(odbfile,'select ' + selectstring + ' from "' + odbfile + '" ' + querystring + ';')
     return(data)
 
@@ -78,9 +78,35 @@ def odb_readfield(odbfile,nmlfile,element):
     return(data.rename(index=str,columns={odbname:element}))
     
 def obs_frametable(odbfile,odbnmlfile,elenams):
-    dataframelist=[None]*len(elenams)
-    for i,element in enumerate(elenams):
-        print(element)
-        dataframelist[i]=odb_readfield(odbfile,odbnmlfile,element)
-    return(obslib.obsdfcat(dataframelist))
+    odbnames=[obslib.getodbname(odbnmlfile,element) for element in elenams]
+    data=odb_sqlselect(odbfile,odbnames)
+    if data is not None: data.columns=list(elenams)
+    return(data)
+
+#############202610####
+def varno_columns(varno_nmlfile,varnos,levels=None):
+    namedic=dict((varno,obslib.getvarname(varno_nmlfile,varno)) for varno in numpy.unique(varnos))
+    names=numpy.array([namedic[varno] for varno in varnos],dtype=object)
+    if levels is None: return(names)
+    ### Missing levels (surface varnos) get no suffix, non-integer levels keep their decimals
+    levels=pandas.Series(levels).astype(numpy.float64)
+    suffix=levels.map(lambda lev: "" if numpy.isnan(lev) else ("_%d" % lev if float(lev).is_integer() else "_%g" % lev))
+    return(names+suffix.values.astype(object))
+
+def odb_bulk_query(odbfile,odbnmlfile,varno_nmlfile,varnolist=[],columns=["obsvalue"],keycols=["seqno","lat","lon"],levelcol="vertco_reference_1",subtype=None,userquery=[]):
+    ### One projected query for every varno of the cycle, pivoted to one column per varno and level
+    ### (pressure or channel by default); rows that would still share a cell are an error, not dropped
+    selectlist=list(keycols)+([levelcol] if levelcol is not None else [])+["varno"]+list(columns)
+    data=query(odbfile,odbnmlfile,subtype,selectlist,varnolist,userquery)
+    if data is None: return(None)
+    data.columns=selectlist+["ops_subtype"]
+    levels=data[levelcol].values if levelcol is not None else None
+    data=data.assign(element=varno_columns(varno_nmlfile,data.varno.values,levels))
+    index=list(keycols)+["ops_subtype"]
+    duplicate=data.duplicated(index+["element"],keep=False)
+    if duplicate.any(): raise ValueError(str(int(duplicate.sum()))+" ODB rows share the same "+",".join(index)+" and varno/level; add the distinguishing column to keycols or levelcol")
+    wide=data.set_index(index+["element"])[list(columns)].unstack("element")
+    if len(columns) == 1: wide.columns=[element for (col,element) in wide.columns]
+    else: wide.columns=[col+"_"+element for (col,element) in wide.columns]
+    return(wide.reset_index())
 
@@ -30,70 +30,44 @@ import pandas
 import numpy
 import math
 import itertools
+import multiprocessing
+import tempfile
+import glob
+import uuid
  
 
 MAXINDX=int(os.environ.get('MAXINDX',608))
+SYMOBS_NPROC=os.environ.get('SYMOBS_NPROC',None)
+SYMOBS_METHOD=os.environ.get('SYMOBS_METHOD',"nearest")
 diaglev=int(os.environ.get('GEN_MODE',0))
 
-def nadir_latlon(Tnow,Tnode,Torbit,OrbInc,NodeShift=0):
-    Tearth=1440
-    nodlon=obslib.dawnlon(Tnode)
-    OrP=obslib.to_minutes(Torbit)
-    Tdelta=obslib.to_minutes(Tnow-Tnode)
-    lat=(math.sin(Tdelta/OrP*2*math.pi)*math.degrees(math.asin(math.sin(math.radians(OrbInc)))))
-    lon=nodlon-NodeShift-(Tdelta/Tearth)*360-(Tdelta/OrP)*360 
-                    ###-((Tdelta/Tearth)*360*math.sin(math.radians(OrbInc)))  #+math.degrees(math.cos(2*math.pi*Tdelta/OrP)*math.cos(math.radians(OrbInc)))  #
-    lon=degreelon(lon)
-    data1={'Time':[Tnow],'Longitude':[lon],'Latitude':[lat]}
-    return(pandas.DataFrame(data1,index=[Tdelta],columns=['Time','Latitude','Longitude']))
+def nadir_latlon(Tnow,Tnode,Torbit,OrbInc,NodeShift=0,ephemeris=None):
+    Tnow=time_index(Tnow)
+    Tdelta=minutes_since(Tnow,Tnode)
+    if ephemeris is None : (lat,lon)=nadir_track_latlon(Tdelta,Tnode,Torbit,OrbInc,NodeShift)
+    else : (lat,lon)=ephemeris_latlon(ephemeris,Tnow)
+    data1={'Time':Tnow,'Longitude':lon,'Latitude':lat}
+    return(pandas.DataFrame(data1,index=Tdelta,columns=['Time','Latitude','Longitude']))
 
 def los_latlon(SatID, idx, ObsAlt,Tnow,Tnode,Torbit,SMAxis,SatAlt,nadir,OrbInc,HVA,VVA):
-    OrP=obslib.to_minutes(Torbit)
-    Tdelta=obslib.to_minutes(Tnow-Tnode)
-    nadirlon=float(nadir.Longitude.values[0])
-    nadirlat=float(nadir.Latitude.values[0])
-    RoE=6371  ###in km
-    VLOS=(SatAlt-ObsAlt) ###in km
-    HLOS=VLOS*math.tan(math.pi*VVA/180)
-    OpticDist=math.hypot(HLOS,VLOS)
-    losdelon=math.degrees(HLOS/RoE)*math.cos(math.radians(OrbInc+HVA))*math.cos(2*math.pi*Tdelta/OrP)
-    losdelat=math.degrees(HLOS/RoE)*math.sin(math.radians(OrbInc+HVA))+math.degrees(HLOS/RoE)*math.cos(math.radians(OrbInc+HVA))*math.sin(2*math.pi*Tdelta/OrP)
-    lon=nadirlon+losdelon
-    lat=nadirlat+losdelat    
-    azmh=get_ddd(losdelon,losdelat)
+    idx=numpy.atleast_1d(idx)
+    Tnow=time_index(Tnow)
+    if len(Tnow) == 1 : Tnow=Tnow.repeat(len(idx))
+    Tdelta=minutes_since(Tnow,Tnode)
+    ObsAlt=numpy.broadcast_to(numpy.asarray(ObsAlt,dtype=numpy.float64),idx.shape)
+    (losdelon,losdelat)=los_offsets(ObsAlt,Tdelta,obslib.to_minutes(Torbit),SatAlt,OrbInc,HVA,VVA)
+    lon=numpy.asarray(nadir.Longitude.values,dtype=numpy.float64)+losdelon
+    lat=numpy.asarray(nadir.Latitude.values,dtype=numpy.float64)+losdelat
+    azmh=vec_ddd(losdelon,losdelat)
     ###Caution: Any change in azmh will affect HLOSWind calculation
-    data1={'Index':[idx], 'Year':[Tnow.year], 'Month':[Tnow.month], 'Day':[Tnow.day], 'Hour':[Tnow.hour], 'Minute':[Tnow.minute], 'Second':[Tnow.second], 'Longitude':[lon],'Latitude':[lat], 'Altitude':[ObsAlt], 'Azimuth':[azmh]}
-    data=pandas.DataFrame(data1,index=[idx],columns=['Index','Year','Month','Day','Hour','Minute','Second','Latitude','Longitude','Altitude','Azimuth'])
+    data1=time_columns(Tnow)
+    data1.update({'Index':idx, 'Longitude':lon,'Latitude':lat, 'Altitude':ObsAlt, 'Azimuth':azmh})
+    data=pandas.DataFrame(data1,index=idx,columns=['Index','Year','Month','Day','Hour','Minute','Second','Latitude','Longitude','Altitude','Azimuth'])
     return(data)
 
 def fileindex(data,index,filedim,gph,altnam="Altitude",DT=None):
-    data1=data[data.index == index]
-    #print(index,data1)
-    LTTD=data1.Latitude.values[0]
-    LNGD=data1.Longitude.values[0]
-    if altnam in data1.columns.values:
-        ALTTD=data1.loc[:,altnam].values[0]*1000
-    else:
-        ALTTD=0
-    if "Azimuth" in data1.columns.values: 
-        AZMTH=data1.Azimuth.values[0]
-    else:
-        AZMTH=0
-    #Year=data1.Year.values[0]
-    time=filedim["time"]
-    time_units=filedim["time_units"]
-    lat=filedim["lat"]
-    lon=filedim["lon"]
-    DT=obslib.getdatetime(DT,data1)
-    itime=find_nearest_time(time,DT,time_units)
-    ilat=find_nearest_index(lat,LTTD)
-    ilon=find_nearest_index(lon,LNGD)
-    ilev=find_nearest_index(gph[itime,:,ilat,ilon],ALTTD)
-    lev=filedim["lev"][ilev]
-    findx1={'Index':[index], 'itime':[itime], 'ilat':[ilat], 'ilon':[ilon], 'ilev':[ilev], 'lev':[lev], 'azmh':[AZMTH]}
-    findex=pandas.DataFrame(findx1,index=[index],columns=['Index','itime','ilat','ilon','ilev','lev','azmh'])
-    return(findex)
-    
+    data1=data[data.index.isin(numpy.atleast_1d(index))]
+    return(sample_index(data1,filedim,gph,altnam,DT))
 
 def degreelon(lon):
     while lon < -180 :
@@ -212,26 +186,18 @@ def extend_dims(data,axis,length):
 
 def generate2Dindex(obs_cnt,LTTD,LNGD,datetime,time,time_units,lat,lon):
     itime=dateindex(datetime,time,time_units)
-    for i in range(0,obs_cnt,1):
-        ilat=find_nearest_index(lat,LTTD.values[i])
-        ilon=find_nearest_index(lon,LNGD.values[i])
-        if i in [0]: 
-            idx=pandas.DataFrame([[itime,ilat,ilon]],index=[i+1],columns=["itime","ilat","ilon"])
-        else:
-            idx=idx.append(pandas.DataFrame([[itime,ilat,ilon]],index=[i+1],columns=["itime","ilat","ilon"]))
-    return(idx)
+    ilat=nearest_index(lat,LTTD.values[0:obs_cnt])
+    ilon=nearest_index(lon,LNGD.values[0:obs_cnt])
+    idx={"itime":numpy.repeat(itime,obs_cnt),"ilat":ilat,"ilon":ilon}
+    return(pandas.DataFrame(idx,index=range(1,obs_cnt+1,1),columns=["itime","ilat","ilon"]))
 
 def generate3Dindex(obs_cnt,LTTD,LNGD,ALTTD,datetime,time,time_units,lat,lon,lev,gph):
     itime=dateindex(datetime,time,time_units)
-    for i in range(0,obs_cnt,1):
-        ilat=find_nearest_index(lat,LTTD.values[i])
-        ilon=find_nearest_index(lon,LNGD.values[i])
-        ilev=find_nearest_index(gph[itime,:,ilat,ilon],ALTTD.values[i])
-        if i in [0]: 
-            idx=pandas.DataFrame([[itime,ilat,ilon,ilev]],index=[i+1],columns=["itime","ilat","ilon","ilev"])
-        else:
-            idx=idx.append(pandas.DataFrame([[itime,ilat,ilon,ilev]],index=[i+1],columns=["itime","ilat","ilon","ilev"]))
-    return(idx)
+    ilat=nearest_index(lat,LTTD.values[0:obs_cnt])
+    ilon=nearest_index(lon,LNGD.values[0:obs_cnt])
+    ilev=level_index(gph,itime,ilat,ilon,ALTTD.values[0:obs_cnt])
+    idx={"itime":numpy.repeat(itime,obs_cnt),"ilat":ilat,"ilon":ilon,"ilev":ilev}
+    return(pandas.DataFrame(idx,index=range(1,obs_cnt+1,1),columns=["itime","ilat","ilon","ilev"]))
 
 def HLOSWind(location,findex,Tstart,outpath,nmlfile,obscount,maxindx=MAXINDX):   #,obsgroup,subtype,elist,data,batchcount=1,header_offset=339,maxindx=600,lut_ncols=LUTSIZE):
     data=location.join(findex.lev,on='ProfileNo')
@@ -317,7 +283,7 @@ def LEOGEOAMV(location,findex,Tstart,nmlfile,maxindx=MAXINDX):   #,obsgroup,subt
     #print(batchinfo)
     return(data)
 
-def aladin_profile(Tnode,Tstart,Tstop,output_file,nmlpath,maxindx=MAXINDX):
+def aladin_profile(Tnode,Tstart,Tstop,output_file,nmlpath,maxindx=MAXINDX,ephemeris=None):
     obs_index_nml="obs_index_nml"
     nmlfile="%s/%s" % (nmlpath,obs_index_nml)
     SatID=obsdic.Aeolus["SatID"]
@@ -337,23 +303,13 @@ def aladin_profile(Tnode,Tstart,Tstop,output_file,nmlpath,maxindx=MAXINDX):
     pid_start=obslib.profileid(Tstart,Tnode,profsec)
     pid_stop=obslib.profileid(Tstop,Tnode,profsec)
     ProfileIDs=numpy.arange(pid_start,pid_stop,1)
-    for prfcount,pid in enumerate(ProfileIDs):                
-        Tnow=Tnode+pid*Tprofile
-        
-        nadir=nadir_latlon(Tnow,Tnode,Torbit,OrbInc,NodeShift)
-        nadirlon=float(nadir.Longitude.values[0])
-        nadirlat=float(nadir.Latitude.values[0])
-        LocalTime=obslib.localtime(Tnow,nadirlon)
-        prf_start=prfcount*len(ObsAltList)
-        for lev,ObsAltSI in enumerate(ObsAltList,1):
-            ObsAlt=ObsAltSI/1000
-            obscount=prf_start+lev
-            if obscount in [1]:
-                location=los_latlon(SatID, obscount, ObsAlt,Tnow,Tnode,Torbit,SMAxis,SatAlt,nadir,OrbInc,HVA,VVA)
-                #findex=fileindex(location,obscount,filedim,gph,altnam="HeightCOG")
-            else:
-                location=location.append(los_latlon(SatID, obscount, ObsAlt,Tnow,Tnode,Torbit,SMAxis,SatAlt,nadir,OrbInc,HVA,VVA))
-                #findex=findex.append(fileindex(location,obscount,filedim,gph,altnam="HeightCOG"))
+    Tnow=pandas.Timestamp(Tnode)+pandas.to_timedelta(ProfileIDs*obslib.to_seconds(Tprofile),unit="s")
+    nadir=nadir_latlon(Tnow,Tnode,Torbit,OrbInc,NodeShift,ephemeris)
+    # one row per (profile,level), numbered profile by profile
+    (prfpos,ObsAlt)=numpy.meshgrid(numpy.arange(len(ProfileIDs)),numpy.asarray(ObsAltList)/1000,indexing="ij")
+    (prfpos,ObsAlt)=(prfpos.ravel(),ObsAlt.ravel())
+    obscount=numpy.arange(1,len(prfpos)+1,1)
+    location=los_latlon(SatID,obscount,ObsAlt,Tnow[prfpos],Tnode,Torbit,SMAxis,SatAlt,nadir.iloc[prfpos],OrbInc,HVA,VVA)
     return(location)
 
 def symulate_data(datetime,field,lat,lon,lev,time,time_units,obs_cnt,LTTD,LNGD):
@@ -742,68 +698,12 @@ def obstore_copy_data_element(outfile,nmlfile,indx,element,infile):
         return(obstore.obstore_copy_data_element(outfile,nmlfile,indx,element,infile))    
 
 def get_data(element,obs_cnt,idx,option="data",const=None,chnldic={},lev=numpy.empty(shape=[0]),lev_src_unit="mb",lev_req_unit="Pa",filedata=[],temp=[],rhum=[],uwnd=[],vwnd=[]):
-    if lev.size == 0:
-        for i in range(0,obs_cnt,1):
-            if option in ["const"] : idata=const
-            if option in ["data"] : idata=filedata[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["lev"] : idata=None
-            if option in ["chnlfreq"] : idata=None
-            if option in ["temp"] : idata=temp[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["uwnd"] : idata=uwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["vwnd"] : idata=vwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["ddd"] : idata=get_ddd(uwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if option in ["fff"] : idata=get_fff(uwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if option in ["hloswnd"] : idata=get_hloswnd(uwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]],idx.azmh[i+1])
-            if option in ["dpt_onshum"] : idata=get_dpt_onshum(filedata[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if option in ["dpt_onrhum"] : idata=get_dpt_onrhum(temp[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]],rhum[idx.itime[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if i in [0]: 
-                data=pandas.DataFrame([idata],index=[i+1],columns=[element])
-            else:
-                data=data.append(pandas.DataFrame([idata],index=[i+1],columns=[element]))
-    elif "lev" in obslib.dfheader(idx):
-        for i in range(0,obs_cnt,1):
-            if option in ["const"] : idata=const
-            if option in ["data"] : idata=filedata[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["lev"] : idata=obslib.unit_convert(idx.lev[i+1],lev_src_unit,lev_req_unit)
-            if option in ["chnlfreq"] : idata=ChanFreq(idx.lev[i+1],chnldic)
-            if option in ["temp"] : idata=temp[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["uwnd"] : idata=uwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["vwnd"] : idata=vwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]]
-            if option in ["ddd"] : idata=get_ddd(uwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if option in ["fff"] : idata=get_fff(uwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if option in ["hloswnd"] : idata=get_hloswnd(uwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]],idx.azmh[i+1])
-            if option in ["dpt_onshum"] : idata=get_dpt_onshum(filedata[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if option in ["dpt_onrhum"] : idata=get_dpt_onrhum(temp[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]],rhum[idx.itime[i+1],idx.ilev[i+1],idx.ilat[i+1],idx.ilon[i+1]])
-            if i in [0]: 
-                data=pandas.DataFrame([idata],index=[i+1],columns=[element])
-            else:
-                data=data.append(pandas.DataFrame([idata],index=[i+1],columns=[element]))
-    else:
-        for i in range(0,obs_cnt,1):
-                idata=[None]*len(lev)
-                for j,lvl in enumerate(lev):
-                    if option in ["const"] : idata=const
-                    if option in ["data"] : idata[j]=filedata[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]]
-                    if option in ["lev"] : idata=obslib.unit_convert(lvl,lev_src_unit,lev_req_unit)
-                    if option in ["chnlfreq"] : idata=const
-                    if option in ["temp"] : idata=temp[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]]
-                    if option in ["uwnd"] : idata[j]=uwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]]
-                    if option in ["vwnd"] : idata[j]=vwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]]
-                    if option in ["ddd"] : idata[j]=get_ddd(uwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]])
-                    if option in ["fff"] : idata[j]=get_fff(uwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]])
-                    if option in ["hloswnd"] : idata=get_hloswnd(uwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]],vwnd[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]],idx.azmh[i+1])
-                    if option in ["dpt_onshum"] : idata[j]=get_dpt_onshum(filedata[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]])
-                    if option in ["dpt_onrhum"] : idata[j]=get_dpt_onrhum(temp[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]],rhum[idx.itime[i+1],[j],idx.ilat[i+1],idx.ilon[i+1]])
-                if i in [0]: 
-                    data=pandas.DataFrame([idata],index=[i+1],columns=convert_mb_to_pa(lev))
-                else:
-                    data=data.append(pandas.DataFrame([idata],index=[i+1],columns=convert_mb_to_pa(lev)))
-    return(data)
+    fields={"filedata":filedata,"temp":temp,"rhum":rhum,"uwnd":uwnd,"vwnd":vwnd}
+    return(sample_element(element,obs_cnt,idx,option,const,chnldic,lev,lev_src_unit,lev_req_unit,fields))
 
 def prepdata(subdic,data,findex,idxnam,elenam,option="const",DT=None,lev=None,lev_src_unit="mb",lev_req_unit="Pa",constdic={},filedata=[],temp=[],rhum=[],uwnd=[],vwnd=[]):
     obs_index=subdic["obs_index"]
-    elist=obstore.obstore_create_element_table(nmlfile,obs_index)
-    elenamlist=elist.Element.values
+    elenamlist=subtype_element_names(obs_index)
     obscount=len(data.index)
 
 #    
@@ -860,7 +760,9 @@ def prepdata(subdic,data,findex,idxnam,elenam,option="const",DT=None,lev=None,le
             data=data.join(element,on=idxnam)
     return(data)
 
-def symulate_subtype(obs_info,obstypedic=None,maxindx=MAXINDX,temp=[],rhum=[],uwnd=[],vwnd=[]):
+def symulate_subtype(obs_info,obstypedic=None,maxindx=MAXINDX,temp=[],rhum=[],uwnd=[],vwnd=[],method=None):
+    if method is None : method=obs_info.get("method")
+    if method is None : method=SYMOBS_METHOD
     DT = obs_info["timeinfo"]
     data = obs_info["data"]
     elist = obs_info["elist"]
@@ -882,20 +784,10 @@ def symulate_subtype(obs_info,obstypedic=None,maxindx=MAXINDX,temp=[],rhum=[],uw
         Minute=DT.minute
         DT=obslib.pydatetime(Year,Month,Day,Hour,Minute,0)
 	print(DT)
-        Year,filedim=nature.getfiledim(DT)
+        Year,filedim,fields=nature_fields(DT)
         #lev=nature.getdata(Year,"lev")
-        gph=nature.getdata("gph",year=Year,month=Month,day=Day)
-        temp=nature.getdata("tmp",year=Year,month=Month,day=Day)
-        rhum=nature.getdata("rhum",year=Year,month=Month,day=Day)  
-        u10m=nature.getdata("u10m",year=Year,month=Month,day=Day)
-        v10m=nature.getdata("v10m",year=Year,month=Month,day=Day)
-        slp=nature.getdata("slp",year=Year,month=Month,day=Day)
-        psfc=nature.getdata("psfc",year=Year,month=Month,day=Day)
-        t2m=nature.getdata("t2m",year=Year,month=Month,day=Day)
-        rh2m=nature.getdata("rh2m",year=Year,month=Month,day=Day)  
-        sh2m=nature.getdata("sh2m",year=Year,month=Month,day=Day) 
+        (gph,temp,rhum,u10m,v10m,slp,psfc,t2m,rh2m,sh2m,vwnd)=[fields[name] for name in ["gph","temp","rhum","u10m","v10m","slp","psfc","t2m","rh2m","sh2m","vwnd"]]
         #uwnd=nature.getdata("uwnd",year=Year,month=Month,day=Day)
-        vwnd=nature.getdata("vwnd",year=Year,month=Month,day=Day)
     
 #    if subtype is 22501 : 
 #        altnam="HeightCOG"
@@ -909,15 +801,8 @@ def symulate_subtype(obs_info,obstypedic=None,maxindx=MAXINDX,temp=[],rhum=[],uw
 	print(len(data.index))
 	print(max(data.index))
 	print(data.columns)
-        for indx in range(1,len(data.index)+1,1):
-            DT=obslib.getdatetime(DT,data,indx)
-            if Year != DT.year:
-                Year,filedim=getfiledim(DT)
-                gph=nature.getdata("gph",year=Year,month=Month,day=Day)
-            if indx in [1]:
-                findex=fileindex(data,indx,filedim,gph,altnam,DT)
-            else:
-                findex=findex.append(fileindex(data,indx,filedim,gph,altnam,DT))
+        findex=sample_index(data,filedim,gph,altnam,DT,method=method)
+        DT=obslib.getdatetime(DT,data,len(data.index))
 #        if "Index" in data.columns.values: data=data.join(pandas.DataFrame(data.index,index=data.index),columns=["Index"])
 #        print(data.columns.values, findex.columns.values)
 #        if obsgroup not in [1,3] :
@@ -1052,7 +937,7 @@ def subtype_filter(subtypegroup, subtypelist):
 	return(indxlist)
     
 
-def symulate_obstore(outpath,inpath,nmlpath,DT,obstype,filevar=None,maxindx=MAXINDX,subtypelist=None):
+def symulate_obstore(outpath,inpath,nmlpath,DT,obstype,filevar=None,maxindx=MAXINDX,subtypelist=None,nproc=None,method=None):
     obstypedic=obsdic.obstype[obstype]
     filename=obstypedic["filename"]
     output_file="%s/%s" % (outpath,filename)
@@ -1145,20 +1030,24 @@ def symulate_obstore(outpath,inpath,nmlpath,DT,obstype,filevar=None,maxindx=MAXI
 #                obstore.erase_data_batch(outfile,nmlfile,subtype,indx)
     #print(subtypegroup)
     #print(elistgroup)
-    for indx,subtype in enumerate(subtypegroup[0:batchcount],start=1):
-	obs_info={
-		"timeinfo" : DT,
-		"data" : datagroup[indx-1],
-		"elist" : elistgroup[indx-1],
-		"subtype" : subtypegroup[indx-1],
-		"obstype" : obstype,
-		}
-        datagroup[indx-1]=symulate_subtype(obs_info,obstypedic,maxindx=maxindx)
-        print(datagroup[indx-1])
+    obs_infolist=[{"timeinfo" : DT, "data" : datagroup[indx-1], "elist" : elistgroup[indx-1], "subtype" : subtypegroup[indx-1], "obstype" : obstype, "method" : method} for indx in range(1,batchcount+1,1)]
+    results=symulate_subtypes(obs_infolist,obstypedic,maxindx=maxindx,nproc=nproc,spooldir=outpath)
     
     print("Writting "+str(batchcount)+" batches of data to "+ output_file)
     with open(output_file, "wb+") as outfile:
-        (datapos,datalen,dataend)=obstore.create_obstore(DT,outfile,nmlfile,obsgroup,subtypegroup,elistgroup,datagroup,batchcount=batchcount,header_offset=339,maxindx=maxindx,lut_ncols=LUTSIZE)
+        try:
+            writer=obstore.ObstoreStreamWriter(DT,outfile,nmlfile,obsgroup,batchcount=batchcount,maxindx=maxindx)
+            for indx,(data,spoolfile) in enumerate(results,start=1):
+                datagroup[indx-1]=data
+                print(data)
+                if spoolfile is None: continue
+                writer.batchid+=1
+                with open(spoolfile,"rb") as spool:
+                    writer.write_packed(subtypegroup[indx-1],elistgroup[indx-1],len(data),spool.read())
+                os.remove(spoolfile)
+        finally:
+            spool_remove([spoolfile for (data,spoolfile) in results])
+        (datapos,datalen,dataend)=writer.close()
         print(datapos,datalen,dataend)
     print("Writting to "+output_file+ " is completed")
     obsmod.obs_frame(datagroup,subtypegroup,outpath,filename=obstype,option=1)
@@ -1175,6 +1064,7 @@ def sose_merge_data(infodic):
     obstore_info["lut_ncols"] = infodic["lut_ncols"]
     obstore_info["maxindx"] = infodic["maxindx"]
     obstore_info["subtypelist"] = infodic["subtypelist"]
+    obstore_info["nproc"] = infodic.get("nproc",None)
     datafilter={}
     datafilter["synbuoyloc"] = infodic["synbuoyloc"]
     datafilter["array_weight"] = infodic["array_weight"]
@@ -1273,17 +1163,9 @@ def filtered_obstore_read(obstore_info,datafilter):
                             location=location.join(elemdata)
                 datagroup[indx-1]=location
     #### Synthetic Obstore Data Selection for all Batches
-    for indx,subtype in enumerate(subtypegroup[0:batchcount],start=1):
-        #print(datagroup[indx-1])
-	obs_info={
-		"timeinfo" : DT,
-		"data" : datagroup[indx-1],
-		"elist" : elistgroup[indx-1],
-		"subtype" : subtypegroup[indx-1],
-		"obstype" : obstype,
-		}
-        datagroup[indx-1]=symulate_subtype(obs_info,obstypedic,maxindx=maxindx)
-        #print(datagroup[indx-1])
+    obs_infolist=[{"timeinfo" : DT, "data" : datagroup[indx-1], "elist" : elistgroup[indx-1], "subtype" : subtypegroup[indx-1], "obstype" : obstype, "method" : obstore_info.get("method",None)} for indx in range(1,batchcount+1,1)]
+    results=symulate_subtypes(obs_infolist,obstypedic,maxindx=maxindx,nproc=obstore_info.get("nproc",None))
+    datagroup=[data for (data,spoolfile) in results]
     obstore_info={
 	"obstype" : obstype,
 	"obsgroup" : obsgroup,
@@ -1362,3 +1244,354 @@ def indexreset(data):
 	data = data.reset_index(drop=True)	# Fresh index start with 0
 	data = data.shift()[1:len(data)+1]	# To start index with 1
 	return(data)
+
+#############202610####
+SAMPLE_FIELDS={"data":"filedata","temp":"temp","rhum":"rhum","uwnd":"uwnd","vwnd":"vwnd"}
+SAMPLE_TIMEKEYS=["Year","Month","Day","Hour","Minute","Second"]
+SAMPLE_METHODS=["nearest","linear"]
+SAMPLE_AXES=["time","lat","lon","lev"]
+ELEMENT_NAMES={}
+
+def subtype_element_names(obs_index,nmlfile=nmlfile):
+    key=(nmlfile,tuple(numpy.atleast_1d(obs_index).tolist()))
+    if key not in ELEMENT_NAMES:
+        ELEMENT_NAMES[key]=obstore.obstore_create_element_table(nmlfile,obs_index).Element.values
+    return(ELEMENT_NAMES[key])
+
+def nearest_index(a,values):
+    # same pick as find_nearest_index for every value, ties going to the lower index
+    array=numpy.asarray(a,dtype=numpy.float64).ravel()
+    values=numpy.asarray(values,dtype=numpy.float64)
+    if len(array) < 2 : return(numpy.zeros(values.shape,dtype=numpy.int64))
+    order=numpy.argsort(array,kind="mergesort")
+    pos=numpy.clip(numpy.searchsorted(array[order],values),1,len(array)-1)
+    (lo,hi)=(order[pos-1],order[pos])
+    (dlo,dhi)=(numpy.abs(array[lo]-values),numpy.abs(array[hi]-values))
+    idx=numpy.where((dhi < dlo) | ((dhi == dlo) & (hi < lo)),hi,lo)
+    return(numpy.where(values == values,idx,0).astype(numpy.int64))
+
+def bracket_index(a,values,period=None):
+    # lower/upper neighbours on the axis and the linear weight of the upper one; values beyond the axis take the edge point
+    array=numpy.asarray(a,dtype=numpy.float64).ravel()
+    values=numpy.asarray(values,dtype=numpy.float64)
+    zero=numpy.zeros(values.shape,dtype=numpy.int64)
+    if len(array) < 2 : return(zero,zero,numpy.zeros(values.shape))
+    order=numpy.argsort(array,kind="mergesort")
+    axis=array[order]
+    if period is not None:
+        # cyclic axis, the first point is repeated one period on so that the last interval wraps
+        values=axis[0]+numpy.mod(values-axis[0],period)
+        (order,axis)=(numpy.append(order,order[0]),numpy.append(axis,axis[0]+period))
+    pos=numpy.clip(numpy.searchsorted(axis,values,side="right"),1,len(axis)-1)
+    with numpy.errstate(divide="ignore",invalid="ignore"):
+        weight=numpy.clip((values-axis[pos-1])/(axis[pos]-axis[pos-1]),0,1)
+    valid=values == values
+    (lo,hi)=(numpy.where(valid,order[pos-1],0),numpy.where(valid,order[pos],0))
+    return(lo.astype(numpy.int64),hi.astype(numpy.int64),numpy.where(numpy.isfinite(weight),weight,0.0))
+
+def lon_period(lon):
+    lon=numpy.sort(numpy.asarray(lon,dtype=numpy.float64).ravel())
+    if len(lon) < 2 : return(None)
+    if (lon[-1]-lon[0])+numpy.median(numpy.diff(lon)) < 359.999 : return(None)
+    return(360.0)
+
+def level_bracket(profile,alt):
+    # bracketing levels of alt in every gph profile (one row per point) and the linear weight of the upper one
+    (npts,nlev)=numpy.shape(profile)
+    alt=numpy.asarray(alt,dtype=numpy.float64)
+    zero=numpy.zeros(npts,dtype=numpy.int64)
+    if nlev < 2 : return(zero,zero,numpy.zeros(npts))
+    order=numpy.argsort(profile,axis=1,kind="mergesort")
+    axis=numpy.take_along_axis(profile,order,axis=1)
+    rows=numpy.arange(npts)
+    pos=numpy.clip((axis <= alt[:,None]).sum(axis=1),1,nlev-1)
+    with numpy.errstate(divide="ignore",invalid="ignore"):
+        weight=numpy.clip((alt-axis[rows,pos-1])/(axis[rows,pos]-axis[rows,pos-1]),0,1)
+    return(order[rows,pos-1].astype(numpy.int64),order[rows,pos].astype(numpy.int64),numpy.where(numpy.isfinite(weight),weight,0.0))
+
+def sample_datetimes(data,DT):
+    nobs=len(data.index)
+    timecols={}
+    for key in SAMPLE_TIMEKEYS:
+        if key in data.columns.values : timecols[key.lower()]=data[key].values.astype(numpy.int64)
+        else : timecols[key.lower()]=numpy.repeat(int(getattr(DT,key.lower())),nobs)
+    obstime=pandas.to_datetime(pandas.DataFrame(timecols,columns=[key.lower() for key in SAMPLE_TIMEKEYS]))
+    return(obstime)
+
+def sample_time_value(obstime,units):
+    (uniqtime,inverse)=numpy.unique(obstime.values,return_inverse=True)
+    timevalue=netCDF4.date2num(list(pandas.to_datetime(uniqtime).to_pydatetime()),units=units)
+    return(numpy.asarray(timevalue,dtype=numpy.float64)[inverse])
+
+def sample_time_index(nctime,obstime,units):
+    return(nearest_index(nctime[:],sample_time_value(obstime,units)))
+
+def check_sample_method(method):
+    if method not in SAMPLE_METHODS: raise ValueError("Unknown sampling method "+str(method)+"; valid options are "+", ".join(SAMPLE_METHODS))
+    return(method)
+
+def sample_index(data,filedim,gph,altnam="Altitude",DT=None,method="nearest"):
+    ### nearest: itime,ilat,ilon,ilev are the grid point closest in time, lat, lon and gph level
+    ### linear: itime,ilat,ilon,ilev are the lower neighbours, itime1,ilat1,.. the upper ones and wtime,wlat,.. their weights
+    check_sample_method(method)
+    nobs=len(data.index)
+    if altnam in data.columns.values : ALTTD=data[altnam].values*1000
+    else : ALTTD=numpy.zeros(nobs,dtype=numpy.int64)
+    if "Azimuth" in data.columns.values : AZMTH=data.Azimuth.values
+    else : AZMTH=numpy.zeros(nobs,dtype=numpy.int64)
+    filelev=numpy.asarray(filedim["lev"])
+    if method in ["nearest"]:
+        itime=sample_time_index(filedim["time"],sample_datetimes(data,DT),filedim["time_units"])
+        ilat=nearest_index(filedim["lat"],data.Latitude.values)
+        ilon=nearest_index(filedim["lon"],data.Longitude.values)
+        ilev=level_index(gph,itime,ilat,ilon,ALTTD)
+        findx1={'Index':data.index.values, 'itime':itime, 'ilat':ilat, 'ilon':ilon, 'ilev':ilev, 'lev':filelev[ilev], 'azmh':AZMTH}
+        return(pandas.DataFrame(findx1,index=data.index,columns=['Index','itime','ilat','ilon','ilev','lev','azmh']))
+    timevalue=sample_time_value(sample_datetimes(data,DT),filedim["time_units"])
+    (itime,itime1,wtime)=bracket_index(filedim["time"][:],timevalue)
+    (ilat,ilat1,wlat)=bracket_index(filedim["lat"],data.Latitude.values)
+    (ilon,ilon1,wlon)=bracket_index(filedim["lon"],data.Longitude.values,lon_period(filedim["lon"]))
+    bracket={"time":(itime1,wtime),"lat":(ilat1,wlat),"lon":(ilon1,wlon)}
+    profile=sample_points(gph,itime,ilat,ilon,nlev=numpy.shape(gph)[1],filled=False,method=method,bracket=bracket)
+    (ilev,ilev1,wlev)=level_bracket(profile,ALTTD)
+    filelev=filelev.astype(numpy.float64)
+    lev=filelev[ilev]+wlev*(filelev[ilev1]-filelev[ilev])
+    findx1={'Index':data.index.values, 'itime':itime, 'ilat':ilat, 'ilon':ilon, 'ilev':ilev, 'lev':lev, 'azmh':AZMTH,
+            'itime1':itime1, 'ilat1':ilat1, 'ilon1':ilon1, 'ilev1':ilev1, 'wtime':wtime, 'wlat':wlat, 'wlon':wlon, 'wlev':wlev}
+    columns=['Index','itime','ilat','ilon','ilev','lev','azmh','itime1','ilat1','ilon1','ilev1','wtime','wlat','wlon','wlev']
+    return(pandas.DataFrame(findx1,index=data.index,columns=columns))
+
+def level_index(gph,itime,ilat,ilon,alt):
+    # nearest gph level at every point; a scalar itime reads only that time slice of a file variable
+    if numpy.ndim(itime) == 0 : profile=numpy.ma.getdata(gph[itime])[:,ilat,ilon].T.astype(numpy.float64)
+    else : profile=sample_points(gph,itime,ilat,ilon,nlev=numpy.shape(gph)[1],filled=False)
+    return(numpy.abs(profile-numpy.asarray(alt,dtype=numpy.float64)[:,None]).argmin(axis=1))
+
+def los_offsets(ObsAlt,Tdelta,OrP,SatAlt,OrbInc,HVA,VVA):
+    RoE=6371  ###in km
+    HLOS=(SatAlt-ObsAlt)*math.tan(math.pi*VVA/180)
+    phase=2*math.pi*Tdelta/OrP
+    losdelon=numpy.degrees(HLOS/RoE)*math.cos(math.radians(OrbInc+HVA))*numpy.cos(phase)
+    losdelat=numpy.degrees(HLOS/RoE)*math.sin(math.radians(OrbInc+HVA))+numpy.degrees(HLOS/RoE)*math.cos(math.radians(OrbInc+HVA))*numpy.sin(phase)
+    return(losdelon,losdelat)
+
+def time_index(Tnow):
+    if numpy.ndim(Tnow) == 0 : Tnow=[Tnow]
+    return(pandas.DatetimeIndex(Tnow))
+
+def minutes_since(Tnow,Tnode):
+    # whole seconds, as obslib.to_minutes counts them
+    seconds=(numpy.asarray(Tnow.asi8,dtype=numpy.int64)-pandas.Timestamp(Tnode).value)//1000000000
+    return(seconds.astype(numpy.float64)/60.0)
+
+def time_columns(Tnow):
+    return(dict([(key,numpy.asarray(getattr(Tnow,key.lower()),dtype=numpy.int64)) for key in SAMPLE_TIMEKEYS]))
+
+def vec_degreelon(lon):
+    lon=numpy.asarray(lon,dtype=numpy.float64)
+    lon=numpy.where(lon < -180,lon+numpy.ceil((-180-lon)/360)*360,lon)
+    lon=numpy.where(lon > 180,lon-numpy.ceil((lon-180)/360)*360,lon)
+    return(lon)
+
+def nadir_track_latlon(Tdelta,Tnode,Torbit,OrbInc,NodeShift=0):
+    Tearth=1440
+    nodlon=obslib.dawnlon(Tnode)
+    OrP=obslib.to_minutes(Torbit)
+    lat=numpy.sin(Tdelta/OrP*2*math.pi)*math.degrees(math.asin(math.sin(math.radians(OrbInc))))
+    lon=vec_degreelon(nodlon-NodeShift-(Tdelta/Tearth)*360-(Tdelta/OrP)*360)
+    return(lat,lon)
+
+def nadir_ephemeris(Tstart,Tstop,Tstep,Tnode,Torbit,OrbInc,NodeShift=0,outfile=None):
+    ### sub-satellite track on a regular time axis, to be reused through the ephemeris argument
+    Tnow=pandas.date_range(Tstart,Tstop,freq=pandas.Timedelta(Tstep))
+    ephemeris=nadir_latlon(Tnow,Tnode,Torbit,OrbInc,NodeShift).reset_index(drop=True)
+    if outfile is not None : ephemeris.to_csv(outfile,sep="\t",index=False)
+    return(ephemeris)
+
+def ephemeris_latlon(ephemeris,Tnow):
+    if isinstance(ephemeris,str) : ephemeris=pandas.read_csv(ephemeris,sep="\t",parse_dates=["Time"])
+    ephtime=pandas.DatetimeIndex(ephemeris.Time.values).asi8
+    ephns=numpy.asarray(ephtime-ephtime[0],dtype=numpy.float64)
+    obsns=numpy.asarray(Tnow.asi8-ephtime[0],dtype=numpy.float64)
+    lat=numpy.interp(obsns,ephns,ephemeris.Latitude.values,left=numpy.nan,right=numpy.nan)
+    # longitude is unwrapped across the dateline before interpolation
+    ephlon=numpy.degrees(numpy.unwrap(numpy.radians(ephemeris.Longitude.values.astype(numpy.float64))))
+    lon=vec_degreelon(numpy.interp(obsns,ephns,ephlon,left=numpy.nan,right=numpy.nan))
+    return(lat,lon)
+
+def nadir_track(Tstart,Tstop,Tstep,Tnode,Torbit,OrbInc,NodeShift=0,ephemeris=None):
+    ### nadir sounder locations as a sampling frame (Index, date-time, Latitude, Longitude), index from 1
+    Tnow=pandas.date_range(Tstart,Tstop,freq=pandas.Timedelta(Tstep),closed="left")
+    nadir=nadir_latlon(Tnow,Tnode,Torbit,OrbInc,NodeShift,ephemeris)
+    obscount=numpy.arange(1,len(Tnow)+1,1)
+    data1=time_columns(Tnow)
+    data1.update({'Index':obscount,'Latitude':nadir.Latitude.values,'Longitude':nadir.Longitude.values})
+    return(pandas.DataFrame(data1,index=obscount,columns=['Index','Year','Month','Day','Hour','Minute','Second','Latitude','Longitude']))
+
+def sample_points(field,itime,ilat,ilon,ilev=None,nlev=None,filled=True,method="nearest",bracket=None):
+    if check_sample_method(method) in ["linear"] and bracket is not None : return(interp_points(field,itime,ilat,ilon,ilev,nlev,filled,bracket))
+    field=numpy.ma.asarray(field)
+    if nlev is not None : pts=field[itime[:,None],numpy.arange(nlev)[None,:],ilat[:,None],ilon[:,None]]
+    elif ilev is not None : pts=field[itime,ilev,ilat,ilon]
+    else : pts=field[itime,ilat,ilon]
+    if not filled : return(numpy.ma.getdata(pts).astype(numpy.float64))
+    return(numpy.ma.filled(pts.astype(numpy.float64),numpy.nan))
+
+def interp_points(field,itime,ilat,ilon,ilev,nlev,filled,bracket):
+    ### weighted sum over the corners of the bracketing box; bracket maps an axis to its (upper index, upper weight)
+    lower={"time":itime,"lat":ilat,"lon":ilon,"lev":ilev}
+    axes=[key for key in SAMPLE_AXES if key in bracket and lower[key] is not None]
+    values=0.0
+    for corner in itertools.product([0,1],repeat=len(axes)):
+        index=dict(lower)
+        weight=1.0
+        for (key,upper) in zip(axes,corner):
+            (iupper,wupper)=bracket[key]
+            if upper : (index[key],weight)=(iupper,weight*wupper)
+            else : weight=weight*(1.0-wupper)
+        if nlev is not None : weight=numpy.reshape(weight,(-1,1))
+        pts=sample_points(field,index["time"],index["lat"],index["lon"],index["lev"],nlev,filled)
+        # corners with no weight are left out so that a missing value there does not spread
+        values=values+numpy.where(numpy.asarray(weight) > 0,weight*pts,0.0)
+    return(values)
+
+def sample_bracket(idx,axes):
+    if "wtime" not in idx.columns.values : return(None)
+    return(dict([(key,(idx["i"+key+"1"].values.astype(numpy.int64),idx["w"+key].values.astype(numpy.float64))) for key in axes]))
+
+def vec_fff(uwnd,vwnd):
+    return(numpy.sqrt((uwnd*uwnd)+(vwnd*vwnd)))
+
+def vec_ddd(uwnd,vwnd):
+    with numpy.errstate(divide="ignore",invalid="ignore"):
+        ddd=numpy.degrees(numpy.arctan(uwnd/vwnd))
+    ddd=numpy.where(vwnd > 0,ddd+180,ddd)
+    ddd=numpy.where(ddd < 0,ddd+360,ddd)
+    return(ddd)
+
+def vec_hloswnd(uwnd,vwnd,azmh):
+    return(vec_fff(uwnd,vwnd)*numpy.cos(numpy.radians(vec_ddd(uwnd,vwnd)-azmh))*(-1))
+
+def vec_dpt_onrhum(temp,rhum):
+    LperRv=5423
+    with numpy.errstate(divide="ignore",invalid="ignore"):
+        dpt=1.0/((1.0/temp)-(1.0/LperRv)*numpy.log(rhum/100.0))
+    return(numpy.where(rhum > 0,dpt,numpy.nan))
+
+def vec_dpt_onshum(shum):
+    LperRv=5423
+    T0=273
+    with numpy.errstate(divide="ignore",invalid="ignore"):
+        dpt=1.0/((1.0/T0)-(1.0/LperRv)*numpy.log(shum))
+    return(numpy.where(shum > 0,dpt,numpy.nan))
+
+def vec_chanfreq(lev,chnldic):
+    spdlght=300000000
+    lev=numpy.asarray(lev)
+    freq=numpy.full(lev.shape,numpy.nan)
+    for chaname in chnldic["Chanlist"]:
+        chtop=chnldic["Chantoplev"][chaname]
+        chbot=chnldic["Chanbotlev"][chaname]
+        freq[((lev > chtop) & (lev < chbot)) | (lev == chbot)]=spdlght*chnldic["Chwlunitfctr"]/chnldic["Chanwavlen"][chaname]
+    return(freq)
+
+def sample_option(option,points,fields,levels=None,azmh=0,const=None,chnldic={},lev_src_unit="mb",lev_req_unit="Pa"):
+    if option in ["const"] : return(const)
+    if option in ["lev"] : return(None if levels is None else obslib.unit_convert(levels,lev_src_unit,lev_req_unit))
+    if option in ["chnlfreq"] : return(None if levels is None else vec_chanfreq(levels,chnldic))
+    if option in SAMPLE_FIELDS.keys() : return(points(fields[SAMPLE_FIELDS[option]]))
+    if option in ["ddd"] : return(vec_ddd(points(fields["uwnd"]),points(fields["vwnd"])))
+    if option in ["fff"] : return(vec_fff(points(fields["uwnd"]),points(fields["vwnd"])))
+    if option in ["hloswnd"] : return(vec_hloswnd(points(fields["uwnd"]),points(fields["vwnd"]),azmh))
+    if option in ["dpt_onshum"] : return(vec_dpt_onshum(points(fields["filedata"])))
+    if option in ["dpt_onrhum"] : return(vec_dpt_onrhum(points(fields["temp"]),points(fields["rhum"])))
+    raise ValueError("Unknown symobs option "+str(option))
+
+def sample_element(element,obs_cnt,idx,option="data",const=None,chnldic={},lev=numpy.empty(shape=[0]),lev_src_unit="mb",lev_req_unit="Pa",fields={}):
+    obsindx=range(1,obs_cnt+1,1)
+    idx=idx.loc[obsindx]
+    (itime,ilat,ilon)=(idx.itime.values.astype(numpy.int64),idx.ilat.values.astype(numpy.int64),idx.ilon.values.astype(numpy.int64))
+    azmh=idx.azmh.values if "azmh" in idx.columns.values else 0
+    bracket=sample_bracket(idx,SAMPLE_AXES)
+    method="nearest" if bracket is None else "linear"
+    if numpy.size(lev) == 0:
+        points=lambda field : sample_points(field,itime,ilat,ilon,method=method,bracket=bracket)
+        values=sample_option(option,points,fields,None,azmh,const,chnldic,lev_src_unit,lev_req_unit)
+        columns=[element]
+    elif "lev" in obslib.dfheader(idx):
+        ilev=idx.ilev.values.astype(numpy.int64)
+        points=lambda field : sample_points(field,itime,ilat,ilon,ilev=ilev,method=method,bracket=bracket)
+        values=sample_option(option,points,fields,idx.lev.values,azmh,const,chnldic,lev_src_unit,lev_req_unit)
+        columns=[element]
+    else:
+        # full profile on every nature level, one column per level
+        levels=numpy.tile(numpy.asarray(lev),(obs_cnt,1))
+        points=lambda field : sample_points(field,itime,ilat,ilon,nlev=len(lev),method=method,bracket=bracket)
+        if option in ["chnlfreq"] : option="const"
+        values=sample_option(option,points,fields,levels,numpy.reshape(azmh,(-1,1)),const,chnldic,lev_src_unit,lev_req_unit)
+        columns=convert_mb_to_pa(lev)
+    if values is None or numpy.ndim(values) == 0 : values=numpy.full((obs_cnt,len(columns)),values,dtype=None if values is not None else object)
+    values=numpy.reshape(values,(obs_cnt,len(columns)))
+    return(pandas.DataFrame(values,index=obsindx,columns=columns))
+
+NATURE_FIELDS=[("gph","gph"),("temp","tmp"),("rhum","rhum"),("u10m","u10m"),("v10m","v10m"),("slp","slp"),("psfc","psfc"),("t2m","t2m"),("rh2m","rh2m"),("sh2m","sh2m"),("vwnd","vwnd")]
+
+def nature_fields(DT):
+    Year,filedim=nature.getfiledim(DT)
+    fields={}
+    for (name,var) in NATURE_FIELDS:
+        fields[name]=nature.getdata(var,year=DT.year,month=DT.month,day=DT.day)
+    return(Year,filedim,fields)
+
+def subtype_task(task):
+    ### one subtype per task; with a spool directory the packed obstore batch is written by the worker itself
+    (obs_info,obstypedic,maxindx,spooldir,spoolprefix)=task
+    data=symulate_subtype(obs_info,obstypedic,maxindx=maxindx)
+    if spooldir is None or data is None : return(data,None)
+    batch=obstore.obstore_batch_buffer(obs_info["elist"],data)
+    (fd,spoolfile)=tempfile.mkstemp(prefix=spoolprefix,suffix=".batch",dir=spooldir)
+    with os.fdopen(fd,"wb") as spool:
+        spool.write(batch.tobytes())
+    return(data,spoolfile)
+
+def symulate_nproc(nproc,ntask):
+    ### serial unless asked for: nproc argument first, then SYMOBS_NPROC
+    if nproc is None : nproc=SYMOBS_NPROC
+    if nproc is None : nproc=1
+    return(max(1,min(int(nproc),ntask)))
+
+def spool_remove(spoolfiles):
+    for spoolfile in spoolfiles:
+        if spoolfile is not None and os.path.exists(spoolfile) : os.remove(spoolfile)
+
+def symulate_subtypes(obs_infolist,obstypedic=None,maxindx=MAXINDX,nproc=None,spooldir=None):
+    ### a run prefix on the spool files lets a failed run remove the batches its workers already wrote
+    spoolprefix="symobs_%s_" % uuid.uuid4().hex[0:12]
+    tasklist=[(obs_info,obstypedic,maxindx,spooldir,spoolprefix) for obs_info in obs_infolist]
+    nproc=symulate_nproc(nproc,len(tasklist))
+    try:
+        if nproc == 1 : return([subtype_task(task) for task in tasklist])
+        return(symulate_pool(obs_infolist,tasklist,obstypedic,nproc,spooldir))
+    except:
+        if spooldir is not None : spool_remove(glob.glob("%s/%s*.batch" % (spooldir,spoolprefix)))
+        raise
+
+def symulate_pool(obs_infolist,tasklist,obstypedic,nproc,spooldir=None):
+    obs_info=obs_infolist[0]
+    if obstypedic is None : obstypedic=obsdic.obstype[obs_info["obstype"]]
+    (rundir,spilldir)=nature.cache_fork_dir(spooldir)
+    try:
+        if any([info["subtype"] in obstypedic["subtype"] for info in obs_infolist]):
+            # nature fields are read into the cache before the fork, workers share those pages read-only;
+            # fields beyond the cache budget are spilled to rundir and shared as memory maps
+            DT=obs_info["timeinfo"]
+            nature_fields(obslib.pydatetime(DT.year,DT.month,DT.day,DT.hour,DT.minute,0))
+        pool=multiprocessing.Pool(nproc)
+        try:
+            results=pool.map(subtype_task,tasklist,chunksize=1)
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        nature.cache_fork_release(rundir,spilldir)
+    return(results)
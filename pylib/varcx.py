@@ -21,15 +21,18 @@ import obslib
 import obsdic
 import obsmod
 import obsheader
+import varobs
 import numpy
 import pandas
 import struct
 import datetime
 import itertools
 
+def errprint(*args, **kwargs):
+    if diaglev > 0: print(*args, file=sys.stderr, **kwargs)
 
-def header_info(obsfile):
-    hbet = obslib.binary_file_segment_read(obsfile,"hbet")
+def header_info(obsfile,hbet=None):
+    if hbet is None: hbet = obslib.binary_file_segment_read(obsfile,"hbet")
     varobs_header={
     "gridcnt_x"  : hbet[5],
     "gridcnt_y"  : hbet[6],
@@ -76,14 +79,13 @@ def element_frame(cdc,ldc,nmltype):
     cdc_sortlist=obslib.binsort(cdc_sortlist,missing=-32768)
     cdc_sortlist=obslib.binsort(cdc_sortlist,missing=0.)
     for idx in cdc_sortlist:
-       with open(nmlfile, "r") as nml:
           obs_index=(numpy.where(cdc == idx)[0][0])+1
           CDC=cdc[obs_index-1]
           if ldc is not None :
              LDC=ldc[obs_index-1]
           else :
              LDC=1
-          Element=pandas.read_table(nml, skiprows=None, header=0).query("eleindex == @obs_index").elename.reset_index(drop=True)[0]
+          Element=obslib.nml_lookup(nmlfile,"eleindex",obs_index,"elename")
           if idx == cdc_sortlist[0] : 
              eframe=pandas.DataFrame([[CDC,LDC,obs_index,Element]],index=[idx],columns=["CDC","LDC","obs_index","Element"])
           else : 
@@ -127,25 +129,64 @@ def get_latlon(obsfile,batchid=1):
     return(latlon)
 
 def read_batch(obsfile,batchid=1):
-    elist=get_varlist(obsfile)
+    hdr=varcx_header(obsfile)
+    obsmod.ascii_file_write(hdr["elist"])
+    data=varcx_read_batch(obsfile,batchid,hdr)
+    errprint(len(data))
+    obsmod.ascii_file_write(data,option=1)
+    return(data)
+
+#############202610####
+def varcx_elist(cdc):
+    elist=element_frame(cdc[5],None,nmltype="cx_surf")
+    elist=elist.append(element_frame(cdc[6],cdc[7],nmltype="cx_uair"))
+    return(elist)
+
+def varcx_columns(elist):
     header=[]
     for idx in range(0,len(elist)):
         varid=elist.Element.values[idx]
         numlev=int(elist.LDC.values[idx])
-        for lev in range(1,numlev+1):
-            header=header+["cx_val_"+varid+"_"+str(lev)]
-    data=get_data(obsfile,batchid)
-    #latlon=get_latlon(obsfile,batchid)
-    #obstim=get_time(obsfile,batchid)
-    batch_obs_cnt=batch_info(obsfile,batchid)["bth_obs_cnt"]
-    print(batch_obs_cnt)
-    for idx in range(0,batch_obs_cnt):
-        obs_rec=data[idx]
-        if idx == 0 :
-           df=pandas.DataFrame([obs_rec],index=[idx+1],columns=header)
-        else :
-           df=df.append(pandas.DataFrame([obs_rec],index=[idx+1],columns=header))
-    data=df
-    obsmod.ascii_file_write(data,option=1)
-    return(data)
+        header=header+["cx_val_"+varid+"_"+str(lev) for lev in range(1,numlev+1)]
+    return(header)
+
+def varcx_header(obsfile):
+    hdr=header_info(obsfile,varobs.varobs_segment(obsfile,"hbet"))
+    lut=numpy.atleast_2d(varobs.varobs_segment(obsfile,"lut"))
+    cdc=numpy.atleast_2d(varobs.varobs_segment(obsfile,"cdc"))
+    elist=varcx_elist(cdc)
+    nlev=elist.LDC.values.astype(int)
+    hdr["lut"]=lut
+    hdr["elist"]=elist
+    hdr["columns"]=varcx_columns(elist)
+    hdr["fields"]=list(zip([str(varid).strip() for varid in elist.Element.values],numpy.cumsum(nlev)-nlev,nlev))
+    return(hdr)
+
+def varcx_batch_array(obsfile,hdr,batchid=1,binwidth=8):
+    bthptr=batchid-1
+    nobs=int(hdr["lut"][bthptr,65])
+    reclen=int(hdr["rec_len"])
+    obsfile.seek(int(hdr["lut"][bthptr,28])*binwidth,0)
+    data=numpy.frombuffer(obsfile.read(nobs*reclen*binwidth),dtype=">f8")
+    return(numpy.reshape(data.astype(numpy.float64),[nobs,reclen]))
+
+def varcx_batch_fields(obsfile,batchid=1,hdr=None):
+    if hdr is None: hdr=varcx_header(obsfile)
+    data=varcx_batch_array(obsfile,hdr,batchid)
+    return({varid: data[:,offset:offset+numlev] for (varid,offset,numlev) in hdr["fields"]})
+
+def varcx_read_batch(obsfile,batchid=1,hdr=None):
+    if hdr is None: hdr=varcx_header(obsfile)
+    data=varcx_batch_array(obsfile,hdr,batchid)
+    columns=hdr["columns"]
+    if len(columns) != data.shape[1]:
+        errprint("VarCX record length "+str(data.shape[1])+" does not match "+str(len(columns))+" named columns")
+        columns=["col_%03d" % i for i in range(1,data.shape[1]+1)]
+    return(pandas.DataFrame(data,index=numpy.arange(1,len(data)+1),columns=columns))
 
+def varcx_read_fields(infilename,batchlist=None):
+    with open(infilename, "rb") as obsfile:
+        hdr=varcx_header(obsfile)
+        if batchlist is None: batchlist=range(1,int(hdr["cnt_batch"]))
+        data=numpy.concatenate([varcx_batch_array(obsfile,hdr,batchid) for batchid in batchlist])
+    return({varid: data[:,offset:offset+numlev] for (varid,offset,numlev) in hdr["fields"]})
@@ -31,8 +31,8 @@ import itertools
 def errprint(*args, **kwargs):
     if diaglev > 0: print(*args, file=sys.stderr, **kwargs)
 
-def header_info(obsfile):
-    hbet = obslib.binary_file_segment_read(obsfile,"hbet")
+def header_info(obsfile,hbet=None):
+    if hbet is None: hbet = obslib.binary_file_segment_read(obsfile,"hbet")
     varobs_header={
     "gridcnt_x"  : hbet[5],
     "gridcnt_y"  : hbet[6],
@@ -143,11 +143,10 @@ def element_frame(cdc,ldc,nmlfile=varobs_nml):
     cdc_sortlist=obslib.binsort(cdc_sortlist,missing=-32768)
     cdc_sortlist=obslib.binsort(cdc_sortlist,missing=0.)
     for idx in cdc_sortlist:
-       with open(nmlfile, "r") as nml:
           obs_index=(numpy.where(cdc == idx)[0][0])+1
           CDC=cdc[obs_index-1]
           LDC=ldc[obs_index-1]
-          Element=pandas.read_table(nml, skiprows=None, header=0).query("eleindex == @obs_index").elename.reset_index(drop=True)[0]
+          Element=obslib.nml_lookup(nmlfile,"eleindex",obs_index,"elename")
           if idx == cdc_sortlist[0] : 
              eframe=pandas.DataFrame([[CDC,LDC,obs_index,Element]],index=[idx],columns=["CDC","LDC","obs_index","Element"])
           else : 
@@ -214,34 +213,81 @@ def get_data(obsfile,bthnum=1):
     return(data)
 
 def read_batch(obsfile,batchid=1):
-    elist=get_varlist(obsfile)
-    obsmod.ascii_file_write(elist)
-    header=["time_sec","lat","lon","time_min","subtype"]
-    header=header+["CS01","CS02","CS03","CS04","CS05","CS06","CS07","CS08","CS09","CS10","CS11","CS12","CS13","CS14","CS15","CS16"]
-    header=header+["plev","flag"]
-    for idx in range(0,len(elist)):
-        varid=elist.Element.values[idx]
-        numlev=int(elist.LDC.values[idx])
-        for lev in range(1,numlev+1):
-            header=header+["obs_val_"+varid+"_"+str(lev)]
-        for lev in range(1,numlev+1):
-            header=header+["obs_err_"+varid+"_"+str(lev)]
-        for lev in range(1,numlev+1):
-            header=header+["pge_"+varid+"_"+str(lev)]
-    data=get_data(obsfile,batchid)
-    latlon=get_latlon(obsfile,batchid)
-    obstim=get_time(obsfile,batchid)
-    batch_obs_cnt=get_batch_obs_cnt(obsfile,batchid)
-    for idx in range(0,batch_obs_cnt):
-        obs_rec=numpy.concatenate((obstim[idx],latlon[idx],data[idx]))
-        if idx == 0 :
-           df=pandas.DataFrame([obs_rec],index=[idx+1],columns=header)
-        else :
-           df=df.append(pandas.DataFrame([obs_rec],index=[idx+1],columns=header))
-    data=df
+    hdr=varobs_header(obsfile)
+    obsmod.ascii_file_write(hdr["elist"])
+    data=varobs_read_batch(obsfile,batchid,hdr=hdr)
     obsmod.ascii_file_write(data,option=1)
     return(data)
 
 def read_latlon(infilename,btchid=1): 
     with open(infilename, "rb") as obsfile:
 	a=get_latlon(obsfile,batchid=btchid)
+
+#############202610####
+VAROBS_META=["time_min","subtype"]+["CS%02d" % i for i in range(1,17)]+["plev","flag"]
+def varobs_segment(obsfile,sec_nam,binwidth=8):
+    (pos,rowlen,rcnt)=obslib.binpos(obsfile,sec_nam)
+    if pos <= 0 : return(numpy.array([]))
+    obsfile.seek((pos-1)*binwidth,0)
+    dtype={"q": ">i8", "d": ">f8"}.get(obslib.binfmtkey(obsfile,sec_nam),">f8")
+    segment=numpy.frombuffer(obsfile.read(rowlen*rcnt*binwidth),dtype=dtype)
+    if rcnt > 1 : segment=numpy.reshape(segment,[rcnt,rowlen])
+    return(segment)
+
+def varobs_columns(elist):
+    header=list(VAROBS_META)
+    for idx in range(0,len(elist)):
+        varid=elist.Element.values[idx]
+        numlev=int(elist.LDC.values[idx])
+        for prefix in ["obs_val_","obs_err_","pge_"]:
+            header=header+[prefix+varid+"_"+str(lev) for lev in range(1,numlev+1)]
+    return(header)
+
+def varobs_record_dtype(columns,rec_len):
+    if len(columns) != rec_len or len(set(columns)) != rec_len:
+        errprint("VarObs record length "+str(rec_len)+" does not match "+str(len(columns))+" named columns")
+        columns=["col_%03d" % i for i in range(1,rec_len+1)]
+    return(numpy.dtype([(str(col),">f8") for col in columns]))
+
+def varobs_header(obsfile,nmlfile=varobs_nml):
+    hdr=header_info(obsfile,varobs_segment(obsfile,"hbet"))
+    lut=numpy.atleast_2d(varobs_segment(obsfile,"lut"))
+    cdc=numpy.atleast_2d(varobs_segment(obsfile,"cdc"))
+    hdr["lut"]=lut
+    hdr["batchcnt"]=lut.shape[0]
+    hdr["elist"]=element_frame(cdc[3],cdc[7],nmlfile=nmlfile)
+    hdr["columns"]=varobs_columns(hdr["elist"])
+    hdr["dtype"]=varobs_record_dtype(hdr["columns"],int(hdr["rec_len"]))
+    hdr["obs_offset"]=numpy.concatenate(([0],numpy.cumsum(lut[:,65])))
+    return(hdr)
+
+def varobs_block_read(obsfile,wordpos,nwords,dtype,binwidth=8):
+    obsfile.seek(int(wordpos)*binwidth,0)
+    block=numpy.frombuffer(obsfile.read(int(nwords)*binwidth),dtype=dtype)
+    return(block.astype([(name,numpy.float64) for name in block.dtype.names]))
+
+def varobs_batch_arrays(obsfile,hdr,batchid=1):
+    lut=hdr["lut"]
+    bthptr=batchid-1
+    batchcnt=hdr["batchcnt"]
+    nobs=int(lut[bthptr,65])
+    reclen=int(hdr["rec_len"])
+    data=varobs_block_read(obsfile,lut[bthptr,28],nobs*reclen,hdr["dtype"])
+    latlonpos=lut[batchcnt-2,28]+2*hdr["obs_offset"][bthptr]
+    latlon=varobs_block_read(obsfile,latlonpos,2*nobs,numpy.dtype([("lat",">f8"),("lon",">f8")]))
+    timepos=lut[batchcnt-1,28]+hdr["obs_offset"][bthptr]
+    obstim=varobs_block_read(obsfile,timepos,nobs,numpy.dtype([("time_sec",">f8")]))
+    return(obstim,latlon,data)
+
+def varobs_read_batch(obsfile,batchid=1,nmlfile=varobs_nml,hdr=None):
+    if hdr is None: hdr=varobs_header(obsfile,nmlfile)
+    (obstim,latlon,data)=varobs_batch_arrays(obsfile,hdr,batchid)
+    index=numpy.arange(1,len(data)+1)
+    frames=[pandas.DataFrame(arr,index=index) for arr in [obstim,latlon,data]]
+    return(pandas.concat(frames,axis=1))
+
+def varobs_read_file(infilename,nmlfile=varobs_nml):
+    with open(infilename, "rb") as obsfile:
+        hdr=varobs_header(obsfile,nmlfile)
+        batchdic={batchid: varobs_read_batch(obsfile,batchid,nmlfile,hdr) for batchid in range(1,hdr["batchcnt"]-1)}
+    return(batchdic)
@@ -40,9 +40,11 @@ inpath=os.environ.get('BUFRDIR',"")
 slctstr=os.environ.get('BUFRFILESTR',"")
 nmlfile=os.environ.get('KEYNMLFILE',OBSNML+"/keys_"+obsname+".nml")
 
-data=obsmod.ecbufr_decode_files(inpath,Tnode,slctstr,nmlfile)
-obsmod.ascii_file_write(data,outfile=outpath+"/data_"+obsname+".txt",option=1)
-outfile=obsmod.obstore_write(data,nmlfile,outpath,btchcnt=btchcnt,cntmax=cntmax,DT=Tnode,diagflag=0)
+nproc=int(os.environ.get('NPROC',1))
+chunkobs=int(os.environ.get('OBS_CHUNK',max(1,int(cntmax/btchcnt))))
+dumpfile=None
+if int(os.environ.get('BUFR_TXT_DUMP',1)) > 0: dumpfile=outpath+"/data_"+obsname+".txt"
+outfile=obsmod.bufr_to_obstore(inpath,Tnode,slctstr,nmlfile,outpath,cntmax=cntmax,nproc=nproc,chunkobs=chunkobs,btchcnt=btchcnt,dumpfile=dumpfile)
 
 
 #print(outfile)
@@ -72,3 +72,8 @@ with open(inputfile, "rb") as obsfile:
 	data=obstore.obstore_read_bin8(obsfile,datptr,datsze,sec_nam="data")
 	#data=obstore.frame_data_batch(obsfile,nmlfile,indx,elenams,maxindx=512)
 #print(data)
+
+if len(sys.argv) > 5:
+	nproc=int(sys.argv[5])
+	data=obstore.obstore_parallel_read(inputfile,nmlfile,nproc=nproc)
+	print(data)